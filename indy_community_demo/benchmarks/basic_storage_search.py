@@ -0,0 +1,97 @@
+"""
+Measure type + tag searches against the in-memory BasicStorage.
+
+Loads the store with records of a few types and tags, then compares a full
+scan of the store (the previous search behaviour) with the indexed search,
+for a simple and a compound WQL query, then opens a search and streams every
+record of a type.
+
+Run from the indy_community_demo directory:
+    python benchmarks/basic_storage_search.py [records] [repeat]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indy_community.indy_cat.storage.basic import BasicStorage, compile_tag_query
+from indy_community.indy_cat.storage.record import StorageRecord
+
+
+TYPES = 10
+CONNECTIONS = 1000
+
+
+async def load(storage, records):
+    for i in range(records):
+        await storage.add_record(StorageRecord(
+            type="type_{}".format(i % TYPES),
+            value="value {}".format(i),
+            tags={"connection_id": str(i % CONNECTIONS), "state": "active" if i % 3 else "done"},
+            id=str(i),
+        ))
+
+
+def scan(storage, type_filter, tag_query):
+    match = compile_tag_query(tag_query)
+    return [record for record in storage._records.values()
+            if record.type == type_filter and match(record.tags)]
+
+
+async def search(storage, type_filter, tag_query):
+    return await storage.search_records(type_filter, tag_query).fetch_all()
+
+
+async def open_close(storage, type_filter):
+    search = storage.search_records(type_filter)
+    await search.open()
+    first = await search.fetch(1)
+    await search.close()
+    return first
+
+
+async def stream(storage, type_filter):
+    records = 0
+    async for record in storage.search_records(type_filter).fetch_iter():
+        records = records + 1
+    return range(records)
+
+
+def bench(label, runner, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        found = runner()
+    elapsed = (time.perf_counter() - start) / repeat
+    print("{:<24} {:>10.3f} ms/search ({} records)".format(label, elapsed * 1000, len(found)))
+    return elapsed
+
+
+def main():
+    records = int(sys.argv[1]) if 1 < len(sys.argv) else 1000000
+    repeat = int(sys.argv[2]) if 2 < len(sys.argv) else 5
+
+    loop = asyncio.get_event_loop()
+    storage = BasicStorage()
+    start = time.perf_counter()
+    loop.run_until_complete(load(storage, records))
+    print("loaded {} records in {:.1f}s".format(records, time.perf_counter() - start))
+
+    queries = [
+        {"connection_id": "42", "state": "active"},
+        {"$or": [{"connection_id": {"$in": ["12", "22"]}}, {"connection_id": "32"}], "state": {"$neq": "done"}},
+    ]
+    for tag_query in queries:
+        print(tag_query)
+        before = bench("full scan", lambda: scan(storage, "type_2", tag_query), repeat)
+        after = bench("indexed search", lambda: loop.run_until_complete(search(storage, "type_2", tag_query)), repeat)
+        print("speedup {:.1f}x".format(before / after))
+
+    bench("open a search", lambda: loop.run_until_complete(open_close(storage, "type_2")), repeat)
+    bench("stream all of a type", lambda: loop.run_until_complete(stream(storage, "type_2")), repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Measure the agent polling and inbound message lookups against a large conversation table.
+
+Creates a test database (via the configured database backend), loads it with
+conversations spread over a number of wallets and connections, then times the
+lookups used by handle_inbound_messages and the agent sweep.
+
+Run from the indy_community_demo directory:
+    python benchmarks/conversation_queries.py [conversations] [repeat]
+"""
+
+import os
+import random
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "indy_community_demo.settings")
+
+import django
+django.setup()
+
+from django.db import connection, transaction
+
+from indy_community.models import IndyWallet, AgentConnection, AgentConversation
+
+
+WALLETS = 100
+CONNECTIONS_PER_WALLET = 20
+BATCH_SIZE = 10000
+
+
+def load(conversation_count):
+    wallets = IndyWallet.objects.bulk_create(
+        [IndyWallet(wallet_name='bench_wallet_{}'.format(i)) for i in range(WALLETS)])
+    connections = []
+    for wallet in wallets:
+        connections.extend(AgentConnection.objects.bulk_create(
+            [AgentConnection(wallet=wallet, partner_name='partner_{}'.format(i), token=uuid.uuid4().hex,
+                             status=random.choice(['Sent', 'Active', 'Active', 'Active']), connection_type='Inbound')
+             for i in range(CONNECTIONS_PER_WALLET)]))
+    if connection.features.can_return_ids_from_bulk_insert is False:
+        connections = list(AgentConnection.objects.all())
+
+    message_ids = []
+    created = 0
+    while created < conversation_count:
+        batch = []
+        for _ in range(min(BATCH_SIZE, conversation_count - created)):
+            agent_connection = random.choice(connections)
+            message_id = uuid.uuid4().hex[:20]
+            message_ids.append((agent_connection, message_id))
+            batch.append(AgentConversation(connection=agent_connection, conversation_type='CredentialOffer',
+                                           message_id=message_id, status=random.choice(['Sent', 'Accepted', 'Accepted'])))
+        with transaction.atomic():
+            AgentConversation.objects.bulk_create(batch)
+        created = created + len(batch)
+    return (wallets, connections, message_ids)
+
+
+def is_handled(agent_connection, message_id):
+    return AgentConversation.objects.filter(connection=agent_connection, message_id=message_id).exists()
+
+
+def bench(label, query, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        query()
+    elapsed = time.perf_counter() - start
+    print("{:<36} {:>10.3f} ms/query".format(label, elapsed * 1000 / repeat))
+
+
+def main():
+    conversation_count = int(sys.argv[1]) if 1 < len(sys.argv) else 1000000
+    repeat = int(sys.argv[2]) if 2 < len(sys.argv) else 200
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        start = time.perf_counter()
+        (wallets, connections, message_ids) = load(conversation_count)
+        print("loaded {} conversations in {:.1f}s".format(conversation_count, time.perf_counter() - start))
+
+        bench("dedup (connection, message_id)",
+              lambda: is_handled(*random.choice(message_ids)),
+              repeat)
+        bench("sent conversations by connection",
+              lambda: list(AgentConversation.objects.filter(connection=random.choice(connections), status='Sent')),
+              repeat)
+        bench("connections by (wallet, status)",
+              lambda: list(AgentConnection.objects.filter(wallet=random.choice(wallets), status='Sent')),
+              repeat)
+        bench("connection by (wallet, partner_name)",
+              lambda: list(AgentConnection.objects.filter(wallet=random.choice(wallets), partner_name='partner_1')),
+              repeat)
+        bench("connection by token",
+              lambda: list(AgentConnection.objects.filter(token=random.choice(connections).token)),
+              repeat)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Measure the per-call overhead of the run_coroutine* helpers.
+
+Compares the previous behaviour (a new event loop created, installed and closed
+for every call) with the long-lived per-thread loop now used by indy_community.
+
+Run from the indy_community_demo directory:
+    python benchmarks/loop_overhead.py [iterations]
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indy_community.utils import run_coroutine, close_thread_event_loop
+
+
+async def noop():
+    await asyncio.sleep(0)
+
+
+def run_coroutine_new_loop(coroutine):
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coroutine())
+    finally:
+        loop.close()
+
+
+def bench(label, runner, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        runner(noop)
+    elapsed = time.perf_counter() - start
+    print("{:<24} {:>10.2f} us/call".format(label, elapsed * 1000000 / iterations))
+    return elapsed
+
+
+def main():
+    iterations = int(sys.argv[1]) if 1 < len(sys.argv) else 10000
+
+    before = bench("new loop per call", run_coroutine_new_loop, iterations)
+    after = bench("per-thread loop", run_coroutine, iterations)
+    close_thread_event_loop()
+
+    print("speedup {:.1f}x over {} calls".format(before / after, iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Measure process startup time in the 'eager' and 'lazy' INDY_STARTUP_MODE.
+
+Runs each command in a fresh process and reports the average wall time.
+Eager mode needs the storage and payment plug-ins installed.
+
+Run from the indy_community_demo directory:
+    python benchmarks/startup_time.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+
+COMMANDS = [
+    ("manage.py check", [sys.executable, "manage.py", "check"]),
+    ("manage.py showmigrations", [sys.executable, "manage.py", "showmigrations", "indy_community"]),
+    ("wsgi application import", [sys.executable, "-c", "import indy_community_demo.wsgi"]),
+]
+
+
+def bench(label, command, mode, runs):
+    env = dict(os.environ, INDY_STARTUP_MODE=mode)
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+    elapsed = (time.perf_counter() - start) / runs
+    print("{:<28} {:<6} {:>8.3f} s".format(label, mode, elapsed))
+    return elapsed
+
+
+def main():
+    runs = int(sys.argv[1]) if 1 < len(sys.argv) else 5
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    for (label, command) in COMMANDS:
+        eager = bench(label, command, 'eager', runs)
+        lazy = bench(label, command, 'lazy', runs)
+        print("{:<28} speedup {:.1f}x".format("", eager / lazy))
+
+
+if __name__ == '__main__':
+    main()
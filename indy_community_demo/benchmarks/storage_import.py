@@ -0,0 +1,64 @@
+"""
+Measure importing records into wallet (non-secrets) storage.
+
+Creates a temporary wallet, adds records one at a time (the previous way to
+import) and then with IndyStorage.add_records, then deletes the wallet.
+Requires libindy and the wallet storage configured in indy_community_demo.settings.
+
+Run from the indy_community_demo directory:
+    python benchmarks/storage_import.py [records]
+"""
+
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "indy_community_demo.settings")
+
+import django
+django.setup()
+
+from indy_community.indy_cat.storage.indy import IndyStorage
+from indy_community.indy_cat.storage.record import StorageRecord
+from indy_community.utils import run_coroutine
+from indy_community.wallet_utils import create_wallet, delete_wallet, open_wallet, close_wallet
+
+
+def make_records(record_type, count):
+    return [StorageRecord(type=record_type, value='{"n": %d}' % i, tags={"index": str(i)}) for i in range(count)]
+
+
+async def add_one_by_one(storage, records):
+    for record in records:
+        await storage.add_record(record)
+
+
+def bench(label, storage, importer, records):
+    start = time.perf_counter()
+    run_coroutine(lambda: importer(storage, records))
+    elapsed = time.perf_counter() - start
+    print("{:<24} {:>10.3f} ms/record ({} records)".format(label, elapsed * 1000 / len(records), len(records)))
+    return elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if 1 < len(sys.argv) else 2000
+    wallet_name = "bench_import_" + uuid.uuid4().hex[:8]
+    raw_password = "pass1234"
+
+    create_wallet(wallet_name, raw_password)
+    wallet_handle = open_wallet(wallet_name, raw_password)
+    try:
+        storage = IndyStorage(wallet_handle)
+        before = bench("one record at a time", storage, add_one_by_one, make_records("single", count))
+        after = bench("add_records", storage, lambda storage, records: storage.add_records(records), make_records("batch", count))
+        print("speedup {:.1f}x".format(before / after))
+    finally:
+        close_wallet(wallet_handle)
+        delete_wallet(wallet_name, raw_password)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Measure wallet open latency for the default (Argon2) and RAW key derivation methods.
+
+Creates two temporary wallets, opens/closes each one repeatedly, then deletes them.
+Requires libindy and the wallet storage configured in indy_community_demo.settings.
+
+Run from the indy_community_demo directory:
+    python benchmarks/wallet_open.py [iterations]
+"""
+
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "indy_community_demo.settings")
+
+import django
+django.setup()
+
+from indy_community.wallet_utils import create_wallet, delete_wallet, open_wallet, close_wallet, generate_raw_wallet_key
+
+
+def bench(label, wallet_name, raw_password, key_derivation_method, iterations):
+    create_wallet(wallet_name, raw_password, key_derivation_method)
+    try:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            wallet_handle = open_wallet(wallet_name, raw_password, key_derivation_method)
+            close_wallet(wallet_handle)
+        elapsed = time.perf_counter() - start
+    finally:
+        delete_wallet(wallet_name, raw_password, key_derivation_method)
+    print("{:<24} {:>10.2f} ms/open".format(label, elapsed * 1000 / iterations))
+    return elapsed
+
+
+def main():
+    iterations = int(sys.argv[1]) if 1 < len(sys.argv) else 20
+    suffix = uuid.uuid4().hex[:8]
+
+    before = bench("argon2 (default)", "bench_argon2_" + suffix, "pass1234", None, iterations)
+    after = bench("raw key", "bench_raw_" + suffix, generate_raw_wallet_key(), 'RAW', iterations)
+
+    print("speedup {:.1f}x over {} opens".format(before / after, iterations))
+
+
+if __name__ == '__main__':
+    main()
@@ -5,9 +5,17 @@ from os import environ
 from pathlib import Path
 from tempfile import gettempdir
 import random
+import threading
+import time
 import uuid
 
 from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from datetime import timedelta
 
 from indy.error import ErrorCode, IndyError
 
@@ -25,6 +33,9 @@ from vcx.common import shutdown
 
 from .models import *
 from .utils import *
+from .wallet_utils import wallet_handles
+from .ledger_utils import resolve_did
+from .apps import async_ensure_indy_ready
 
 
 
@@ -33,7 +44,7 @@ DUMMY_SEED = "00000000000000000000000000000000"
 ######################################################################
 # utilities to provision vcx agents
 ######################################################################
-def vcx_provision_config(wallet_name, raw_password, institution_name, did_seed=None, org_role='', institution_logo_url='http://robohash.org/456'):
+def vcx_provision_config(wallet_name, raw_password, institution_name, did_seed=None, org_role='', institution_logo_url='http://robohash.org/456', key_derivation_method=None):
     """
     Build a configuration object for a VCX environment or agent
     """
@@ -62,20 +73,30 @@ def vcx_provision_config(wallet_name, raw_password, institution_name, did_seed=N
     provisionConfig['genesis_path'] = settings.INDY_CONFIG['vcx_genesis_path']
     provisionConfig['pool_name'] = 'pool_' + wallet_name
 
+    # e.g. 'RAW' if raw_password is a pre-derived key
+    if key_derivation_method:
+        provisionConfig['wallet_key_derivation'] = key_derivation_method
+
+    # agency notifies us of new messages (push mode)
+    webhook_url = vcx_webhook_url(wallet_name)
+    if webhook_url:
+        provisionConfig['webhook_url'] = webhook_url
+
     return provisionConfig
 
 
-def initialize_and_provision_vcx(wallet_name, raw_password, institution_name, did_seed=None, org_role='', institution_logo_url='http://robohash.org/456'):
+async def async_initialize_and_provision_vcx(wallet_name, raw_password, institution_name, did_seed=None, org_role='', institution_logo_url='http://robohash.org/456', key_derivation_method=None):
     """
-    Provision a wallet as a VCX Agent.
+    Provision a wallet as a VCX Agent (coroutine version).
     """
 
-    provisionConfig = vcx_provision_config(wallet_name, raw_password, institution_name, did_seed=did_seed, org_role=org_role, institution_logo_url=institution_logo_url)
+    await async_ensure_indy_ready()
+    provisionConfig = vcx_provision_config(wallet_name, raw_password, institution_name, did_seed=did_seed, org_role=org_role, institution_logo_url=institution_logo_url, key_derivation_method=key_derivation_method)
 
     print(" >>> Provision an agent and wallet, get back configuration details")
     try:
         provisionConfig_json = json.dumps(provisionConfig)
-        config = run_coroutine_with_args(vcx_agent_provision, provisionConfig_json)
+        config = await vcx_agent_provision(provisionConfig_json)
     except:
         raise
 
@@ -86,21 +107,219 @@ def initialize_and_provision_vcx(wallet_name, raw_password, institution_name, di
     config['institution_logo_url'] = institution_logo_url
     config['genesis_path'] = settings.INDY_CONFIG['vcx_genesis_path']
     config['pool_name'] = 'pool_' + wallet_name
+    if 'webhook_url' in provisionConfig:
+        config['webhook_url'] = provisionConfig['webhook_url']
+    if key_derivation_method:
+        config['wallet_key_derivation'] = key_derivation_method
 
+    # VCX is a process-wide singleton, so drop any cached session before re-initializing
+    await vcx_sessions.lock.async_acquire()
     try:
-        config_json = json.dumps(config)
-        run_coroutine_with_args(vcx_init_with_config, config_json)
-    except:
-        raise
-    finally:
+        vcx_sessions.reset()
         try:
-            shutdown(False)
+            config_json = json.dumps(config)
+            await vcx_init_with_config(config_json)
         except:
             raise
+        finally:
+            try:
+                shutdown(False)
+            except:
+                raise
+    finally:
+        vcx_sessions.lock.release()
 
     return json.dumps(config)
 
 
+def initialize_and_provision_vcx(wallet_name, raw_password, institution_name, did_seed=None, org_role='', institution_logo_url='http://robohash.org/456', key_derivation_method=None):
+    """
+    Provision a wallet as a VCX Agent.
+    """
+
+    return run_coroutine_with_kwargs(async_initialize_and_provision_vcx, wallet_name, raw_password, institution_name, did_seed=did_seed, org_role=org_role, institution_logo_url=institution_logo_url, key_derivation_method=key_derivation_method)
+
+
+######################################################################
+# utilities to manage vcx sessions
+######################################################################
+
+VCX_SESSION_IDLE_TIMEOUT = getattr(settings, "INDY_VCX_SESSION_IDLE_TIMEOUT", 60)
+
+class VcxSessionCache(object):
+    """
+    Keeps VCX initialized for the most recently used wallet, so a batch of operations
+    for the same wallet pays for vcx_init_with_config() (wallet and pool open) once.
+    VCX holds a single process-wide agent, so the cache holds at most one wallet and
+    serializes access between threads (coroutines wait for another thread's session
+    without blocking their event loop); the session is shut down after idle_timeout seconds.
+    """
+
+    def __init__(self, idle_timeout=VCX_SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.lock = ThreadOwnedLock()
+        self._wallet_name = None
+        self._in_use = 0
+        self._initializing = None
+        self._last_used = 0
+        self.init_count = 0
+        self.init_time = 0.0
+        self.hit_count = 0
+
+    @property
+    def wallet_name(self):
+        return self._wallet_name
+
+    def is_idle_expired(self):
+        return (self._wallet_name is not None and self._in_use == 0 and
+                self.idle_timeout < time.monotonic() - self._last_used)
+
+    async def acquire(self, wallet):
+        """
+        Make sure VCX is initialized for the given wallet and hold it until release().
+        """
+
+        await async_ensure_indy_ready()
+        await self.lock.async_acquire()
+        acquired = False
+        try:
+            if self._wallet_name == wallet.wallet_name and not self.is_idle_expired():
+                self.hit_count = self.hit_count + 1
+                self._in_use = self._in_use + 1
+                acquired = True
+                if self._initializing is not None:
+                    # another coroutine on this thread is still initializing this wallet
+                    await asyncio.shield(self._initializing)
+            else:
+                if 0 < self._in_use:
+                    raise Exception("Error VCX session in use for {}, can't initialize {}".format(self._wallet_name, wallet.wallet_name))
+                self.reset()
+                # VCX opens the wallet itself, so it can't be held open by the wallet handle pool
+                await wallet_handles.async_evict(wallet.wallet_name)
+                self._wallet_name = wallet.wallet_name
+                self._in_use = self._in_use + 1
+                acquired = True
+                self._initializing = asyncio.get_event_loop().create_future()
+                start_time = time.perf_counter()
+                try:
+                    await vcx_init_with_config(wallet.wallet_config)
+                except Exception as e:
+                    self._wallet_name = None
+                    self._initializing.set_exception(e)
+                    # mark it retrieved, the error is raised here even if no other coroutine waits
+                    self._initializing.exception()
+                    raise
+                else:
+                    self._initializing.set_result(True)
+                finally:
+                    self._initializing = None
+                self.init_time = self.init_time + (time.perf_counter() - start_time)
+                self.init_count = self.init_count + 1
+        except:
+            if acquired:
+                self._in_use = self._in_use - 1
+            self.lock.release()
+            raise
+
+    def release(self, wallet):
+        """
+        Release a session obtained with acquire() (VCX stays initialized until idle).
+        """
+
+        self._in_use = self._in_use - 1
+        self._last_used = time.monotonic()
+        self.lock.release()
+
+    def reset(self):
+        """
+        Shut down the cached VCX session (if any).
+        """
+
+        with self.lock:
+            if 0 < self._in_use:
+                raise Exception("Error VCX session in use for {}".format(self._wallet_name))
+            if self._wallet_name is not None:
+                self._wallet_name = None
+                shutdown(False)
+
+    def release_wallet(self, wallet_name):
+        """
+        Shut down the cached VCX session if it holds the given wallet and is not in use,
+        so the wallet can be opened elsewhere. Does not block if another thread is using VCX.
+        Returns True if VCX does not (or no longer) hold the wallet.
+        """
+
+        if not self.lock.acquire(blocking=False):
+            return False
+        try:
+            if self._wallet_name != wallet_name:
+                return True
+            if 0 < self._in_use:
+                return False
+            self.reset()
+            return True
+        finally:
+            self.lock.release()
+
+    def expire_idle(self):
+        """
+        Shut down the cached VCX session if it has been idle longer than the timeout.
+        Does not block if another thread is using VCX.
+        """
+
+        if self.lock.acquire(blocking=False):
+            try:
+                if self.is_idle_expired():
+                    self.reset()
+            finally:
+                self.lock.release()
+
+    def stats(self):
+        return {
+            'wallet_name': self._wallet_name,
+            'init_count': self.init_count,
+            'init_time': self.init_time,
+            'hit_count': self.hit_count,
+        }
+
+
+vcx_sessions = VcxSessionCache()
+
+
+class vcx_session(object):
+    """
+    Context manager (sync or async) that keeps VCX initialized for a wallet, e.g.:
+        with vcx_session(wallet):
+            for connection in connections:
+                handle_inbound_messages(wallet, connection)
+    """
+
+    def __init__(self, wallet):
+        self.wallet = wallet
+
+    async def __aenter__(self):
+        await vcx_sessions.acquire(self.wallet)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        vcx_sessions.release(self.wallet)
+
+    def __enter__(self):
+        run_coroutine_with_args(vcx_sessions.acquire, self.wallet)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        vcx_sessions.release(self.wallet)
+
+
+def vcx_session_stats():
+    """
+    Return VCX initialization metrics (init count and cumulative init time).
+    """
+
+    return vcx_sessions.stats()
+
+
 ######################################################################
 # utilities to create schemas and credential defitions
 ######################################################################
@@ -123,23 +342,22 @@ def create_schema_json(schema_name, schema_version, schema_attrs):
     return (json.dumps(schema), json.dumps(creddef_template))
 
 
-def create_schema(wallet, schema_json, schema_template, initialize_vcx=True):
+async def async_create_schema(wallet, schema_json, schema_template, initialize_vcx=True):
     """
-    Create an Indy Schema (VCX) and also store in our local database.
+    Create an Indy Schema (VCX) and also store in our local database (coroutine version).
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     try:
         schema = json.loads(schema_json)
-        vcxschema = run_coroutine_with_args(Schema.create, 'schema_uuid', schema['name'], schema['version'], schema['attributes'], 0)
-        schema_id = run_coroutine(vcxschema.get_schema_id)
-        schema_data = run_coroutine(vcxschema.serialize)
+        vcxschema = await Schema.create('schema_uuid', schema['name'], schema['version'], schema['attributes'], 0)
+        schema_id = await vcxschema.get_schema_id()
+        schema_data = await vcxschema.serialize()
 
         indy_schema = IndySchema(
                             ledger_schema_id = schema_id,
@@ -155,56 +373,231 @@ def create_schema(wallet, schema_json, schema_template, initialize_vcx=True):
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return indy_schema
 
 
-def create_creddef(wallet, indy_schema, creddef_name, creddef_template, initialize_vcx=True):
+def create_schema(wallet, schema_json, schema_template, initialize_vcx=True):
     """
-    Create an Indy Credential Definition (VCX) and also store in our local database
+    Create an Indy Schema (VCX) and also store in our local database.
+    """
+
+    return run_coroutine_with_kwargs(async_create_schema, wallet, schema_json, schema_template, initialize_vcx=initialize_vcx)
+
+
+async def async_create_creddef(wallet, indy_schema, creddef_name, creddef_template, initialize_vcx=True, indy_creddef=None):
+    """
+    Create an Indy Credential Definition (VCX) and also store in our local database (coroutine version).
+    indy_creddef is an existing 'Pending' record to complete (otherwise a new record is created).
     """
 
     # wallet specific-configuration for creatig the cred def
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     try:
-        cred_def = run_coroutine_with_args(CredentialDef.create, 'credef_uuid', creddef_name, indy_schema.ledger_schema_id, 0)
+        cred_def = await CredentialDef.create('credef_uuid', creddef_name, indy_schema.ledger_schema_id, 0)
         cred_def_handle = cred_def.handle
-        cred_def_id = run_coroutine(cred_def.get_cred_def_id)
-        creddef_data = run_coroutine(cred_def.serialize)
-
-        indy_creddef = IndyCredentialDefinition(
-                            ledger_creddef_id = cred_def_id,
-                            ledger_schema = indy_schema,
-                            wallet = wallet,
-                            creddef_name = creddef_name,
-                            creddef_handle = cred_def_handle,
-                            creddef_template = creddef_template,
-                            creddef_data = json.dumps(creddef_data)
-                            )
+        cred_def_id = await cred_def.get_cred_def_id()
+        creddef_data = await cred_def.serialize()
+
+        if indy_creddef is None:
+            indy_creddef = IndyCredentialDefinition(
+                                ledger_schema = indy_schema,
+                                wallet = wallet,
+                                creddef_name = creddef_name,
+                                creddef_template = creddef_template
+                                )
+        indy_creddef.ledger_creddef_id = cred_def_id
+        indy_creddef.creddef_handle = cred_def_handle
+        indy_creddef.creddef_data = json.dumps(creddef_data)
+        indy_creddef.status = 'Active'
+        indy_creddef.status_message = ''
+        indy_creddef.status_updated_at = timezone.now()
         indy_creddef.save()
 
     except:
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return indy_creddef
 
 
+def create_creddef(wallet, indy_schema, creddef_name, creddef_template, initialize_vcx=True, indy_creddef=None):
+    """
+    Create an Indy Credential Definition (VCX) and also store in our local database
+    """
+
+    return run_coroutine_with_kwargs(async_create_creddef, wallet, indy_schema, creddef_name, creddef_template, initialize_vcx=initialize_vcx, indy_creddef=indy_creddef)
+
+
+# max schema / cred def ledger writes in flight for one batch
+LEDGER_WRITE_CONCURRENCY = getattr(settings, "INDY_LEDGER_WRITE_CONCURRENCY", 5)
+
+async def _create_batch(wallet, create_coroutine, items, concurrency):
+    # initialize VCX once for the batch, then create the items concurrently
+    await vcx_sessions.acquire(wallet)
+    try:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def create(item):
+            async with semaphore:
+                start_time = time.perf_counter()
+                try:
+                    result = await create_coroutine(wallet, *item, initialize_vcx=False)
+                except Exception as e:
+                    result = e
+                return (result, time.perf_counter() - start_time)
+
+        return await asyncio.gather(*[create(item) for item in items])
+    finally:
+        vcx_sessions.release(wallet)
+
+
+async def async_create_schemas(wallet, schemas, concurrency=LEDGER_WRITE_CONCURRENCY):
+    """
+    Create a batch of Schemas, given as a list of (schema_json, schema_template) (coroutine version).
+    """
+
+    return await _create_batch(wallet, async_create_schema, schemas, concurrency)
+
+
+def create_schemas(wallet, schemas, concurrency=LEDGER_WRITE_CONCURRENCY):
+    """
+    Create a batch of Schemas, given as a list of (schema_json, schema_template), with VCX
+    initialized once and the ledger writes made concurrently.
+    Returns a list of (IndySchema or the exception raised, latency in seconds), in order.
+    """
+
+    return run_coroutine_with_kwargs(async_create_schemas, wallet, schemas, concurrency=concurrency)
+
+
+async def async_create_creddefs(wallet, creddefs, concurrency=LEDGER_WRITE_CONCURRENCY):
+    """
+    Create a batch of Credential Definitions, given as a list of (indy_schema, creddef_name, creddef_template)
+    (coroutine version).
+    """
+
+    return await _create_batch(wallet, async_create_creddef, creddefs, concurrency)
+
+
+def create_creddefs(wallet, creddefs, concurrency=LEDGER_WRITE_CONCURRENCY):
+    """
+    Create a batch of Credential Definitions, given as a list of (indy_schema, creddef_name, creddef_template),
+    with VCX initialized once and the ledger writes made concurrently.
+    Returns a list of (IndyCredentialDefinition or the exception raised, latency in seconds), in order.
+    """
+
+    return run_coroutine_with_kwargs(async_create_creddefs, wallet, creddefs, concurrency=concurrency)
+
+
+def queue_creddef(wallet, indy_schema, creddef_name, creddef_template):
+    """
+    Record a Credential Definition as 'Pending', to be created on the ledger by create_pending_creddefs().
+    """
+
+    indy_creddef = IndyCredentialDefinition(
+                        ledger_schema = indy_schema,
+                        wallet = wallet,
+                        creddef_name = creddef_name,
+                        creddef_template = creddef_template,
+                        status = 'Pending',
+                        status_updated_at = timezone.now()
+                        )
+    indy_creddef.save()
+
+    return indy_creddef
+
+
+# seconds before a cred def left 'Pending' or 'Creating' (e.g. by a crashed task) is queued again
+CREDDEF_CLAIM_TIMEOUT = getattr(settings, "INDY_CREDDEF_CLAIM_TIMEOUT", 600)
+
+def claim_creddef(indy_creddef):
+    """
+    Claim a 'Pending' Credential Definition for creation (status becomes 'Creating').
+    Returns False if another task claimed it first.
+    """
+
+    now = timezone.now()
+    if 1 != IndyCredentialDefinition.objects.filter(id=indy_creddef.id, status='Pending').update(status='Creating', status_updated_at=now):
+        return False
+    indy_creddef.status = 'Creating'
+    indy_creddef.status_updated_at = now
+    return True
+
+
+async def _async_create_pending_creddef(wallet, indy_creddef, initialize_vcx=True):
+    try:
+        return await async_create_creddef(wallet, indy_creddef.ledger_schema, indy_creddef.creddef_name, indy_creddef.creddef_template,
+                                          initialize_vcx=initialize_vcx, indy_creddef=indy_creddef)
+    except Exception as e:
+        # only fail our own claim (never overwrite a cred def another task has completed)
+        IndyCredentialDefinition.objects.filter(id=indy_creddef.id, status='Creating').update(
+                    status='Failed', status_message=str(e), status_updated_at=timezone.now())
+        raise
+
+
+async def async_create_pending_creddefs(wallet, concurrency=LEDGER_WRITE_CONCURRENCY):
+    """
+    Create the wallet's 'Pending' Credential Definitions on the ledger (coroutine version).
+    """
+
+    requeue_stale_creddefs(wallet)
+    pending = list(IndyCredentialDefinition.objects.filter(wallet=wallet, status='Pending').select_related('ledger_schema'))
+    pending = [indy_creddef for indy_creddef in pending if claim_creddef(indy_creddef)]
+    if 0 == len(pending):
+        return []
+    return await _create_batch(wallet, _async_create_pending_creddef, [(indy_creddef,) for indy_creddef in pending], concurrency)
+
+
+def create_pending_creddefs(wallet, concurrency=LEDGER_WRITE_CONCURRENCY):
+    """
+    Create the wallet's 'Pending' Credential Definitions on the ledger (status becomes 'Active' or 'Failed').
+    Each cred def is claimed first, so concurrent tasks never create the same one twice.
+    Returns a list of (IndyCredentialDefinition or the exception raised, latency in seconds).
+    """
+
+    return run_coroutine_with_kwargs(async_create_pending_creddefs, wallet, concurrency=concurrency)
+
+
+def retry_failed_creddefs(wallet):
+    """
+    Set the wallet's 'Failed' Credential Definitions back to 'Pending', to be created again by create_pending_creddefs().
+    Returns the number of cred defs queued.
+    """
+
+    return IndyCredentialDefinition.objects.filter(wallet=wallet, status='Failed').update(
+                    status='Pending', status_message='', status_updated_at=timezone.now())
+
+
+def stale_creddefs(wallet=None):
+    """
+    Return the 'Pending' and 'Creating' Credential Definitions that have not been updated within
+    CREDDEF_CLAIM_TIMEOUT (their task has crashed or was lost).
+    """
+
+    creddefs = IndyCredentialDefinition.objects.filter(status__in=['Pending', 'Creating']).filter(
+                    Q(status_updated_at__isnull=True) | Q(status_updated_at__lt=timezone.now() - timedelta(seconds=CREDDEF_CLAIM_TIMEOUT)))
+    if wallet is not None:
+        creddefs = creddefs.filter(wallet=wallet)
+    return creddefs
+
+
+def requeue_stale_creddefs(wallet=None):
+    """
+    Set stale Credential Definitions back to 'Pending' (with a new timeout), to be claimed again.
+    Returns the number of cred defs queued.
+    """
+
+    return stale_creddefs(wallet).update(status='Pending', status_updated_at=timezone.now())
+
+
 def create_proof_request(name, description, attrs, predicates):
     """
     Create a proof request template (local database only).
@@ -223,31 +616,82 @@ def create_proof_request(name, description, attrs, predicates):
     return proof_request
 
 
+######################################################################
+# utilities to schedule polling of connections and conversations
+######################################################################
+
+# first poll delay (seconds), doubled each time a poll finds nothing new
+POLL_BACKOFF_BASE = getattr(settings, "INDY_POLL_BACKOFF_BASE", 5)
+# longest delay (seconds) between polls of an idle connection or conversation
+POLL_BACKOFF_MAX = getattr(settings, "INDY_POLL_BACKOFF_MAX", 3600)
+# longest delay for wallets provisioned with a webhook (polling is only a safety net,
+# the agency notifies us of new messages)
+POLL_BACKOFF_MAX_PUSH = getattr(settings, "INDY_POLL_BACKOFF_MAX_PUSH", 86400)
+
+def poll_backoff_max(wallet):
+    """
+    Longest delay between polls for the wallet's connections and conversations.
+    """
+
+    try:
+        wallet_config = json.loads(wallet.wallet_config)
+    except ValueError:
+        return POLL_BACKOFF_MAX
+    if isinstance(wallet_config, dict) and wallet_config.get('webhook_url'):
+        return POLL_BACKOFF_MAX_PUSH
+    return POLL_BACKOFF_MAX
+
+def schedule_next_poll(record, state_changed, wallet=None):
+    """
+    Set the next poll time of an AgentConnection or AgentConversation (does not save).
+    Resets to the base interval when the state changed, otherwise backs off exponentially
+    (up to the wallet's poll_backoff_max()), with jitter so records created together
+    don't stay in lock-step.
+    """
+
+    if state_changed:
+        record.poll_attempts = 0
+    else:
+        record.poll_attempts = record.poll_attempts + 1
+    if wallet is None:
+        wallet = record.wallet if isinstance(record, AgentConnection) else record.connection.wallet
+    delay = min(poll_backoff_max(wallet), POLL_BACKOFF_BASE * (2 ** min(record.poll_attempts, 20)))
+    delay = random.uniform(delay / 2, delay)
+    record.next_poll_at = timezone.now() + timedelta(seconds=delay)
+
+def poll_due_filter(prefix=''):
+    """
+    Query filter for records that are due to be polled (or have never been polled).
+    """
+
+    return (Q(**{prefix + 'next_poll_at__isnull': True}) |
+            Q(**{prefix + 'next_poll_at__lte': timezone.now()}))
+
+
 ######################################################################
 # utilities to create and confirm agent-to-agent connections
 ######################################################################
 
-def send_connection_invitation(wallet, partner_name, initialize_vcx=True):
+async def async_send_connection_invitation(wallet, partner_name, initialize_vcx=True):
     """
-    Create a VCX Connection Invitation.
+    Create a VCX Connection Invitation (coroutine version).
     Creates a record for the initator only (receiver is checked in the corresponding view).
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     # create connection and generate invitation
     try:
-        connection_to_ = run_coroutine_with_args(Connection.create, partner_name)
-        run_coroutine_with_args(connection_to_.connect, '{"use_public_did": true}')
-        run_coroutine(connection_to_.update_state)
-        invite_details = run_coroutine_with_args(connection_to_.invite_details, False)
+        connection_to_ = await Connection.create(partner_name)
+        await connection_to_.connect('{"use_public_did": true}')
+        await connection_to_.update_state()
+        invite_details = await connection_to_.invite_details(False)
 
-        connection_data = run_coroutine(connection_to_.serialize)
+        connection_data = await connection_to_.serialize()
         connection_to_.release()
         connection_to_ = None
 
@@ -264,34 +708,39 @@ def send_connection_invitation(wallet, partner_name, initialize_vcx=True):
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return connection
 
 
-def send_connection_confirmation(wallet, connection_id, partner_name, invite_details, initialize_vcx=True):
+def send_connection_invitation(wallet, partner_name, initialize_vcx=True):
     """
-    Send a confirmation message for a VCX Invitation.
+    Create a VCX Connection Invitation.
+    Creates a record for the initator only (receiver is checked in the corresponding view).
+    """
+
+    return run_coroutine_with_kwargs(async_send_connection_invitation, wallet, partner_name, initialize_vcx=initialize_vcx)
+
+
+async def async_send_connection_confirmation(wallet, connection_id, partner_name, invite_details, initialize_vcx=True):
+    """
+    Send a confirmation message for a VCX Invitation (coroutine version).
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     # create connection and generate invitation
     try:
-        connection_from_ = run_coroutine_with_args(Connection.create_with_details, partner_name, invite_details)
-        connection_data = run_coroutine(connection_from_.serialize)
-        run_coroutine_with_args(connection_from_.connect, '{"use_public_did": true}')
-        run_coroutine(connection_from_.update_state)
+        connection_from_ = await Connection.create_with_details(partner_name, invite_details)
+        connection_data = await connection_from_.serialize()
+        await connection_from_.connect('{"use_public_did": true}')
+        await connection_from_.update_state()
 
-        connection_data = run_coroutine(connection_from_.serialize)
+        connection_data = await connection_from_.serialize()
         connection_from_.release()
         connection_from_ = None
 
@@ -315,40 +764,43 @@ def send_connection_confirmation(wallet, connection_id, partner_name, invite_det
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return connection
 
 
-def check_connection_status(wallet, connection, initialize_vcx=True):
+def send_connection_confirmation(wallet, connection_id, partner_name, invite_details, initialize_vcx=True):
     """
-    Check status of the Connection.
+    Send a confirmation message for a VCX Invitation.
+    """
+
+    return run_coroutine_with_kwargs(async_send_connection_confirmation, wallet, connection_id, partner_name, invite_details, initialize_vcx=initialize_vcx)
+
+
+async def async_check_connection_status(wallet, connection, initialize_vcx=True):
+    """
+    Check status of the Connection (coroutine version).
     Called when an invitation has been sent and confirmation has not yet been received.
-    Called from the Django background task, but can also be called from a view directly.
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     # create connection and check status
     try:
         prev_status = connection.status
-        connection_to_ = run_coroutine_with_args(Connection.deserialize, json.loads(connection.connection_data))
-        run_coroutine(connection_to_.update_state)
-        connection_state = run_coroutine(connection_to_.get_state)
+        connection_to_ = await Connection.deserialize(json.loads(connection.connection_data))
+        await connection_to_.update_state()
+        connection_state = await connection_to_.get_state()
         if connection_state == State.Accepted:
             return_state = 'Active'
         else:
             return_state = 'Sent'
 
-        connection_data = run_coroutine(connection_to_.serialize)
+        connection_data = await connection_to_.serialize()
         connection_to_.release()
         connection_to_ = None
 
@@ -356,6 +808,7 @@ def check_connection_status(wallet, connection, initialize_vcx=True):
         my_connection = connections[0]
         my_connection.connection_data = json.dumps(connection_data)
         my_connection.status = return_state
+        schedule_next_poll(my_connection, return_state != prev_status, wallet)
         my_connection.save()
 
         check_connection_callback(my_connection, prev_status)
@@ -363,48 +816,54 @@ def check_connection_status(wallet, connection, initialize_vcx=True):
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return my_connection
 
 
+def check_connection_status(wallet, connection, initialize_vcx=True):
+    """
+    Check status of the Connection.
+    Called when an invitation has been sent and confirmation has not yet been received.
+    Called from the Django background task, but can also be called from a view directly.
+    """
+
+    return run_coroutine_with_kwargs(async_check_connection_status, wallet, connection, initialize_vcx=initialize_vcx)
+
+
 ######################################################################
 # utilities to offer, request, send and receive credentials
 ######################################################################
 
-def send_credential_offer(wallet, connection, credential_tag, schema_attrs, cred_def, credential_name, initialize_vcx=True):
+async def async_send_credential_offer(wallet, connection, credential_tag, schema_attrs, cred_def, credential_name, initialize_vcx=True):
     """
-    Send a VCX Credential Offer.
+    Send a VCX Credential Offer (coroutine version).
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     # create connection and generate invitation
     try:
-        my_connection = run_coroutine_with_args(Connection.deserialize, json.loads(connection.connection_data))
-        my_cred_def = run_coroutine_with_args(CredentialDef.deserialize, json.loads(cred_def.creddef_data))
+        my_connection = await Connection.deserialize(json.loads(connection.connection_data))
+        my_cred_def = await CredentialDef.deserialize(json.loads(cred_def.creddef_data))
         cred_def_handle = my_cred_def.handle
 
         # create a credential (the last '0' is the 'price')
-        credential = run_coroutine_with_args(IssuerCredential.create, credential_tag, schema_attrs, int(cred_def_handle), credential_name, '0')
+        credential = await IssuerCredential.create(credential_tag, schema_attrs, int(cred_def_handle), credential_name, '0')
 
-        run_coroutine_with_args(credential.send_offer, my_connection)
+        await credential.send_offer(my_connection)
 
         # serialize/deserialize credential - waiting for Alice to rspond with Credential Request
-        credential_data = run_coroutine(credential.serialize)
+        credential_data = await credential.serialize()
 
         conversation = AgentConversation(
             connection = connection,
             conversation_type = 'CredentialOffer',
-            message_id = 'N/A',
+            message_id = None,
             status = 'Sent',
             conversation_data = json.dumps(credential_data))
         conversation.save()
@@ -412,89 +871,97 @@ def send_credential_offer(wallet, connection, credential_tag, schema_attrs, cred
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return conversation
-    
 
-def send_credential_request(wallet, connection, conversation, initialize_vcx=True):
+
+def send_credential_offer(wallet, connection, credential_tag, schema_attrs, cred_def, credential_name, initialize_vcx=True):
     """
-    Respond to a Credential Offer by sending a VCX Credentia Request.
+    Send a VCX Credential Offer.
+    """
+
+    return run_coroutine_with_kwargs(async_send_credential_offer, wallet, connection, credential_tag, schema_attrs, cred_def, credential_name, initialize_vcx=initialize_vcx)
+
+
+async def async_send_credential_request(wallet, connection, conversation, initialize_vcx=True):
+    """
+    Respond to a Credential Offer by sending a VCX Credentia Request (coroutine version).
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     # create connection and generate invitation
     try:
-        my_connection = run_coroutine_with_args(Connection.deserialize, json.loads(connection.connection_data))
-        #my_offer = run_coroutine_with_args()
-    
+        my_connection = await Connection.deserialize(json.loads(connection.connection_data))
+
         offer_json = [json.loads(conversation.conversation_data),]
-        credential = run_coroutine_with_args(Credential.create, 'credential', offer_json)
+        credential = await Credential.create('credential', offer_json)
 
-        run_coroutine_with_args(credential.send_request, my_connection, 0)
+        await credential.send_request(my_connection, 0)
 
         # serialize/deserialize credential - wait for Faber to send credential
-        credential_data = run_coroutine(credential.serialize)
+        credential_data = await credential.serialize()
 
         conversation.status = 'Sent'
         conversation.conversation_data = json.dumps(credential_data)
         conversation.conversation_type = 'CredentialRequest'
+        schedule_next_poll(conversation, True, wallet)
         conversation.save()
     except:
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return conversation
 
 
+def send_credential_request(wallet, connection, conversation, initialize_vcx=True):
+    """
+    Respond to a Credential Offer by sending a VCX Credentia Request.
+    """
+
+    return run_coroutine_with_kwargs(async_send_credential_request, wallet, connection, conversation, initialize_vcx=initialize_vcx)
+
+
 ######################################################################
 # utilities to request, send and receive proofs
 ######################################################################
 
-def send_proof_request(wallet, connection, proof_uuid, proof_name, proof_attrs, proof_predicates, initialize_vcx=True):
+async def async_send_proof_request(wallet, connection, proof_uuid, proof_name, proof_attrs, proof_predicates, initialize_vcx=True):
     """
-    Send a VCX Proof Request.
+    Send a VCX Proof Request (coroutine version).
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     # create connection and generate invitation
     try:
-        my_connection = run_coroutine_with_args(Connection.deserialize, json.loads(connection.connection_data))
+        my_connection = await Connection.deserialize(json.loads(connection.connection_data))
 
         # create a proof request
-        proof = run_coroutine_with_kwargs(Proof.create, proof_uuid, proof_name, proof_attrs, {}, requested_predicates=proof_predicates)
+        proof = await Proof.create(proof_uuid, proof_name, proof_attrs, {}, requested_predicates=proof_predicates)
 
-        proof_data = run_coroutine(proof.serialize)
+        proof_data = await proof.serialize()
 
-        run_coroutine_with_args(proof.request_proof, my_connection)
+        await proof.request_proof(my_connection)
 
         # serialize/deserialize credential - waiting for Alice to rspond with Credential Request
-        proof_data = run_coroutine(proof.serialize)
+        proof_data = await proof.serialize()
 
         conversation = AgentConversation(
             connection = connection,
             conversation_type = 'ProofRequest',
-            message_id = 'N/A',
+            message_id = None,
             status = 'Sent',
             conversation_data = json.dumps(proof_data))
         conversation.save()
@@ -502,37 +969,41 @@ def send_proof_request(wallet, connection, proof_uuid, proof_name, proof_attrs,
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return conversation
 
 
+def send_proof_request(wallet, connection, proof_uuid, proof_name, proof_attrs, proof_predicates, initialize_vcx=True):
+    """
+    Send a VCX Proof Request.
+    """
+
+    return run_coroutine_with_kwargs(async_send_proof_request, wallet, connection, proof_uuid, proof_name, proof_attrs, proof_predicates, initialize_vcx=initialize_vcx)
+
+
 # note additional filters are exact match only (attr=value) to filter the allowable claims
 # required temporarily because vcx doesn't support the additional filters allowed by indy-sdk
-def get_claims_for_proof_request(wallet, connection, my_conversation, additional_filters=None, initialize_vcx=True):
+async def async_get_claims_for_proof_request(wallet, connection, my_conversation, additional_filters=None, initialize_vcx=True):
     """
     For the receiver of the Proof Request (i.e. Prover) find the set of claims that can be used
-    to construct a Proof.
+    to construct a Proof (coroutine version).
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     # create connection and generate invitation
     try:
-        my_connection = run_coroutine_with_args(Connection.deserialize, json.loads(connection.connection_data))
+        my_connection = await Connection.deserialize(json.loads(connection.connection_data))
 
         # create a proof request
-        proof = run_coroutine_with_args(DisclosedProof.create, 'proof', json.loads(my_conversation.conversation_data))
+        proof = await DisclosedProof.create('proof', json.loads(my_conversation.conversation_data))
 
-        creds_for_proof = run_coroutine(proof.get_creds)
+        creds_for_proof = await proof.get_creds()
         # TODO check for filters; remove once this is available in VCX
         if additional_filters and 0 < len(list(additional_filters.keys())):
             ret_creds_for_proof = creds_for_proof.copy()
@@ -558,14 +1029,20 @@ def get_claims_for_proof_request(wallet, connection, my_conversation, additional
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return creds_for_proof
 
 
+def get_claims_for_proof_request(wallet, connection, my_conversation, additional_filters=None, initialize_vcx=True):
+    """
+    For the receiver of the Proof Request (i.e. Prover) find the set of claims that can be used
+    to construct a Proof.
+    """
+
+    return run_coroutine_with_kwargs(async_get_claims_for_proof_request, wallet, connection, my_conversation, additional_filters=additional_filters, initialize_vcx=initialize_vcx)
+
+
 def cred_for_referent(creds_for_proof, attr, schema_id):
     """
     Find the credential for te given referent (i.e. credential id).
@@ -576,25 +1053,24 @@ def cred_for_referent(creds_for_proof, attr, schema_id):
             return cred
     return None
 
-def send_claims_for_proof_request(wallet, connection, my_conversation, credential_attrs, initialize_vcx=True):
+async def async_send_claims_for_proof_request(wallet, connection, my_conversation, credential_attrs, initialize_vcx=True):
     """
-    Construct a Proof with the given set of claims and send the Proof.
+    Construct a Proof with the given set of claims and send the Proof (coroutine version).
     """
 
     if initialize_vcx:
         try:
-            config_json = wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(wallet)
         except:
             raise
 
     # create connection and generate invitation
     try:
-        my_connection = run_coroutine_with_args(Connection.deserialize, json.loads(connection.connection_data))
+        my_connection = await Connection.deserialize(json.loads(connection.connection_data))
 
         # load proof request
-        proof = run_coroutine_with_args(DisclosedProof.create, 'proof', json.loads(my_conversation.conversation_data))
-        creds_for_proof = run_coroutine(proof.get_creds)
+        proof = await DisclosedProof.create('proof', json.loads(my_conversation.conversation_data))
+        creds_for_proof = await proof.get_creds()
 
         self_attested = {}
         for attr in creds_for_proof['attrs']:
@@ -610,11 +1086,11 @@ def send_claims_for_proof_request(wallet, connection, my_conversation, credentia
             del creds_for_proof['attrs'][attr]
 
         # generate and send proof
-        run_coroutine_with_args(proof.generate_proof, creds_for_proof, self_attested)
-        run_coroutine_with_args(proof.send_proof, my_connection)
+        await proof.generate_proof(creds_for_proof, self_attested)
+        await proof.send_proof(my_connection)
 
-        # serialize/deserialize proof 
-        proof_data = run_coroutine(proof.serialize)
+        # serialize/deserialize proof
+        proof_data = await proof.serialize()
 
         my_conversation.status = 'Accepted'
         my_conversation.conversation_type = 'ProofOffer'
@@ -625,99 +1101,141 @@ def send_claims_for_proof_request(wallet, connection, my_conversation, credentia
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(wallet)
 
     return my_conversation
 
 
+def send_claims_for_proof_request(wallet, connection, my_conversation, credential_attrs, initialize_vcx=True):
+    """
+    Construct a Proof with the given set of claims and send the Proof.
+    """
+
+    return run_coroutine_with_kwargs(async_send_claims_for_proof_request, wallet, connection, my_conversation, credential_attrs, initialize_vcx=initialize_vcx)
+
+
 ######################################################################
 # utilities to poll for and process outstanding messages
 ######################################################################
 
-def handle_inbound_messages(my_wallet, my_connection):
+def save_inbound_conversations(my_connection, inbound_messages):
     """
-    Background task to check for inbound messages.
-    Can also be called directly from a view.
+    Save new inbound messages (list of (conversation_type, message)) as Pending conversations.
+    Messages already handled for this connection are skipped; returns the new conversations.
+    """
+
+    if 0 == len(inbound_messages):
+        return []
+
+    # resolve already handled messages in one query
+    message_ids = [message['msg_ref_id'] for (conversation_type, message) in inbound_messages]
+    handled_ids = set(AgentConversation.objects.filter(connection=my_connection, message_id__in=message_ids)
+                                               .values_list('message_id', flat=True))
+
+    new_conversations = []
+    for (conversation_type, message) in inbound_messages:
+        if message['msg_ref_id'] in handled_ids:
+            continue
+        handled_ids.add(message['msg_ref_id'])
+        new_conversations.append(AgentConversation(
+                                    connection = my_connection,
+                                    conversation_type = conversation_type,
+                                    message_id = message['msg_ref_id'],
+                                    status = 'Pending',
+                                    conversation_data = json.dumps(message)
+                                ))
+    if 0 == len(new_conversations):
+        return []
+
+    try:
+        with transaction.atomic():
+            new_conversations = AgentConversation.objects.bulk_create(new_conversations)
+    except IntegrityError:
+        # another agent saved some of these messages first, save the rest one at a time
+        saved_conversations = []
+        for new_conversation in new_conversations:
+            try:
+                with transaction.atomic():
+                    new_conversation.save()
+                saved_conversations.append(new_conversation)
+            except IntegrityError:
+                pass
+        return saved_conversations
+
+    # not all database backends return primary keys from a bulk insert
+    if new_conversations[0].pk is None:
+        new_conversations = list(AgentConversation.objects.filter(connection=my_connection,
+                                            message_id__in=[c.message_id for c in new_conversations]))
+    return new_conversations
+
+
+async def async_handle_inbound_messages(my_wallet, my_connection):
+    """
+    Check for inbound messages (coroutine version).
     """
 
     try:
-        config_json = my_wallet.wallet_config
-        run_coroutine_with_args(vcx_init_with_config, config_json)
+        await vcx_sessions.acquire(my_wallet)
     except:
         raise
 
     try:
         handled_count = 0
         connection_data = json.loads(my_connection.connection_data)
-        connection_to_ = run_coroutine_with_args(Connection.deserialize, connection_data)
+        connection_to_ = await Connection.deserialize(connection_data)
 
+        inbound_messages = []
         if my_connection.connection_type == 'Inbound':
-            offers = run_coroutine_with_args(Credential.get_offers, connection_to_)
+            offers = await Credential.get_offers(connection_to_)
             for offer in offers:
-                already_handled = AgentConversation.objects.filter(message_id=offer[0]['msg_ref_id']).all()
-                if len(already_handled) == 0:
-                    save_offer = offer[0].copy()
-                    offer_data = json.dumps(save_offer)
-                    new_offer = AgentConversation(
-                                        connection = my_connection,
-                                        conversation_type = "CredentialOffer",
-                                        message_id = save_offer['msg_ref_id'],
-                                        status = 'Pending',
-                                        conversation_data = offer_data
-                                    )
-                    new_offer.save()
-                    handled_count = handled_count + 1
-                    check_conversation_callback(new_offer, None, None)
-
-        requests = run_coroutine_with_args(DisclosedProof.get_requests, connection_to_)
+                inbound_messages.append(("CredentialOffer", offer[0]))
+
+        requests = await DisclosedProof.get_requests(connection_to_)
         for request in requests:
-            already_handled = AgentConversation.objects.filter(message_id=request['msg_ref_id']).all()
-            if len(already_handled) == 0:
-                save_request = request.copy()
-                request_data = json.dumps(save_request)
-                new_request = AgentConversation(
-                                    connection = my_connection,
-                                    conversation_type = "ProofRequest",
-                                    message_id = save_request['msg_ref_id'],
-                                    status = 'Pending',
-                                    conversation_data = request_data
-                                )
-                new_request.save()
-                handled_count = handled_count + 1
-                check_conversation_callback(new_request, None, None)
+            inbound_messages.append(("ProofRequest", request))
+
+        new_conversations = save_inbound_conversations(my_connection, inbound_messages)
+        handled_count = len(new_conversations)
+        for new_conversation in new_conversations:
+            check_conversation_callback(new_conversation, None, None)
+
+        # back off checking this connection while no new messages arrive
+        schedule_next_poll(my_connection, 0 < handled_count, my_wallet)
+        my_connection.save(update_fields=['poll_attempts', 'next_poll_at'])
     except:
         print("Error polling offers and proof requests")
         # TODO ignore polling errors for now ...
         raise
     finally:
-        try:
-            shutdown(False)
-        except:
-            raise
+        vcx_sessions.release(my_wallet)
 
     return handled_count
 
 
-def poll_message_conversation(my_wallet, my_connection, message, initialize_vcx=True):
+def handle_inbound_messages(my_wallet, my_connection):
     """
-    Background task to poll for updates to in-progress Conversations.
+    Background task to check for inbound messages.
     Can also be called directly from a view.
     """
 
+    return run_coroutine_with_args(async_handle_inbound_messages, my_wallet, my_connection)
+
+
+async def async_poll_message_conversation(my_wallet, my_connection, message, initialize_vcx=True):
+    """
+    Poll for updates to an in-progress Conversation (coroutine version).
+    """
+
     if initialize_vcx:
         try:
-            config_json = my_wallet.wallet_config
-            run_coroutine_with_args(vcx_init_with_config, config_json)
+            await vcx_sessions.acquire(my_wallet)
         except:
             raise
 
     try:
         print(" ... Checking message", message.message_id, message.conversation_type)
 
-        connection = run_coroutine_with_args(Connection.deserialize, json.loads(my_connection.connection_data))
+        connection = await Connection.deserialize(json.loads(my_connection.connection_data))
 
         # handle based on message type and status:
         prev_status = message.status
@@ -725,63 +1243,66 @@ def poll_message_conversation(my_wallet, my_connection, message, initialize_vcx=
         if message.conversation_type == 'CredentialOffer':
             # offer sent from issuer to individual
             # de-serialize message content
-            credential = run_coroutine_with_args(IssuerCredential.deserialize, json.loads(message.conversation_data))
+            credential = await IssuerCredential.deserialize(json.loads(message.conversation_data))
 
-            run_coroutine(credential.update_state)
-            credential_state = run_coroutine(credential.get_state)
+            await credential.update_state()
+            credential_state = await credential.get_state()
 
             if credential_state == State.RequestReceived:
-                run_coroutine_with_args(credential.send_credential, connection)
+                await credential.send_credential(connection)
                 message.conversation_type = 'IssueCredential'
             elif credential_state == State.Accepted:
                 message.status = 'Accepted'
 
-            credential_data = run_coroutine(credential.serialize)
+            credential_data = await credential.serialize()
             message.conversation_data = json.dumps(credential_data)
+            schedule_next_poll(message, (message.conversation_type, message.status) != (prev_type, prev_status), my_wallet)
             message.save()
-        
+
         elif message.conversation_type == 'CredentialRequest':
             # cred request sent from individual to offerer
             conversation_data_json = json.loads(message.conversation_data)
-            credential = run_coroutine_with_args(Credential.deserialize, conversation_data_json)
+            credential = await Credential.deserialize(conversation_data_json)
 
-            run_coroutine(credential.update_state)
-            credential_state = run_coroutine(credential.get_state)
+            await credential.update_state()
+            credential_state = await credential.get_state()
 
             if credential_state == State.Accepted:
                 message.status = 'Accepted'
 
-            credential_data = run_coroutine(credential.serialize)
+            credential_data = await credential.serialize()
             message.conversation_data = json.dumps(credential_data)
+            schedule_next_poll(message, (message.conversation_type, message.status) != (prev_type, prev_status), my_wallet)
             message.save()
 
         elif message.conversation_type == 'IssueCredential':
             # credential sent, waiting for acceptance
             # de-serialize message content
-            credential = run_coroutine_with_args(IssuerCredential.deserialize, json.loads(message.conversation_data))
+            credential = await IssuerCredential.deserialize(json.loads(message.conversation_data))
 
-            run_coroutine(credential.update_state)
-            credential_state = run_coroutine(credential.get_state)
+            await credential.update_state()
+            credential_state = await credential.get_state()
 
             if credential_state == State.Accepted:
                 message.status = 'Accepted'
 
             # serialize/deserialize credential - wait for Faber to send credential
-            credential_data = run_coroutine(credential.serialize)
+            credential_data = await credential.serialize()
             message.conversation_data = json.dumps(credential_data)
+            schedule_next_poll(message, (message.conversation_type, message.status) != (prev_type, prev_status), my_wallet)
             message.save()
-        
+
         elif message.conversation_type == 'ProofRequest':
             # proof request send, waiting for proof offer
             # de-serialize message content
-            proof = run_coroutine_with_args(Proof.deserialize, json.loads(message.conversation_data))
+            proof = await Proof.deserialize(json.loads(message.conversation_data))
 
-            run_coroutine(proof.update_state)
-            proof_state = run_coroutine(proof.get_state)
+            await proof.update_state()
+            proof_state = await proof.get_state()
 
             if proof_state == State.Accepted:
                 message.status = 'Accepted'
-                run_coroutine_with_args(proof.get_proof, connection)
+                await proof.get_proof(connection)
 
                 if proof.proof_state == ProofState.Verified:
                     message.proof_state = 'Verified'
@@ -790,8 +1311,9 @@ def poll_message_conversation(my_wallet, my_connection, message, initialize_vcx=
 
             # serialize/deserialize credential - wait for Faber to send credential
             print("Saving message with a status of ", message.message_id, message.conversation_type, message.status)
-            proof_data = run_coroutine(proof.serialize)
+            proof_data = await proof.serialize()
             message.conversation_data = json.dumps(proof_data)
+            schedule_next_poll(message, (message.conversation_type, message.status) != (prev_type, prev_status), my_wallet)
             message.save()
 
         else:
@@ -803,47 +1325,141 @@ def poll_message_conversation(my_wallet, my_connection, message, initialize_vcx=
         raise
     finally:
         if initialize_vcx:
-            try:
-                shutdown(False)
-            except:
-                raise
+            vcx_sessions.release(my_wallet)
 
     return message
 
 
-def poll_message_conversations(my_wallet, my_connection):
+def poll_message_conversation(my_wallet, my_connection, message, initialize_vcx=True):
     """
-    Background task to poll all Conversations for updates.
+    Background task to poll for updates to in-progress Conversations.
     Can also be called directly from a view.
     """
 
+    return run_coroutine_with_kwargs(async_poll_message_conversation, my_wallet, my_connection, message, initialize_vcx=initialize_vcx)
+
+
+async def async_poll_message_conversations(my_wallet, my_connection, due_only=False):
+    """
+    Poll all Conversations for updates (coroutine version).
+    The conversations are polled concurrently under a single VCX initialization.
+    If due_only is set, only conversations whose next poll time has passed are polled.
+    """
+
     try:
-        config_json = my_wallet.wallet_config
-        run_coroutine_with_args(vcx_init_with_config, config_json)
+        await vcx_sessions.acquire(my_wallet)
     except:
         raise
 
     try:
-        polled_count = 0
-
         # Any conversations of status 'Sent' are for bot processing ...
         messages = AgentConversation.objects.filter(connection__wallet=my_wallet, connection=my_connection, status='Sent')
-
-        for message in messages:
-            message = poll_message_conversation(my_wallet, my_connection, message, initialize_vcx=False)
-            polled_count = polled_count + 1
-            pass
+        if due_only:
+            messages = messages.filter(poll_due_filter())
+        messages = list(messages)
+
+        await asyncio.gather(*[
+            async_poll_message_conversation(my_wallet, my_connection, message, initialize_vcx=False)
+            for message in messages
+        ])
+        polled_count = len(messages)
     except:
         raise
     finally:
-        try:
-            shutdown(False)
-        except:
-            raise
+        vcx_sessions.release(my_wallet)
 
     return polled_count
 
 
+def poll_message_conversations(my_wallet, my_connection, due_only=False):
+    """
+    Background task to poll all Conversations for updates.
+    Can also be called directly from a view.
+    """
+
+    return run_coroutine_with_kwargs(async_poll_message_conversations, my_wallet, my_connection, due_only=due_only)
+
+
+######################################################################
+# utilities to receive new message notifications from the agency
+######################################################################
+
+def vcx_webhook_token(wallet_name):
+    """
+    Secret token that authenticates agency notifications for a wallet.
+    """
+
+    return salted_hmac('indy_community.agent_notification', wallet_name).hexdigest()
+
+
+def vcx_webhook_url(wallet_name):
+    """
+    URL the agency calls when a new message arrives for the wallet,
+    or None if push notifications are not configured (INDY_CONFIG['vcx_webhook_url']).
+    """
+
+    base_url = settings.INDY_CONFIG.get('vcx_webhook_url')
+    if not base_url:
+        return None
+    return '{}/{}/{}'.format(base_url.rstrip('/'), wallet_name, vcx_webhook_token(wallet_name))
+
+
+def check_vcx_webhook_token(wallet_name, token):
+    return constant_time_compare(vcx_webhook_token(wallet_name), token)
+
+
+def connection_pw_did(connection):
+    """
+    Our pairwise DID for the connection (from the serialized VCX connection).
+    """
+
+    return connection_data_pw_did(connection.connection_data)
+
+
+def connection_partner_did(connection):
+    """
+    Our partner's public DID for the connection, if they connected using it.
+    """
+
+    try:
+        connection_data = json.loads(connection.connection_data)
+        if isinstance(connection_data, str):
+            connection_data = json.loads(connection_data)
+    except ValueError:
+        return None
+    return connection_data.get('data', connection_data).get('their_public_did')
+
+
+def resolve_partner_did(connection):
+    """
+    Resolve our partner's public DID (see ledger_utils.resolve_did), or None.
+    """
+
+    partner_did = connection_partner_did(connection)
+    if not partner_did:
+        return None
+    return resolve_did(partner_did)
+
+
+def handle_message_notification(wallet, pw_did=None):
+    """
+    Mark the notified connection (or all of the wallet's connections, if no pairwise DID
+    is provided) and its in-flight conversations as due, so the next background sweep
+    fetches them from the agency.
+    Returns the number of connections marked.
+    """
+
+    connections = AgentConnection.objects.filter(wallet=wallet, status__in=['Sent', 'Active'])
+    if pw_did:
+        connections = connections.filter(pw_did=pw_did)
+
+    connection_ids = list(connections.values_list('id', flat=True))
+    AgentConnection.objects.filter(id__in=connection_ids).update(next_poll_at=None, poll_attempts=0)
+    AgentConversation.objects.filter(connection_id__in=connection_ids, status='Sent').update(next_poll_at=None, poll_attempts=0)
+
+    return len(connection_ids)
+
+
 ######################################################################
 # optional plug-in call-back for new and updated conversations
 ######################################################################
@@ -876,7 +1492,8 @@ def check_conversation_callback(message, prev_type, prev_status):
         mod = importlib.import_module(mod_name)
         func = getattr(mod, func_name)
 
-        func(message, prev_type, prev_status)
+        # events are raised from coroutines, call back once the event loop returns
+        call_after_coroutine(func, message, prev_type, prev_status)
 
 def check_connection_callback(connection, prev_status):
     """
@@ -889,5 +1506,6 @@ def check_connection_callback(connection, prev_status):
         mod = importlib.import_module(mod_name)
         func = getattr(mod, func_name)
 
-        func(connection, prev_status)
+        # events are raised from coroutines, call back once the event loop returns
+        call_after_coroutine(func, connection, prev_status)
 
@@ -1,5 +1,8 @@
 import asyncio
+import hashlib
+import os
 from pathlib import Path
+import tempfile
 from tempfile import gettempdir
 from os import environ
 import asyncio
@@ -13,6 +16,7 @@ import time
 import json
 
 import sys
+import threading
 from ctypes import *
 
 from indy import anoncreds, crypto, did, ledger, pool, wallet
@@ -20,7 +24,7 @@ from indy.error import ErrorCode, IndyError
 
 from django.conf import settings
 
-from .indy_state import set_pool_handle
+from .indy_state import ledger_pool, pool_config_lock
 
 
 PROTOCOL_VERSION = 2
@@ -30,24 +34,129 @@ def path_home() -> Path:
     return Path.home().joinpath(".indy_client")
 
 
-async def _fetch_url(the_url):
+async def _fetch_url(the_url, headers=None):
     async with aiohttp.ClientSession() as session:
-        async with session.get(the_url) as resp:
+        async with session.get(the_url, headers=headers) as resp:
             r_status = resp.status
             r_text = await resp.text()
-            return (r_status, r_text)
+            return (r_status, r_text, resp.headers)
+
+def _check_genesis_txn(data):
+    # check data is valid json
+    lines = data.splitlines()
+    if not lines or not json.loads(lines[0]):
+        raise Exception("Genesis transaction file is not valid JSON")
 
 async def _fetch_genesis_txn(genesis_url: str) -> bool:
     try:
-        (r_status, data) = await _fetch_url(genesis_url)
+        (r_status, data, r_headers) = await _fetch_url(genesis_url)
     except:
         raise
 
-    # check data is valid json
-    lines = data.splitlines()
-    if not lines or not json.loads(lines[0]):
-        raise Exception("Genesis transaction file is not valid JSON")
+    _check_genesis_txn(data)
+
+    return data
+
+
+######################################################################
+# genesis transaction file cache
+######################################################################
+
+# seconds a downloaded genesis file is used without checking the url again
+GENESIS_MAX_AGE = getattr(settings, "INDY_GENESIS_MAX_AGE", 86400)
+
+def genesis_cache_dir():
+    return Path(gettempdir()).joinpath("indy")
+
+
+def genesis_hash(data):
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def write_file_atomic(path, data):
+    """
+    Write a file via a temporary file and rename, so readers never see a partial file.
+    Returns False (and leaves the file alone) if it already has this content.
+    """
+
+    path = Path(path)
+    try:
+        with open(str(path), "r") as f:
+            if f.read() == data:
+                return False
+    except (IOError, OSError):
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    (fd, temp_path) = tempfile.mkstemp(dir=str(path.parent), prefix=path.name + '.')
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, str(path))
+    except:
+        os.unlink(temp_path)
+        raise
+    return True
+
+
+async def cached_genesis_txn(genesis_url):
+    """
+    Genesis transactions for the url, from the local cache if it is recent (or the url is
+    unreachable), otherwise downloaded with a conditional request (ETag / Last-Modified).
+    """
+
+    cache_name = "genesis-{}".format(genesis_hash(genesis_url)[:16])
+    data_path = genesis_cache_dir().joinpath(cache_name + ".txn")
+    meta_path = genesis_cache_dir().joinpath(cache_name + ".json")
+
+    cached = None
+    meta = {}
+    try:
+        with open(str(data_path), "r") as f:
+            cached = f.read()
+        with open(str(meta_path), "r") as f:
+            meta = json.loads(f.read())
+        if meta.get('sha256') != genesis_hash(cached):
+            cached = None
+    except (IOError, OSError, ValueError):
+        cached = None
+
+    if cached and time.time() - meta.get('fetched_at', 0) < GENESIS_MAX_AGE:
+        return cached
+
+    headers = {}
+    if cached and meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if cached and meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    try:
+        (r_status, data, r_headers) = await _fetch_url(genesis_url, headers=headers)
+    except Exception as e:
+        if cached:
+            print("Error fetching genesis from {}, using cached copy: {}".format(genesis_url, str(e)))
+            return cached
+        raise
 
+    if r_status == 304 and cached:
+        data = cached
+    elif r_status != 200:
+        if cached:
+            print("Error fetching genesis from {} ({}), using cached copy".format(genesis_url, r_status))
+            return cached
+        raise Exception("Error fetching genesis from {}: {}".format(genesis_url, r_status))
+    else:
+        _check_genesis_txn(data)
+        write_file_atomic(data_path, data)
+
+    meta = {
+        'url': genesis_url,
+        'sha256': genesis_hash(data),
+        'etag': r_headers.get('ETag', meta.get('etag')),
+        'last_modified': r_headers.get('Last-Modified', meta.get('last_modified')),
+        'fetched_at': time.time(),
+    }
+    write_file_atomic(meta_path, json.dumps(meta))
     return data
 
 
@@ -58,7 +167,7 @@ async def pool_genesis_txn_data():
     if 'vcx_genesis_url' in settings.INDY_CONFIG:
         # download from the genesis url, if specified
         genesis_url = settings.INDY_CONFIG['vcx_genesis_url']
-        genesis_txn = await _fetch_genesis_txn(genesis_url)
+        genesis_txn = await cached_genesis_txn(genesis_url)
     else:
         # this is the default if not specified
         pool_ip = environ.get("TEST_POOL_IP", "127.0.0.1")
@@ -75,20 +184,10 @@ async def pool_genesis_txn_data():
         ])
 
     indy_config = getattr(settings, 'INDY_CONFIG')
-    f = open(indy_config['vcx_genesis_path'], "w+")
-    f.write(genesis_txn)
-    f.close()
+    write_file_atomic(indy_config['vcx_genesis_path'], genesis_txn)
 
     return genesis_txn
 
-def run_coroutine(coroutine):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coroutine())
-    finally:
-        loop.close()
-
 async def get_pool_genesis_txn_path(pool_name):
     path_temp = Path(gettempdir()).joinpath("indy")
     path = path_temp.joinpath("{}.txn".format(pool_name))
@@ -98,18 +197,27 @@ async def get_pool_genesis_txn_path(pool_name):
 async def save_pool_genesis_txn_file(path):
     data = await pool_genesis_txn_data()
 
-    path.parent.mkdir(parents=True, exist_ok=True)
+    write_file_atomic(path, data)
 
-    with open(str(path), "w+") as f:
-        f.writelines(data)
 
+# 'eager' loads the plug-ins and opens the ledger pool when Django starts, 'lazy' on first use
+INDY_STARTUP_MODE = getattr(settings, "INDY_STARTUP_MODE", 'eager')
 
-class IndyCoreConfig(AppConfig):
-    name = 'indy_community'
+_plugins_lock = threading.Lock()
+_plugins_loaded = False
 
-    def ready(self):
-        # import login/logout signals
-        import indy_community.signals
+def load_indy_plugins():
+    """
+    Load the wallet storage and payment plug-ins into libindy (once per process).
+    """
+
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+
+    with _plugins_lock:
+        if _plugins_loaded:
+            return
 
         pg_dll = settings.INDY_CONFIG['storage_dll']
         pg_entrypoint = settings.INDY_CONFIG['storage_entrypoint']
@@ -118,7 +226,7 @@ class IndyCoreConfig(AppConfig):
         result = stg_lib[pg_entrypoint]()
         if result != 0:
             print('Error unable to load wallet storage {}'.format(result))
-            raise AppError('Error unable to load wallet storage {}'.format(result))
+            raise Exception('Error unable to load wallet storage {}'.format(result))
 
         pay_dll = settings.INDY_CONFIG['payment_dll']
         pay_entrypoint = settings.INDY_CONFIG['payment_entrypoint']
@@ -127,35 +235,84 @@ class IndyCoreConfig(AppConfig):
         result = pay_lib[pay_entrypoint]()
         if result != 0:
             print('Error unable to load payment plug-in {}'.format(result))
-            raise AppError('Error unable to load payment plug-in {}'.format(result))
+            raise Exception('Error unable to load payment plug-in {}'.format(result))
+
+        _plugins_loaded = True
+
+
+async def async_ensure_indy_ready():
+    """
+    Load the plug-ins and open the ledger pool (which writes the genesis file VCX uses).
+    """
 
-        pool_handle = run_coroutine(run)
-        set_pool_handle(pool_handle)
-        time.sleep(1)  # FIXME waiting for libindy thread complete
+    load_indy_plugins()
+    await ledger_pool.async_get_handle()
+
+
+def indy_warmup(background=True):
+    """
+    Initialize Indy ahead of the first request (call from the WSGI module in 'lazy' mode).
+    """
+
+    load_indy_plugins()
+    ledger_pool.warmup(background=background)
+
+
+class IndyCoreConfig(AppConfig):
+    name = 'indy_community'
+
+    def ready(self):
+        # import login/logout signals
+        import indy_community.signals
+
+        if INDY_STARTUP_MODE == 'lazy':
+            # plug-ins and pool are initialized on first use (or by indy_warmup())
+            return
+
+        # open the ledger pool in the background (ledger requests wait for it)
+        indy_warmup()
 
         print("App is ready!!!")
 
 
-async def run():
-    print("Getting started -> started")
+async def open_pool_ledger(pool_name):
+    """
+    Create (if necessary) and open the ledger pool.
+    Returns the pool handle and the genesis transaction file path.
+    """
 
-    pool_ = {
-        'name': 'pool1'
-    }
-    print("Open Pool Ledger: {}".format(pool_['name']))
-    pool_['genesis_txn_path'] = await get_pool_genesis_txn_path(pool_['name'])
-    print(pool_['genesis_txn_path'])
-    pool_['config'] = json.dumps({"genesis_txn": str(pool_['genesis_txn_path'])})
+    print("Open Pool Ledger: {}".format(pool_name))
 
     # Set protocol version 2 to work with Indy Node 1.4
     await pool.set_protocol_version(PROTOCOL_VERSION)
 
-    try:
-        await pool.create_pool_ledger_config(pool_['name'], pool_['config'])
-    except IndyError as ex:
-        if ex.error_code == ErrorCode.PoolLedgerConfigAlreadyExistsError:
-            pass
-    pool_handle = await pool.open_pool_ledger(pool_['name'], None)
+    # worker processes share the genesis file and pool config
+    with pool_config_lock(Path(gettempdir()).joinpath("indy").joinpath("{}.lock".format(pool_name))):
+        genesis_txn_path = await get_pool_genesis_txn_path(pool_name)
+        print(genesis_txn_path)
+        pool_config = json.dumps({"genesis_txn": str(genesis_txn_path)})
+
+        # the existing pool config is re-used unless the genesis transactions have changed
+        with open(str(genesis_txn_path), "r") as f:
+            txn_hash = genesis_hash(f.read())
+        hash_path = genesis_cache_dir().joinpath("{}.sha256".format(pool_name))
+        try:
+            with open(str(hash_path), "r") as f:
+                config_hash = f.read().strip()
+        except (IOError, OSError):
+            config_hash = None
+
+        try:
+            await pool.create_pool_ledger_config(pool_name, pool_config)
+        except IndyError as ex:
+            if ex.error_code != ErrorCode.PoolLedgerConfigAlreadyExistsError:
+                raise
+            if config_hash != txn_hash:
+                print("Genesis transactions changed, re-creating pool config {}".format(pool_name))
+                await pool.delete_pool_ledger_config(pool_name)
+                await pool.create_pool_ledger_config(pool_name, pool_config)
+        write_file_atomic(hash_path, txn_hash)
+
+    pool_handle = await pool.open_pool_ledger(pool_name, None)
     print("Returned pool handle", pool_handle)
-    return pool_handle
-
+    return (pool_handle, genesis_txn_path)
@@ -114,7 +114,7 @@ class PollConversationStatusForm(VisibleWalletNameForm):
 class SelectCredentialOfferForm(WalletNameForm):
     connection_id = forms.IntegerField(widget=forms.HiddenInput())
     partner_name = forms.CharField(label='Partner Name', max_length=60)
-    cred_def = forms.ModelChoiceField(label='Cred Def', queryset=IndyCredentialDefinition.objects.all())
+    cred_def = forms.ModelChoiceField(label='Cred Def', queryset=IndyCredentialDefinition.objects.filter(status='Active').all())
 
     def __init__(self, *args, **kwargs):
         super(SelectCredentialOfferForm, self).__init__(*args, **kwargs)
@@ -127,7 +127,7 @@ class SelectCredentialOfferForm(WalletNameForm):
         initial = kwargs.get('initial')
         if initial:
             wallet_name = initial.get('wallet_name')
-            self.fields['cred_def'].queryset = IndyCredentialDefinition.objects.filter(wallet__wallet_name=wallet_name).all()
+            self.fields['cred_def'].queryset = IndyCredentialDefinition.objects.filter(wallet__wallet_name=wallet_name, status='Active').all()
 
 
 class SendCredentialOfferForm(WalletNameForm):
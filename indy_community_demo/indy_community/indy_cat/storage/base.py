@@ -1,6 +1,7 @@
 """Abstract base classes for non-secrets storage."""
 
 from abc import ABC, abstractmethod
+from collections import deque
 from typing import Mapping, Sequence
 
 from .error import StorageDuplicateError, StorageNotFoundError
@@ -81,6 +82,42 @@ class BaseStorage(ABC):
 
         """
 
+    async def add_records(self, records: Sequence[StorageRecord]):
+        """
+        Add new records to the store.
+
+        Implementations should override this to write the batch more efficiently.
+
+        Args:
+            records: `StorageRecord`s to be stored
+
+        """
+        for record in records:
+            await self.add_record(record)
+
+    async def update_records(self, records: Sequence[StorageRecord]):
+        """
+        Update existing stored records' values and tags.
+
+        Args:
+            records: `StorageRecord`s with the new values and tags
+
+        """
+        for record in records:
+            await self.update_record_value(record, record.value)
+            await self.update_record_tags(record, record.tags)
+
+    async def delete_records(self, records: Sequence[StorageRecord]):
+        """
+        Delete existing records.
+
+        Args:
+            records: `StorageRecord`s to delete
+
+        """
+        for record in records:
+            await self.delete_record(record)
+
     @abstractmethod
     def search_records(
         self, type_filter: str, tag_query: Mapping = None, page_size: int = None
@@ -123,7 +160,7 @@ class BaseStorageRecordSearch(ABC):
             page_size: Size of page to return
 
         """
-        self._buffer = None
+        self._buffer = deque()
         self._page_size = page_size
         self._store = store
         self._tag_query = tag_query
@@ -206,19 +243,65 @@ class BaseStorageRecordSearch(ABC):
     async def fetch_all(self) -> Sequence[StorageRecord]:
         """Fetch all records from the query."""
         results = []
-        async for record in self:
-            results.append(record)
+        async for page in self.pages():
+            results.extend(page)
         return results
 
+    def fetch_iter(self) -> "BaseStorageRecordSearch":
+        """
+        Stream the query results, one record at a time.
+
+        Records are fetched a page at a time and are not collected, use as
+        `async for record in search.fetch_iter()`.
+
+        Returns:
+            An async iterator over the `StorageRecord`s
+
+        """
+        return self
+
+    def pages(self, page_size: int = None) -> "StorageRecordPages":
+        """
+        Iterate over the query results a page at a time.
+
+        Use as `async for page in search.pages()`.
+
+        Args:
+            page_size: Size of page to return (defaults to the search page size)
+
+        Returns:
+            An async iterator over lists of `StorageRecord`s
+
+        """
+        return StorageRecordPages(self, page_size or self.page_size)
+
     async def fetch_single(self) -> StorageRecord:
         """Fetch a single query result."""
-        results = await self.fetch_all()
+        results = []
+        async for page in self.pages(2):
+            results = page
+            break
+        if self.opened:
+            await self.close()
         if not results:
             raise StorageNotFoundError("Record not found")
         if len(results) > 1:
             raise StorageDuplicateError("Duplicate records found")
         return results[0]
 
+    async def _next_page(self, page_size: int) -> Sequence[StorageRecord]:
+        if not self.opened:
+            await self.open()
+        # records already buffered by record iteration come first
+        page = []
+        while self._buffer and len(page) < page_size:
+            page.append(self._buffer.popleft())
+        if len(page) < page_size:
+            page.extend(await self.fetch(page_size - len(page)))
+        if not page:
+            await self.close()
+        return page
+
     @abstractmethod
     async def open(self):
         """Start the search query."""
@@ -245,15 +328,39 @@ class BaseStorageRecordSearch(ABC):
         if not self.opened:
             await self.open()
         if not self._buffer:
-            self._buffer = await self.fetch(self.page_size)
+            self._buffer.extend(await self.fetch(self.page_size))
             if not self._buffer:
                 await self.close()
                 raise StopAsyncIteration
-        try:
-            return self._buffer.pop(0)
-        except IndexError:
-            raise StopAsyncIteration
+        return self._buffer.popleft()
 
     def __repr__(self) -> str:
         """Human readable representation of `BaseStorageRecordSearch`."""
         return "<{}>".format(self.__class__.__name__)
+
+
+class StorageRecordPages:
+    """Async iterator over the pages of a stored records search."""
+
+    def __init__(self, search: BaseStorageRecordSearch, page_size: int):
+        """
+        Initialize a `StorageRecordPages` instance.
+
+        Args:
+            search: `BaseStorageRecordSearch` to page through
+            page_size: Size of page to return
+
+        """
+        self._search = search
+        self._page_size = page_size
+
+    def __aiter__(self):
+        """Async iterator magic method."""
+        return self
+
+    async def __anext__(self):
+        """Async iterator magic method."""
+        page = await self._search._next_page(self._page_size)
+        if not page:
+            raise StopAsyncIteration
+        return page
@@ -1,7 +1,10 @@
 """Basic in-memory storage implementation (non-wallet)."""
 
+import operator
+import re
 from collections import OrderedDict
-from typing import Mapping, Sequence
+from itertools import count, islice
+from typing import Callable, Mapping, Sequence
 
 from .base import BaseStorage, BaseStorageRecordSearch
 from .error import (
@@ -26,6 +29,193 @@ class BasicStorage(BaseStorage):
 
         """
         self._records = OrderedDict()
+        # secondary indexes, kept in step with _records:
+        # record type -> {id: record} (in insertion order), (type, tag name, tag value) -> ids
+        self._type_index = {}
+        self._tag_index = {}
+        self._positions = {}
+        self._counter = count()
+        # record type -> number of open searches iterating its current {id: record}
+        self._readers = {}
+
+    def _index_tags(self, record: StorageRecord):
+        for name, value in (record.tags or {}).items():
+            if isinstance(value, str):
+                self._tag_index.setdefault((record.type, name, value), set()).add(
+                    record.id
+                )
+
+    def _unindex_tags(self, record: StorageRecord):
+        for name, value in (record.tags or {}).items():
+            if isinstance(value, str):
+                key = (record.type, name, value)
+                ids = self._tag_index.get(key)
+                if ids is not None:
+                    ids.discard(record.id)
+                    if not ids:
+                        del self._tag_index[key]
+
+    def _writable_type_records(self, record_type: str) -> OrderedDict:
+        # copy-on-write: open searches keep iterating the records they started
+        # with, the first write after they open copies that one record type
+        type_records = self._type_index.get(record_type)
+        if type_records is None:
+            type_records = self._type_index[record_type] = OrderedDict()
+        elif self._readers.pop(record_type, None):
+            type_records = self._type_index[record_type] = OrderedDict(type_records)
+        return type_records
+
+    def _store_record(self, record: StorageRecord):
+        self._records[record.id] = record
+        self._writable_type_records(record.type)[record.id] = record
+
+    def _index_record(self, record: StorageRecord):
+        self._store_record(record)
+        self._positions[record.id] = next(self._counter)
+        self._index_tags(record)
+
+    def _unindex_record(self, record: StorageRecord):
+        del self._records[record.id]
+        type_records = self._writable_type_records(record.type)
+        type_records.pop(record.id, None)
+        if not type_records:
+            del self._type_index[record.type]
+        self._positions.pop(record.id, None)
+        self._unindex_tags(record)
+
+    def _replace_tags(self, oldrec: StorageRecord, tags: dict):
+        self._unindex_tags(oldrec)
+        newrec = oldrec._replace(tags=tags)
+        self._store_record(newrec)
+        self._index_tags(newrec)
+
+    def _plan_query(self, type_filter: str, tag_query: Mapping):
+        # candidate ids for a (valid) WQL query from the tag index, or None when
+        # the query cannot narrow down the records of the type, and whether the
+        # candidates are exactly the matches (no need to check each record)
+        plans = []
+        exact = True
+        for key, value in tag_query.items():
+            if key == "$and":
+                (plan, term_exact) = self._plan_all(type_filter, value)
+            elif key == "$or":
+                subplans = [self._plan_query(type_filter, query) for query in value]
+                if any(subplan is None for (subplan, _) in subplans):
+                    (plan, term_exact) = (None, False)
+                else:
+                    plan = set().union(*[subplan for (subplan, _) in subplans])
+                    term_exact = all(subexact for (_, subexact) in subplans)
+            elif isinstance(value, str):
+                (plan, term_exact) = (self._tag_index.get((type_filter, key, value), _NO_IDS), True)
+            elif isinstance(value, dict) and "$in" in value:
+                plan = set().union(
+                    *[self._tag_index.get((type_filter, key, v), _NO_IDS) for v in value["$in"]]
+                )
+                term_exact = True
+            else:
+                (plan, term_exact) = (None, False)
+            if plan is not None:
+                plans.append(plan)
+            exact = exact and term_exact
+        return (self._intersect(plans), exact)
+
+    def _plan_all(self, type_filter: str, tag_queries: Sequence):
+        subplans = [self._plan_query(type_filter, query) for query in tag_queries]
+        return (
+            self._intersect([plan for (plan, _) in subplans if plan is not None]),
+            all(exact for (_, exact) in subplans),
+        )
+
+    def _intersect(self, plans: list):
+        if not plans:
+            return None
+        plans.sort(key=len)
+        if len(plans) == 1:
+            return plans[0]
+        return plans[0].intersection(*plans[1:])
+
+    def open_snapshot(self, type_filter: str, tag_query: Mapping = None):
+        """
+        Start iterating over the records matching a type and WQL tag query.
+
+        The records of the type are shared with the store, not copied: the
+        first write to that type while the snapshot is open copies them
+        (copy-on-write). The tag index narrows down the candidates (equality,
+        `$in`, `$and` and `$or` terms) and the compiled query is checked against
+        each candidate.
+
+        Args:
+            type_filter: The record type
+            tag_query: Tags to query
+
+        Returns:
+            A tuple of the snapshot, to pass to `close_snapshot`, and an iterator
+            over the matching `StorageRecord`s in insertion order
+
+        Raises:
+            StorageSearchError: If the tag query is not valid WQL
+
+        """
+        match = compile_tag_query(tag_query)
+        type_records = self._type_index.get(type_filter)
+        if not type_records:
+            return (None, iter(()))
+        self._readers[type_filter] = self._readers.get(type_filter, 0) + 1
+        snapshot = (type_filter, type_records)
+        if not tag_query:
+            return (snapshot, iter(type_records.values()))
+        (planned, exact) = self._plan_query(type_filter, tag_query)
+        if planned is None:
+            return (
+                snapshot,
+                (record for record in type_records.values() if match(record.tags)),
+            )
+        if exact:
+            ids = list(planned)
+        else:
+            ids = [id for id in planned if match(type_records[id].tags)]
+        ids.sort(key=self._positions.__getitem__)
+        return (snapshot, (type_records[id] for id in ids))
+
+    def close_snapshot(self, snapshot):
+        """
+        Finish iterating over a snapshot from `open_snapshot`.
+
+        Args:
+            snapshot: The snapshot
+
+        """
+        if snapshot is None:
+            return
+        (record_type, type_records) = snapshot
+        # only the current records of the type are shared with the store
+        if self._type_index.get(record_type) is type_records:
+            readers = self._readers.get(record_type, 0) - 1
+            if 0 < readers:
+                self._readers[record_type] = readers
+            else:
+                self._readers.pop(record_type, None)
+
+    def find_record_ids(self, type_filter: str, tag_query: Mapping = None) -> list:
+        """
+        Find the IDs of records matching a type and WQL tag query.
+
+        Args:
+            type_filter: The record type
+            tag_query: Tags to query
+
+        Returns:
+            A list of record IDs, in insertion order
+
+        Raises:
+            StorageSearchError: If the tag query is not valid WQL
+
+        """
+        (snapshot, records) = self.open_snapshot(type_filter, tag_query)
+        try:
+            return [record.id for record in records]
+        finally:
+            self.close_snapshot(snapshot)
 
     async def add_record(self, record: StorageRecord):
         """
@@ -45,7 +235,7 @@ class BasicStorage(BaseStorage):
             raise StorageError("Record has no ID")
         if record.id in self._records:
             raise StorageDuplicateError("Duplicate record")
-        self._records[record.id] = record
+        self._index_record(record)
 
     async def get_record(self, record_type: str, record_id: str) -> StorageRecord:
         """
@@ -83,7 +273,7 @@ class BasicStorage(BaseStorage):
         oldrec = self._records.get(record.id)
         if not oldrec:
             raise StorageNotFoundError("Record not found: {}".format(record.id))
-        self._records[record.id] = oldrec._replace(value=value)
+        self._store_record(oldrec._replace(value=value))
 
     async def update_record_tags(self, record: StorageRecord, tags: Mapping):
         """
@@ -100,7 +290,7 @@ class BasicStorage(BaseStorage):
         oldrec = self._records.get(record.id)
         if not oldrec:
             raise StorageNotFoundError("Record not found: {}".format(record.id))
-        self._records[record.id] = oldrec._replace(tags=dict(tags or {}))
+        self._replace_tags(oldrec, dict(tags or {}))
 
     async def delete_record_tags(
         self, record: StorageRecord, tags: (Sequence, Mapping)
@@ -124,7 +314,7 @@ class BasicStorage(BaseStorage):
             for tag in tags:
                 if tag in newtags:
                     del newtags[tag]
-        self._records[record.id] = oldrec._replace(tags=newtags)
+        self._replace_tags(oldrec, newtags)
 
     async def delete_record(self, record: StorageRecord):
         """
@@ -139,7 +329,77 @@ class BasicStorage(BaseStorage):
         """
         if record.id not in self._records:
             raise StorageNotFoundError("Record not found: {}".format(record.id))
-        del self._records[record.id]
+        self._unindex_record(self._records[record.id])
+
+    async def add_records(self, records: Sequence[StorageRecord]):
+        """
+        Add new records to the store.
+
+        All records are checked before any is added, so either all or none are stored.
+
+        Args:
+            records: `StorageRecord`s to be stored
+
+        Raises:
+            StorageError: If a record is missing or has no ID
+            StorageDuplicateError: If a record ID is already stored or repeated
+
+        """
+        ids = set()
+        for record in records:
+            if not record:
+                raise StorageError("No record provided")
+            if not record.id:
+                raise StorageError("Record has no ID")
+            if record.id in self._records or record.id in ids:
+                raise StorageDuplicateError("Duplicate record")
+            ids.add(record.id)
+        for record in records:
+            self._index_record(record)
+
+    async def update_records(self, records: Sequence[StorageRecord]):
+        """
+        Update existing stored records' values and tags.
+
+        All records are checked before any is updated.
+
+        Args:
+            records: `StorageRecord`s with the new values and tags
+
+        Raises:
+            StorageNotFoundError: If a record is not found
+
+        """
+        for record in records:
+            if record.id not in self._records:
+                raise StorageNotFoundError("Record not found: {}".format(record.id))
+        for record in records:
+            oldrec = self._records[record.id]
+            self._unindex_tags(oldrec)
+            newrec = oldrec._replace(value=record.value, tags=dict(record.tags or {}))
+            self._store_record(newrec)
+            self._index_tags(newrec)
+
+    async def delete_records(self, records: Sequence[StorageRecord]):
+        """
+        Delete existing records.
+
+        All records are checked before any is deleted.
+
+        Args:
+            records: `StorageRecord`s to delete
+
+        Raises:
+            StorageNotFoundError: If a record is not found
+
+        """
+        ids = OrderedDict()
+        for record in records:
+            if record.id not in self._records:
+                raise StorageNotFoundError("Record not found: {}".format(record.id))
+            ids[record.id] = None
+        for id in ids:
+            self._unindex_record(self._records[id])
 
     def search_records(
         self, type_filter: str, tag_query: Mapping = None, page_size: int = None
@@ -159,21 +419,113 @@ class BasicStorage(BaseStorage):
         return BasicStorageRecordSearch(self, type_filter, tag_query, page_size)
 
 
-def basic_tag_query_match(tags: dict, tag_query: dict) -> bool:
-    """Match simple tag filters (string values).
+WQL_COMPARISONS = {
+    "$neq": operator.ne,
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+_NO_IDS = frozenset()
+
+
+def _like_regex(pattern: str):
+    # SQL LIKE pattern, case-insensitive like the default (sqlite) indy wallet
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts) + r"\Z", re.DOTALL | re.IGNORECASE)
+
 
-    TODO: implement more complex queries like $or
+def _match_all(checks: list) -> Callable[[Mapping], bool]:
+    if len(checks) == 1:
+        return checks[0]
+    return lambda tags: all(check(tags) for check in checks)
+
+
+def _match_any(checks: list) -> Callable[[Mapping], bool]:
+    return lambda tags: any(check(tags) for check in checks)
+
+
+def _match_none(check: Callable[[Mapping], bool]) -> Callable[[Mapping], bool]:
+    return lambda tags: not check(tags)
+
+
+def _match_tag(name: str, value) -> Callable[[Mapping], bool]:
+    if isinstance(value, str):
+        return lambda tags: tags.get(name) == value
+    if not isinstance(value, dict) or len(value) != 1:
+        raise StorageSearchError("Unsupported WQL value for tag {}: {}".format(name, value))
+    op, arg = next(iter(value.items()))
+    if op == "$in":
+        if not isinstance(arg, list) or not all(isinstance(v, str) for v in arg):
+            raise StorageSearchError("WQL $in expects a list of strings: {}".format(arg))
+        values = frozenset(arg)
+        return lambda tags: tags.get(name) in values
+    if not isinstance(arg, str):
+        raise StorageSearchError("WQL {} expects a string: {}".format(op, arg))
+    if op == "$like":
+        regex = _like_regex(arg)
+        return lambda tags: name in tags and regex.match(tags[name]) is not None
+    compare = WQL_COMPARISONS.get(op)
+    if not compare:
+        raise StorageSearchError("Unsupported WQL operator: {}".format(op))
+    return lambda tags: name in tags and compare(tags[name], arg)
+
+
+def _match_queries(op: str, tag_queries) -> list:
+    if not isinstance(tag_queries, list):
+        raise StorageSearchError("WQL {} expects a list of queries".format(op))
+    return [compile_tag_query(tag_query) for tag_query in tag_queries]
+
+
+def compile_tag_query(tag_query: Mapping) -> Callable[[Mapping], bool]:
     """
-    result = True
-    if not tags:
-        tags = {}
-    if tag_query:
-        for k, v in tag_query.items():
-            if isinstance(v, str):  # not handling complex queries
-                if tags.get(k) != v:
-                    result = False
-                    break
-    return result
+    Compile a WQL tag query into a predicate on a record's tags.
+
+    Supports tag equality, `$neq`, `$gt`, `$gte`, `$lt`, `$lte`, `$like` and `$in`
+    on tag values and `$and`, `$or` and `$not` on queries, as for `IndyStorage`.
+
+    Args:
+        tag_query: Tags to query
+
+    Returns:
+        A function returning True if the given tags match
+
+    Raises:
+        StorageSearchError: If the tag query is not valid WQL
+
+    """
+    if not tag_query:
+        return lambda tags: True
+    if not isinstance(tag_query, dict):
+        raise StorageSearchError("WQL query must be a dict: {}".format(tag_query))
+    checks = []
+    for key, value in tag_query.items():
+        if key == "$and":
+            checks.append(_match_all(_match_queries(key, value) or [lambda tags: True]))
+        elif key == "$or":
+            checks.append(_match_any(_match_queries(key, value)))
+        elif key == "$not":
+            if not isinstance(value, dict):
+                raise StorageSearchError("WQL $not expects a query")
+            checks.append(_match_none(compile_tag_query(value)))
+        elif key.startswith("$"):
+            raise StorageSearchError("Unsupported WQL operator: {}".format(key))
+        else:
+            checks.append(_match_tag(key, value))
+    return _match_all(checks)
+
+
+def basic_tag_query_match(tags: dict, tag_query: dict) -> bool:
+    """Match a record's tags against a WQL tag query."""
+    return compile_tag_query(tag_query)(tags or {})
 
 
 class BasicStorageRecordSearch(BaseStorageRecordSearch):
@@ -199,7 +551,7 @@ class BasicStorageRecordSearch(BaseStorageRecordSearch):
         super(BasicStorageRecordSearch, self).__init__(
             store, type_filter, tag_query, page_size
         )
-        self._cache = None
+        self._snapshot = None
         self._iter = None
 
     @property
@@ -211,7 +563,7 @@ class BasicStorageRecordSearch(BaseStorageRecordSearch):
             True if opened, else False
 
         """
-        return self._cache is not None
+        return self._iter is not None
 
     async def fetch(self, max_count: int) -> Sequence[StorageRecord]:
         """
@@ -229,27 +581,17 @@ class BasicStorageRecordSearch(BaseStorageRecordSearch):
         """
         if not self.opened:
             raise StorageSearchError("Search query has not been opened")
-        ret = []
-        check_type = self.type_filter
-        i = max_count
-        while i > 0:
-            try:
-                id = next(self._iter)
-            except StopIteration:
-                break
-            record = self._cache[id]
-            if record.type == check_type and basic_tag_query_match(
-                record.tags, self.tag_query
-            ):
-                ret.append(record)
-                i -= 1
-        return ret
+        return list(islice(self._iter, max_count))
 
     async def open(self):
         """Start the search query."""
-        self._cache = self._store._records.copy()
-        self._iter = iter(self._cache)
+        (self._snapshot, self._iter) = self._store.open_snapshot(
+            self.type_filter, self.tag_query
+        )
 
     async def close(self):
         """Dispose of the search query."""
-        self._cache = None
+        if self._iter is not None:
+            self._store.close_snapshot(self._snapshot)
+        self._snapshot = None
+        self._iter = None
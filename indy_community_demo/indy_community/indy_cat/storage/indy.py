@@ -1,5 +1,6 @@
 """Indy implementation of BaseStorage interface."""
 
+import asyncio
 import json
 from typing import Mapping, Sequence
 
@@ -16,6 +17,9 @@ from .error import (
 from .record import StorageRecord
 #from ..wallet.indy import IndyWallet
 
+# max number of concurrent libindy calls made by the batch operations
+BATCH_CONCURRENCY = 20
+
 
 def _validate_record(record: StorageRecord):
     if not record:
@@ -29,15 +33,17 @@ def _validate_record(record: StorageRecord):
 class IndyStorage(BaseStorage):
     """Indy Non-Secrets interface."""
 
-    def __init__(self, wallet_handle):
+    def __init__(self, wallet_handle, batch_concurrency: int = BATCH_CONCURRENCY):
         """
         Initialize a `BasicStorage` instance.
 
         Args:
             wallet: The indy wallet instance to use
+            batch_concurrency: Max concurrent libindy calls for batch operations
 
         """
         self._wallet_handle = wallet_handle
+        self._batch_concurrency = batch_concurrency
 
     @property
     def wallet_handle(self):
@@ -194,6 +200,76 @@ class IndyStorage(BaseStorage):
                 raise StorageNotFoundError("Record not found: {}".format(record.id))
             raise StorageError(str(x_indy))
 
+    async def _write_batch(self, records: Sequence[StorageRecord], write):
+        # libindy has no batch API, keep several wallet calls in flight instead
+        for record in records:
+            _validate_record(record)
+        semaphore = asyncio.Semaphore(self._batch_concurrency)
+
+        async def write_record(record):
+            async with semaphore:
+                await write(record)
+
+        results = await asyncio.gather(
+            *[write_record(record) for record in records], return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def add_records(self, records: Sequence[StorageRecord]):
+        """
+        Add new records to the store, with concurrent libindy calls.
+
+        Not atomic: after a failure the other records are still written.
+
+        Args:
+            records: `StorageRecord`s to be stored
+
+        Raises:
+            StorageDuplicateError: If a record ID is already stored
+            StorageError: If a libindy error occurs
+
+        """
+        await self._write_batch(records, self.add_record)
+
+    async def update_records(self, records: Sequence[StorageRecord]):
+        """
+        Update existing stored records' values and tags, with concurrent libindy calls.
+
+        Not atomic: after a failure the other records are still updated.
+
+        Args:
+            records: `StorageRecord`s with the new values and tags
+
+        Raises:
+            StorageNotFoundError: If a record is not found
+            StorageError: If a libindy error occurs
+
+        """
+
+        async def update(record):
+            await self.update_record_value(record, record.value)
+            await self.update_record_tags(record, record.tags)
+
+        await self._write_batch(records, update)
+
+    async def delete_records(self, records: Sequence[StorageRecord]):
+        """
+        Delete existing records, with concurrent libindy calls.
+
+        Not atomic: after a failure the other records are still deleted.
+
+        Args:
+            records: `StorageRecord`s to delete
+
+        Raises:
+            StorageNotFoundError: If a record is not found
+            StorageError: If a libindy error occurs
+
+        """
+        await self._write_batch(records, self.delete_record)
+
     def search_records(
         self, type_filter: str, tag_query: Mapping = None, page_size: int = None
     ) -> "IndyStorageRecordSearch":
@@ -1 +1 @@
-from .storage_tests import WalletStorageTests
+from .storage_tests import WalletStorageTests, BasicStorageTests
@@ -7,6 +7,8 @@ from indy_community.models import *
 from indy_community.wallet_utils import *
 from indy_community.utils import *
 
+from ..basic import *
+from ..error import StorageDuplicateError, StorageNotFoundError, StorageSearchError
 from ..indy import *
 from ..record import *
 
@@ -45,3 +47,178 @@ class WalletStorageTests(TestCase):
         res = delete_wallet(user_wallet_name, raw_password)
         self.assertEqual(res, 0)
 
+
+    def test_wallet_storage_batch(self):
+        user_name = random_alpha_string(10) + '@mail.com'
+        raw_password = 'pass1234'
+        user_wallet_name = get_user_wallet_name(user_name)
+
+        res = create_wallet(user_wallet_name, raw_password)
+        self.assertEqual(res, 0)
+        wallet_handle = open_wallet(user_wallet_name, raw_password)
+        storage = IndyStorage(wallet_handle=wallet_handle)
+
+        records = [StorageRecord(type="tester", value=str(i), tags={"parity": str(i % 2)}) for i in range(50)]
+        run_coroutine_with_args(storage.add_records, records)
+        with self.assertRaises(StorageDuplicateError):
+            run_coroutine_with_args(storage.add_records, records[:2])
+
+        run_coroutine_with_args(storage.update_records, [record._replace(value="updated", tags={"parity": "2"}) for record in records[:10]])
+        updated = run_coroutine(storage.search_records("tester", {"parity": "2"}).fetch_all)
+        self.assertEqual(sorted(record.id for record in updated), sorted(record.id for record in records[:10]))
+        self.assertTrue(all(record.value == "updated" for record in updated))
+
+        run_coroutine_with_args(storage.delete_records, records)
+        self.assertEqual(run_coroutine(storage.search_records("tester").fetch_all), [])
+
+        res = close_wallet(wallet_handle)
+        self.assertEqual(res, 0)
+        res = delete_wallet(user_wallet_name, raw_password)
+        self.assertEqual(res, 0)
+
+
+class BasicStorageTests(TestCase):
+    """
+    Tests for the in-memory storage class
+    """
+
+    def search(self, storage, type_filter, tag_query=None):
+        search = storage.search_records(type_filter, tag_query)
+        return [record.id for record in run_coroutine(search.fetch_all)]
+
+    def test_basic_storage_tag_index(self):
+        storage = BasicStorage()
+        records = [StorageRecord(type="tester", value=str(i), tags={"parity": str(i % 2), "tens": str(i // 10)}, id=str(i)) for i in range(30)]
+        for record in records:
+            run_coroutine_with_args(storage.add_record, record)
+        run_coroutine_with_args(storage.add_record, StorageRecord(type="other", value="x", tags={"parity": "0"}, id="other"))
+
+        self.assertEqual(self.search(storage, "tester"), [str(i) for i in range(30)])
+        self.assertEqual(self.search(storage, "tester", {"parity": "0", "tens": "1"}), ["10", "12", "14", "16", "18"])
+        self.assertEqual(self.search(storage, "tester", {"parity": "2"}), [])
+        self.assertEqual(self.search(storage, "missing", {"parity": "0"}), [])
+
+        # indexes follow tag updates and deletes
+        run_coroutine_with_args(storage.update_record_tags, records[12], {"parity": "1", "tens": "1"})
+        run_coroutine_with_args(storage.delete_record_tags, records[14], ["tens"])
+        run_coroutine_with_args(storage.delete_record, records[16])
+        self.assertEqual(self.search(storage, "tester", {"parity": "0", "tens": "1"}), ["10", "18"])
+        self.assertEqual(self.search(storage, "tester", {"parity": "1", "tens": "1"}), ["11", "12", "13", "15", "17", "19"])
+        self.assertEqual(len(self.search(storage, "tester")), 29)
+
+    def test_basic_storage_wql(self):
+        storage = BasicStorage()
+        for i in range(30):
+            tags = {"parity": str(i % 2), "~num": "{:02d}".format(i), "name": "Record-{}".format(i)}
+            if i % 5:
+                tags["fives"] = "no"
+            run_coroutine_with_args(storage.add_record, StorageRecord(type="tester", value=str(i), tags=tags, id=str(i)))
+
+        self.assertEqual(self.search(storage, "tester", {"~num": {"$in": ["03", "07", "99"]}}), ["3", "7"])
+        self.assertEqual(self.search(storage, "tester", {"~num": {"$gte": "25"}, "parity": "1"}), ["25", "27", "29"])
+        self.assertEqual(self.search(storage, "tester", {"~num": {"$lt": "02"}}), ["0", "1"])
+        self.assertEqual(self.search(storage, "tester", {"name": {"$like": "record-2_"}, "parity": {"$neq": "0"}}),
+                         ["21", "23", "25", "27", "29"])
+        self.assertEqual(self.search(storage, "tester", {"$or": [{"~num": "04"}, {"~num": "28"}]}), ["4", "28"])
+        self.assertEqual(self.search(storage, "tester", {"$and": [{"parity": "0"}, {"$not": {"fives": "no"}}]}),
+                         ["0", "10", "20"])
+        # $neq does not match records without the tag
+        self.assertEqual(self.search(storage, "tester", {"fives": {"$neq": "yes"}, "~num": {"$lte": "05"}}),
+                         ["1", "2", "3", "4"])
+        self.assertEqual(self.search(storage, "tester", {"$or": []}), [])
+
+        for tag_query in ({"parity": {"$regex": "1"}}, {"$nor": []}, {"parity": 1}, {"$or": {"parity": "1"}}):
+            with self.assertRaises(StorageSearchError):
+                self.search(storage, "tester", tag_query)
+
+    def test_basic_storage_search_pages(self):
+        storage = BasicStorage()
+        for i in range(25):
+            run_coroutine_with_args(storage.add_record, StorageRecord(type="tester", value=str(i), tags={"parity": str(i % 2)}, id=str(i)))
+
+        async def page_sizes(search):
+            sizes = []
+            async for page in search.pages():
+                sizes.append(len(page))
+            return sizes
+
+        async def stream(search):
+            ids = []
+            async for record in search.fetch_iter():
+                ids.append(record.id)
+            return ids
+
+        # pages pick up after records already taken one at a time
+        async def mixed(search):
+            first = await search.__anext__()
+            page = await search.pages(3).__anext__()
+            await search.close()
+            return [first.id] + [record.id for record in page]
+
+        self.assertEqual(run_coroutine_with_args(page_sizes, storage.search_records("tester", page_size=10)), [10, 10, 5])
+        self.assertEqual(run_coroutine_with_args(stream, storage.search_records("tester", {"parity": "1"}, page_size=4)),
+                         [str(i) for i in range(1, 25, 2)])
+        self.assertEqual(run_coroutine_with_args(mixed, storage.search_records("tester", page_size=2)), ["0", "1", "2", "3"])
+
+        records = run_coroutine(storage.search_records("tester", {"parity": "1", "$not": {"parity": {"$lt": "1"}}}, page_size=1).fetch_all)
+        self.assertEqual(len(records), 12)
+        records = run_coroutine(storage.search_records("tester", {"$or": [{"parity": "0"}, {"parity": "1"}], "value": "x"}).fetch_all)
+        self.assertEqual(records, [])
+        search = storage.search_records("tester", {"parity": "0"})
+        with self.assertRaises(StorageDuplicateError):
+            run_coroutine(search.fetch_single)
+        self.assertFalse(search.opened)
+        with self.assertRaises(StorageNotFoundError):
+            run_coroutine(storage.search_records("tester", {"parity": "2"}).fetch_single)
+
+    def test_basic_storage_search_snapshot(self):
+        storage = BasicStorage()
+        records = [StorageRecord(type="tester", value=str(i), tags={"parity": str(i % 2)}, id=str(i)) for i in range(10)]
+        for record in records:
+            run_coroutine_with_args(storage.add_record, record)
+
+        # writes made while a search is open don't change its results
+        async def search_while_writing(search, update, delete, add):
+            await search.open()
+            values = [record.value for record in await search.fetch(2)]
+            await storage.update_record_value(update, "updated")
+            await storage.delete_record(delete)
+            await storage.add_record(add)
+            values.extend([record.value for record in await search.fetch(100)])
+            await search.close()
+            return values
+
+        self.assertEqual(run_coroutine_with_args(search_while_writing, storage.search_records("tester"),
+                                                 records[4], records[6], StorageRecord(type="tester", value="10", tags={"parity": "0"}, id="10")),
+                         [str(i) for i in range(10)])
+        self.assertEqual(run_coroutine_with_args(search_while_writing, storage.search_records("tester", {"parity": "0"}),
+                                                 records[2], records[8], StorageRecord(type="tester", value="12", tags={"parity": "0"}, id="12")),
+                         ["0", "2", "updated", "8", "10"])
+        self.assertEqual(self.search(storage, "tester", {"parity": "0"}), ["0", "2", "4", "10", "12"])
+
+        # records are only copied for writes while a search is open
+        type_records = storage._type_index["tester"]
+        self.search(storage, "tester")
+        run_coroutine_with_args(storage.update_record_value, records[0], "zero")
+        self.assertIs(storage._type_index["tester"], type_records)
+
+    def test_basic_storage_batch(self):
+        storage = BasicStorage()
+        records = [StorageRecord(type="tester", value=str(i), tags={"parity": str(i % 2)}, id=str(i)) for i in range(10)]
+        run_coroutine_with_args(storage.add_records, records)
+        self.assertEqual(self.search(storage, "tester", {"parity": "1"}), ["1", "3", "5", "7", "9"])
+
+        # a failing batch writes nothing
+        with self.assertRaises(StorageDuplicateError):
+            run_coroutine_with_args(storage.add_records, [StorageRecord(type="tester", value="10", id="10"), records[0]])
+        with self.assertRaises(StorageNotFoundError):
+            run_coroutine_with_args(storage.delete_records, [records[0], StorageRecord(type="tester", value="x", id="x")])
+        self.assertEqual(len(self.search(storage, "tester")), 10)
+
+        run_coroutine_with_args(storage.update_records, [record._replace(value="odd", tags={"parity": "1"}) for record in records[:4]])
+        self.assertEqual(self.search(storage, "tester", {"parity": "1"}), ["0", "1", "2", "3", "5", "7", "9"])
+        self.assertEqual(run_coroutine_with_kwargs(storage.get_record, record_type="tester", record_id="2").value, "odd")
+
+        run_coroutine_with_args(storage.delete_records, records[::2])
+        self.assertEqual(self.search(storage, "tester"), ["1", "3", "5", "7", "9"])
+        self.assertEqual(self.search(storage, "tester", {"parity": "0"}), [])
@@ -1,14 +1,273 @@
+import asyncio
+from contextlib import contextmanager
+import json
+import threading
+import time
 
+from django.conf import settings
 
-ledger_pool_handle = None
+from indy import ledger, pool
+from indy.error import ErrorCode, IndyError
+
+from .utils import run_coroutine, close_thread_event_loop
+
+try:
+    import fcntl
+except ImportError:
+    # no inter-process locking on Windows
+    fcntl = None
+
+
+######################################################################
+# ledger pool handle lifecycle
+######################################################################
+
+POOL_NAME = 'pool1'
+# seconds between refreshes of the validator pool (0 to disable)
+POOL_REFRESH_INTERVAL = getattr(settings, "INDY_POOL_REFRESH_INTERVAL", 3600)
+# seconds to wait for each node when probing node health
+POOL_PROBE_TIMEOUT = getattr(settings, "INDY_POOL_PROBE_TIMEOUT", 10)
+
+# errors after which the pool handle is re-opened
+POOL_RECONNECT_ERRORS = (ErrorCode.PoolLedgerInvalidPoolHandle, ErrorCode.PoolLedgerTerminated, ErrorCode.PoolLedgerTimeout)
+
+
+@contextmanager
+def pool_config_lock(lock_path):
+    """
+    Serialize genesis/pool config setup between worker processes.
+    """
+
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(str(lock_path), "a+") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+class LedgerPoolManager(object):
+    """
+    Owns the ledger pool handle: opens it on first use (or in the background with warmup()),
+    refreshes the validator pool on a schedule, and re-opens it after pool failures.
+    """
+
+    def __init__(self, pool_name=POOL_NAME, refresh_interval=POOL_REFRESH_INTERVAL):
+        self.pool_name = pool_name
+        self.refresh_interval = refresh_interval
+        self.lock = threading.RLock()
+        self.pool_handle = None
+        self.genesis_txn_path = None
+        self.opened_at = None
+        self.refreshed_at = None
+        self._refreshing = False
+        self.last_error = None
+        self.requests = 0
+        self.failures = 0
+        self.reconnects = 0
+        self.total_latency = 0.0
+        self.nodes = {}
+
+    def get_handle(self):
+        """
+        Return the open pool handle, opening the pool if necessary.
+        """
+
+        with self.lock:
+            if self.pool_handle is None:
+                self._open()
+            elif self._refresh_due():
+                self._refresh_in_background()
+            return self.pool_handle
+
+    async def async_get_handle(self):
+        """
+        Return the open pool handle (coroutine version, opens the pool in a worker thread).
+        """
+
+        if self.pool_handle is not None and not self._refresh_due():
+            return self.pool_handle
+        return await asyncio.get_event_loop().run_in_executor(None, self.get_handle)
+
+    def set_handle(self, pool_handle):
+        with self.lock:
+            self.pool_handle = pool_handle
+            self.opened_at = time.time()
+            self.refreshed_at = time.monotonic()
+
+    def warmup(self, background=True):
+        """
+        Open the pool ahead of the first ledger request.
+        """
+
+        if not background:
+            return self.get_handle()
+        threading.Thread(target=self._warmup, name='indy-pool-warmup', daemon=True).start()
+
+    def _warmup(self):
+        try:
+            self.get_handle()
+        except Exception as e:
+            print("Error opening ledger pool", str(e))
+        finally:
+            close_thread_event_loop()
+
+    def report_failure(self, pool_handle, error=None):
+        """
+        Close the pool handle after a pool error, so it is re-opened on next use.
+        """
+
+        with self.lock:
+            self.failures = self.failures + 1
+            self.last_error = str(error) if error else None
+            if pool_handle is None or pool_handle != self.pool_handle:
+                return
+            self.pool_handle = None
+            self.reconnects = self.reconnects + 1
+        try:
+            run_coroutine(lambda: pool.close_pool_ledger(pool_handle))
+        except IndyError:
+            pass
+
+    async def submit_request(self, request):
+        """
+        Submit a ledger read request, re-opening the pool and retrying once after a pool failure.
+        """
+
+        return await self._submit(ledger.submit_request, request)
+
+    async def sign_and_submit_request(self, wallet_handle, submitter_did, request):
+        """
+        Sign and submit a ledger write request, re-opening the pool and retrying once after a
+        pool failure (the ledger recognizes a re-sent request by its request id).
+        """
+
+        async def sign_and_submit(pool_handle, request):
+            return await ledger.sign_and_submit_request(pool_handle, wallet_handle, submitter_did, request)
+
+        return await self._submit(sign_and_submit, request)
+
+    async def _submit(self, submit, request):
+        pool_handle = await self.async_get_handle()
+        start = time.monotonic()
+        try:
+            response = await submit(pool_handle, request)
+        except IndyError as e:
+            if e.error_code not in POOL_RECONNECT_ERRORS:
+                raise
+            await asyncio.get_event_loop().run_in_executor(None, self.report_failure, pool_handle, e)
+            pool_handle = await self.async_get_handle()
+            response = await submit(pool_handle, request)
+        with self.lock:
+            self.requests = self.requests + 1
+            self.total_latency = self.total_latency + (time.monotonic() - start)
+        return response
+
+    def node_aliases(self):
+        """
+        Validator node aliases listed in the genesis transactions.
+        """
+
+        aliases = []
+        if self.genesis_txn_path is None:
+            return aliases
+        with open(str(self.genesis_txn_path)) as genesis_file:
+            for line in genesis_file:
+                if not line.strip():
+                    continue
+                txn = json.loads(line)
+                data = txn['txn']['data']['data'] if 'txn' in txn else txn['data']
+                aliases.append(data['alias'])
+        return aliases
+
+    async def async_probe_nodes(self, timeout=POOL_PROBE_TIMEOUT):
+        """
+        Send a small read (the first pool transaction) to each node and record its latency.
+        """
+
+        pool_handle = await self.async_get_handle()
+        request = await ledger.build_get_txn_request(None, 'POOL', 1)
+
+        async def probe(alias):
+            start = time.monotonic()
+            try:
+                response = json.loads(await ledger.submit_action(pool_handle, request, json.dumps([alias]), timeout))
+                reply = response.get(alias)
+                ok = reply is not None and 'timeout' != reply and json.loads(reply).get('op') == 'REPLY'
+            except (IndyError, ValueError):
+                ok = False
+            return (alias, {'ok': ok, 'latency': time.monotonic() - start, 'checked_at': time.time()})
+
+        results = await asyncio.gather(*[probe(alias) for alias in self.node_aliases()])
+        with self.lock:
+            self.nodes.update(dict(results))
+        return dict(results)
+
+    def probe_nodes(self, timeout=POOL_PROBE_TIMEOUT):
+        return run_coroutine(lambda: self.async_probe_nodes(timeout=timeout))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'open': self.pool_handle is not None,
+                'opened_at': self.opened_at,
+                'requests': self.requests,
+                'failures': self.failures,
+                'reconnects': self.reconnects,
+                'avg_latency': self.total_latency / self.requests if 0 < self.requests else None,
+                'last_error': self.last_error,
+                'nodes': dict(self.nodes),
+            }
+
+    def _refresh_due(self):
+        return (0 < self.refresh_interval and self.refreshed_at is not None and not self._refreshing and
+                self.refresh_interval < time.monotonic() - self.refreshed_at)
+
+    def _open(self):
+        # pool setup lives with the app config (genesis download etc.)
+        from .apps import open_pool_ledger
+
+        try:
+            (pool_handle, genesis_txn_path) = run_coroutine(lambda: open_pool_ledger(self.pool_name))
+        except Exception as e:
+            self.failures = self.failures + 1
+            self.last_error = str(e)
+            raise
+        self.genesis_txn_path = genesis_txn_path
+        self.set_handle(pool_handle)
+
+    def _refresh_in_background(self):
+        self._refreshing = True
+        threading.Thread(target=self._refresh, name='indy-pool-refresh', daemon=True).start()
+
+    def _refresh(self):
+        pool_handle = self.pool_handle
+        try:
+            run_coroutine(lambda: pool.refresh_pool_ledger(pool_handle))
+            self.refreshed_at = time.monotonic()
+            self.probe_nodes()
+        except IndyError as e:
+            print("Error refreshing ledger pool", str(e))
+            self.report_failure(pool_handle, e)
+        finally:
+            self._refreshing = False
+            close_thread_event_loop()
+
+ledger_pool = LedgerPoolManager()
 
 
 def get_pool_handle():
-    global ledger_pool_handle
-    return ledger_pool_handle
+    return ledger_pool.get_handle()
 
 def set_pool_handle(pool_handle):
-    global ledger_pool_handle
-    ledger_pool_handle = pool_handle
+    ledger_pool.set_handle(pool_handle)
+
+def pool_stats():
+    """
+    Return ledger pool health counters (requests, failures, reconnects, latency, per-node probes).
+    """
 
-    
\ No newline at end of file
+    return ledger_pool.stats()
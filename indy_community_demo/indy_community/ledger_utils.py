@@ -1,42 +1,197 @@
 import asyncio
+from collections import OrderedDict
+import hashlib
 import json
 from os import environ
 import random
+import threading
+import time
 
 from django.conf import settings
+from django.core.cache import caches
 
 from indy import anoncreds, crypto, did, ledger, pool, wallet
 from indy.error import ErrorCode, IndyError
 
 from .utils import *
-from .indy_state import get_pool_handle
+from .indy_state import ledger_pool
+
+
+######################################################################
+# ledger read cache
+######################################################################
+
+LEDGER_CACHE_MAX_ENTRIES = getattr(settings, "INDY_LEDGER_CACHE_MAX_ENTRIES", 1000)
+# seconds to cache mutable ledger data (NYM, ATTRIB) and not-found responses
+LEDGER_CACHE_TTL = getattr(settings, "INDY_LEDGER_CACHE_TTL", 60)
+# optional django cache alias, shared between processes
+LEDGER_CACHE_BACKEND = getattr(settings, "INDY_LEDGER_CACHE_BACKEND", None)
+
+
+class LedgerReadCache(object):
+    """
+    Two-tier cache of ledger read responses: an in-process LRU, backed by an optional
+    Django cache shared between processes.
+    Entries cached with ttl=None never expire (schemas and cred defs are immutable on the ledger).
+    """
+
+    def __init__(self, max_entries=LEDGER_CACHE_MAX_ENTRIES, backend=LEDGER_CACHE_BACKEND):
+        self.max_entries = max_entries
+        self.backend = backend
+        self.lock = threading.RLock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def _backend_key(self, key):
+        # ledger ids can contain characters (spaces) that some cache backends don't allow
+        return 'indy_ledger:' + hashlib.sha256(':'.join(key).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Return the cached response, or None.
+        """
+
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry:
+                (expires_at, value) = entry
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits = self.hits + 1
+                    return value
+                del self._entries[key]
+
+        if self.backend:
+            entry = caches[self.backend].get(self._backend_key(key))
+            if entry:
+                (ttl, value) = entry
+                self._set_local(key, value, ttl)
+                with self.lock:
+                    self.shared_hits = self.shared_hits + 1
+                return value
+
+        with self.lock:
+            self.misses = self.misses + 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        """
+        Cache a response for ttl seconds (None to cache permanently).
+        """
+
+        self._set_local(key, value, ttl)
+        if self.backend:
+            caches[self.backend].set(self._backend_key(key), (ttl, value), ttl)
+
+    def _set_local(self, key, value, ttl):
+        with self.lock:
+            expires_at = None if ttl is None else time.monotonic() + ttl
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while self.max_entries < len(self._entries):
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self._entries.pop(key, None)
+        if self.backend:
+            caches[self.backend].delete(self._backend_key(key))
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits + self.shared_hits) / lookups if 0 < lookups else 0.0,
+            }
+
+ledger_cache = LedgerReadCache()
+
+
+def ledger_response_ttl(response, immutable=False):
+    """
+    How long a ledger read response can be cached: 0 for errors, the mutable TTL
+    for not-found (no seqNo) or mutable data, None (permanent) for immutable data.
+    """
+
+    response = json.loads(response)
+    if response.get('op') != 'REPLY':
+        return 0
+    if immutable and response['result'].get('seqNo') is not None:
+        return None
+    return LEDGER_CACHE_TTL
+
+
+async def cached_ledger_read(key, build_request, *args, immutable=False):
+    """
+    Submit a ledger read request (built with build_request(*args)), via the ledger read cache.
+    """
+
+    response = ledger_cache.get(key)
+    if response is not None:
+        return response
+
+    request = await build_request(*args)
+    response = await ledger_pool.submit_request(request)
+
+    ttl = ledger_response_ttl(response, immutable=immutable)
+    if ttl != 0:
+        ledger_cache.set(key, response, ttl)
+    return response
+
+
+def ledger_cache_stats():
+    """
+    Return ledger read cache counters (entries, hits, shared_hits, misses, hit_rate).
+    """
+
+    return ledger_cache.stats()
 
 
 ######################################################################
 # basic ledger query utilities
 ######################################################################
-def get_did_info(my_did):
+async def async_get_did_info(my_did, include_txn=True):
     """
-    Lookup DID information on the ledger
+    Lookup DID information on the ledger (coroutine version).
     """
-    pool_handle = get_pool_handle()
 
-    get_nym_request = run_coroutine_with_args(ledger.build_get_nym_request, my_did, my_did)
-    nym_response = run_coroutine_with_args(ledger.submit_request, pool_handle, get_nym_request)
-    seq_no = int(json.loads(nym_response)['result']['seqNo'])
-    get_txn_request = run_coroutine_with_args(ledger.build_get_txn_request, my_did, "DOMAIN", seq_no)
-    txn_response = run_coroutine_with_args(ledger.submit_request, pool_handle, get_nym_request)
+    nym_response = await cached_ledger_read(('NYM', my_did), ledger.build_get_nym_request, my_did, my_did)
+    if not include_txn:
+        return (nym_response, None)
+
+    # the NYM transaction is immutable once written, so it is cached by sequence number
+    seq_no = json.loads(nym_response)['result']['seqNo']
+    if seq_no is None:
+        return (nym_response, None)
+    txn_response = await cached_ledger_read(('TXN', str(seq_no)), ledger.build_get_txn_request, my_did, "DOMAIN", int(seq_no), immutable=True)
 
     return (nym_response, txn_response)
 
+def get_did_info(my_did, include_txn=True):
+    """
+    Lookup DID information on the ledger.
+    Returns (nym_response, txn_response); include_txn=False skips the second round-trip
+    (the NYM reply already has the verkey and role, the transaction adds the alias).
+    """
+
+    return run_coroutine_with_kwargs(async_get_did_info, my_did, include_txn=include_txn)
+
 def get_did_attrib(my_did, attrib):
     """
     Lookup DID attributes on the ledger
     """
-    pool_handle = get_pool_handle()
 
-    get_attrib_request = run_coroutine_with_args(ledger.build_get_attrib_request, my_did, my_did, attrib, None, None)
-    attrib_response = run_coroutine_with_args(ledger.submit_request, pool_handle, get_attrib_request)
+    attrib_response = run_coroutine_with_args(cached_ledger_read, ('ATTRIB', my_did, attrib), ledger.build_get_attrib_request, my_did, my_did, attrib, None, None)
 
     return attrib_response
 
@@ -44,28 +199,27 @@ def write_new_did(wallet_handle, ledger_did, my_did, verkey, alias, role):
     """
     Write a new DID to the ledger
     """
-    pool_handle = get_pool_handle()
 
     req_json = run_coroutine_with_args(ledger.build_nym_request, ledger_did, my_did, verkey, alias, role)
-    rv_json = run_coroutine_with_args(ledger.sign_and_submit_request, pool_handle, wallet_handle, ledger_did, req_json)
+    rv_json = run_coroutine_with_args(ledger_pool.sign_and_submit_request, wallet_handle, ledger_did, req_json)
+    ledger_cache.invalidate(('NYM', my_did))
 
 def write_did_attrib(wallet_handle, ledger_did, my_did, attrib_raw):
     """
     Add or update a DID attribute on the ledger
     """
-    pool_handle = get_pool_handle()
 
     attrib_request = run_coroutine_with_args(ledger.build_attrib_request, ledger_did, my_did, None, attrib_raw, None)
-    run_coroutine_with_args(ledger.sign_and_submit_request, pool_handle, wallet_handle, my_did, attrib_request)
+    run_coroutine_with_args(ledger_pool.sign_and_submit_request, wallet_handle, my_did, attrib_request)
+    for attrib in json.loads(attrib_raw):
+        ledger_cache.invalidate(('ATTRIB', my_did, attrib))
 
 def get_schema_info(my_did, schema_id):
     """
     Read info from the ledger
     """
-    pool_handle = get_pool_handle()
 
-    get_schema_request = run_coroutine_with_args(ledger.build_get_schema_request, my_did, schema_id)
-    get_schema_response = run_coroutine_with_args(ledger.submit_request, pool_handle, get_schema_request)
+    get_schema_response = run_coroutine_with_kwargs(cached_ledger_read, ('SCHEMA', schema_id), ledger.build_get_schema_request, my_did, schema_id, immutable=True)
 
     return get_schema_response
 
@@ -73,11 +227,107 @@ def get_cred_def_info(my_did, cred_def_id):
     """
     Read info from the ledger
     """
-    pool_handle = get_pool_handle()
 
-    get_cred_def_request = run_coroutine_with_args(ledger.build_get_cred_def_request, my_did, cred_def_id)
-    get_cred_def_response = run_coroutine_with_args(ledger.submit_request, pool_handle, get_cred_def_request)
+    get_cred_def_response = run_coroutine_with_kwargs(cached_ledger_read, ('CRED_DEF', cred_def_id), ledger.build_get_cred_def_request, my_did, cred_def_id, immutable=True)
 
     return get_cred_def_response
 
 
+######################################################################
+# concurrent (batched) ledger queries
+######################################################################
+
+# max ledger requests in flight for one batch
+LEDGER_QUERY_CONCURRENCY = getattr(settings, "INDY_LEDGER_QUERY_CONCURRENCY", 10)
+
+async def async_get_many(key_type, build_request, my_did, ledger_ids, immutable=False, concurrency=LEDGER_QUERY_CONCURRENCY):
+    """
+    Read a batch of ledger objects concurrently over the shared pool handle (via the read cache).
+    Returns the responses in the same order as ledger_ids.
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def read(ledger_id):
+        async with semaphore:
+            return await cached_ledger_read((key_type, ledger_id), build_request, my_did, ledger_id, immutable=immutable)
+
+    # each distinct id is only requested once
+    unique_ids = list(OrderedDict.fromkeys(ledger_ids))
+    responses = await asyncio.gather(*[read(ledger_id) for ledger_id in unique_ids])
+    responses = dict(zip(unique_ids, responses))
+    return [responses[ledger_id] for ledger_id in ledger_ids]
+
+
+async def async_get_many_schemas(my_did, schema_ids, concurrency=LEDGER_QUERY_CONCURRENCY):
+    return await async_get_many('SCHEMA', ledger.build_get_schema_request, my_did, schema_ids, immutable=True, concurrency=concurrency)
+
+
+async def async_get_many_cred_defs(my_did, cred_def_ids, concurrency=LEDGER_QUERY_CONCURRENCY):
+    return await async_get_many('CRED_DEF', ledger.build_get_cred_def_request, my_did, cred_def_ids, immutable=True, concurrency=concurrency)
+
+
+async def async_get_many_nyms(my_did, dids, concurrency=LEDGER_QUERY_CONCURRENCY):
+    return await async_get_many('NYM', ledger.build_get_nym_request, my_did, dids, concurrency=concurrency)
+
+
+def get_many_schemas(my_did, schema_ids, concurrency=LEDGER_QUERY_CONCURRENCY):
+    """
+    Read a list of schemas from the ledger concurrently (responses in order).
+    """
+
+    return run_coroutine_with_kwargs(async_get_many_schemas, my_did, schema_ids, concurrency=concurrency)
+
+
+def get_many_cred_defs(my_did, cred_def_ids, concurrency=LEDGER_QUERY_CONCURRENCY):
+    """
+    Read a list of credential definitions from the ledger concurrently (responses in order).
+    """
+
+    return run_coroutine_with_kwargs(async_get_many_cred_defs, my_did, cred_def_ids, concurrency=concurrency)
+
+
+def get_many_nyms(my_did, dids, concurrency=LEDGER_QUERY_CONCURRENCY):
+    """
+    Read a list of NYMs (DIDs) from the ledger concurrently (responses in order).
+    """
+
+    return run_coroutine_with_kwargs(async_get_many_nyms, my_did, dids, concurrency=concurrency)
+
+
+######################################################################
+# DID document resolver
+######################################################################
+async def async_resolve_did(my_did):
+    """
+    Resolve a DID to a simple DID document (coroutine version).
+    """
+
+    # the NYM and endpoint ATTRIB are independent reads, so make them together
+    (nym_response, attrib_response) = await asyncio.gather(
+        cached_ledger_read(('NYM', my_did), ledger.build_get_nym_request, my_did, my_did),
+        cached_ledger_read(('ATTRIB', my_did, 'endpoint'), ledger.build_get_attrib_request, my_did, my_did, 'endpoint', None, None),
+    )
+
+    nym_data = json.loads(nym_response).get('result', {}).get('data')
+    if not nym_data:
+        return None
+    nym_data = json.loads(nym_data)
+    attrib_data = json.loads(attrib_response).get('result', {}).get('data')
+    endpoint = json.loads(attrib_data).get('endpoint') if attrib_data else None
+
+    return {
+        'id': 'did:sov:' + my_did,
+        'verkey': nym_data.get('verkey'),
+        'role': nym_data.get('role'),
+        'endpoint': endpoint,
+    }
+
+
+def resolve_did(my_did):
+    """
+    Resolve a DID to a simple DID document (id, verkey, role, endpoint), or None
+    if the DID is not on the ledger. Ledger reads go through the ledger read cache.
+    """
+
+    return run_coroutine_with_args(async_resolve_did, my_did)
@@ -2,9 +2,12 @@ from django.core.management.base import BaseCommand
 from django.conf import settings
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.db import connections, transaction
 
+import multiprocessing
 import yaml
 import os
+import time
 
 from indy_community.utils import *
 from indy_community.models import *
@@ -28,12 +31,91 @@ def get_attr_value(key):
     else:
         return key
 
+def init_worker(settings_module):
+    """
+    Set up Django in a worker process (spawned, so libindy and VCX start clean).
+    """
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def load_org(name, org):
+    """
+    Create the user and provision the organization (skips orgs that are already provisioned).
+    If provisioning fails the org's rows are rolled back and its new wallet is deleted, so a
+    re-run provisions it from scratch.
+    Returns a result dict (name, status, duration, error).
+    """
+
+    start_time = time.perf_counter()
+    try:
+        first_name = org['first_name']
+        last_name = org['last_name']
+        email = org['email']
+        password = org['password']
+        role_name = org['role']
+        if 'ico_url' in org:
+            ico_url = org['ico_url']
+        else:
+            ico_url = None
+
+        if "$random" in name:
+            name = name.replace("$random", random_alpha_string(12))
+        if "$random" in email:
+            email = email.replace("$random", random_alpha_string(12))
+
+        # resume: skip orgs provisioned by a previous run
+        if get_indy_settings_model('INDY_ORGANIZATION_MODEL').objects.filter(org_name=name, wallet__isnull=False).exists():
+            return {'name': name, 'status': 'skipped', 'duration': time.perf_counter() - start_time}
+
+        with transaction.atomic():
+            user_attrs = {}
+            if 'user' in org:
+                for attr in org['user']:
+                    user_attrs[attr] = get_attr_value(org['user'][attr])
+            user = get_user_model().objects.create_user(first_name=first_name, last_name=last_name, email=email, password=password, **user_attrs)
+            user.groups.add(Group.objects.get(name=ORG_ROLE))
+            user.save()
+
+            org_attrs = {}
+            if 'org' in org:
+                for attr in org['org']:
+                    org_attrs[attr] = get_attr_value(org['org'][attr])
+            relation_attrs = {}
+            if 'relation' in org:
+                for attr in org['relation']:
+                    relation_attrs[attr] = get_attr_value(org['relation'][attr])
+            org_role, created = IndyOrgRole.objects.get_or_create(name=role_name)
+            # create the cred defs now, so they exist once the command returns (and roll back with the org)
+            org = org_signup(user, password, name, org_attrs=org_attrs, org_relation_attrs=relation_attrs, org_role=org_role, org_ico_url=ico_url,
+                             creddefs_in_background=False)
+    except Exception as e:
+        return {'name': name, 'status': 'failed', 'error': str(e), 'duration': time.perf_counter() - start_time}
+
+    return {'name': name, 'status': 'created', 'duration': time.perf_counter() - start_time}
+
+
+def load_org_item(item):
+    return load_org(*item)
+
+
 class Command(BaseCommand):
     help = 'Loads Organizations and optionally creates Credential Definitions'
 
     def add_arguments(self, parser):
         parser.add_argument('config_file', nargs='+')
 
+        # Named (optional) arguments
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            dest='workers',
+            help='Number of worker processes provisioning organizations in parallel',
+        )
+
     def handle(self, *args, **options):
         schemas = None
         org = None
@@ -53,39 +135,33 @@ class Command(BaseCommand):
                 # TODO validation
 
         # now create orgs (and potentially create cred defs)
-        if orgs:
+        if not orgs:
+            return
+
+        start_time = time.perf_counter()
+        results = []
+        workers = max(options['workers'], 1)
+        if workers == 1:
             for name in orgs:
-                org = orgs[name]
-                first_name = org['first_name']
-                last_name = org['last_name']
-                email = org['email']
-                password = org['password']
-                role_name = org['role']
-                if 'ico_url' in org:
-                    ico_url = org['ico_url']
-                else:
-                    ico_url = None
-
-                if "$random" in name:
-                    name = name.replace("$random", random_alpha_string(12))
-                if "$random" in email:
-                    email = email.replace("$random", random_alpha_string(12))
-
-                user_attrs = {}
-                if 'user' in org:
-                    for attr in org['user']:
-                        user_attrs[attr] = get_attr_value(org['user'][attr])
-                user = get_user_model().objects.create_user(first_name=first_name, last_name=last_name, email=email, password=password, **user_attrs)
-                user.groups.add(Group.objects.get(name=ORG_ROLE))
-                user.save()
-
-                org_attrs = {}
-                if 'org' in org:
-                    for attr in org['org']:
-                        org_attrs[attr] = get_attr_value(org['org'][attr])
-                relation_attrs = {}
-                if 'relation' in org:
-                    for attr in org['relation']:
-                        relation_attrs[attr] = get_attr_value(org['relation'][attr])
-                org_role, created = IndyOrgRole.objects.get_or_create(name=role_name)
-                org = org_signup(user, password, name, org_attrs=org_attrs, org_relation_attrs=relation_attrs, org_role=org_role, org_ico_url=ico_url)
+                results.append(self.report(load_org(name, orgs[name])))
+        else:
+            # VCX is a per-process singleton, so each worker is a separate (spawned) process
+            connections.close_all()
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(workers, initializer=init_worker, initargs=(settings.SETTINGS_MODULE,)) as pool:
+                for result in pool.imap_unordered(load_org_item, [(name, orgs[name]) for name in orgs]):
+                    results.append(self.report(result))
+
+        elapsed = time.perf_counter() - start_time
+        created = [result for result in results if result['status'] == 'created']
+        skipped = [result for result in results if result['status'] == 'skipped']
+        failed = [result for result in results if result['status'] == 'failed']
+        self.stdout.write("%s orgs: %s created, %s skipped, %s failed in %.1fs (%.1f orgs/min, %s workers)" %
+                          (len(results), len(created), len(skipped), len(failed), elapsed,
+                           60.0 * len(created) / elapsed if 0 < elapsed else 0.0, workers))
+        for result in failed:
+            self.stdout.write("  failed %s: %s" % (result['name'], result['error']))
+
+    def report(self, result):
+        self.stdout.write("%s %s (%.1fs)" % (result['status'], result['name'], result['duration']))
+        return result
@@ -21,6 +21,19 @@ class Command(BaseCommand):
             dest='cred_defs',
             help='Create Credential Definitions for the selected organization, for all Schemas',
         )
+        parser.add_argument(
+            '--batch',
+            action='store_true',
+            dest='batch',
+            help='Initialize VCX once and write Schemas (then Credential Definitions) concurrently, skipping existing ones',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=LEDGER_WRITE_CONCURRENCY,
+            dest='concurrency',
+            help='Max concurrent ledger writes in batch mode',
+        )
 
     def handle(self, *args, **options):
         schemas = None
@@ -49,7 +62,9 @@ class Command(BaseCommand):
             org = orgs[0]
 
         # now create schemas (and potentially create cred defs)
-        if schemas and org:
+        if schemas and org and options['batch']:
+            self.load_batch(org, schemas, options['cred_defs'], options['concurrency'])
+        elif schemas and org:
             for name in schemas:
                 spec = schemas[name]
 
@@ -76,15 +91,89 @@ class Command(BaseCommand):
                         creddef = create_creddef(org.wallet, schema, schema.schema_name + '-' + org.wallet.wallet_name, schema.schema_template)
                         self.stdout.write("Created cred def for schema %s" % name)
                 elif spec['type'] == 'proof_request':
-                    description = spec['description']
-                    if 'revealed_attributes' in spec:
-                        revealed_attributes = spec['revealed_attributes']
-                    else:
-                        revealed_attributes = []
-                    if 'predicates' in spec:
-                        predicates = spec['predicates']
-                    else:
-                        predicates = []
-                    create_proof_request(name, description, revealed_attributes, predicates)
-                    self.stdout.write("Created proof request for %s" % name)
+                    self.load_proof_request(name, spec)
+
+    def load_proof_request(self, name, spec):
+        description = spec['description']
+        if 'revealed_attributes' in spec:
+            revealed_attributes = spec['revealed_attributes']
+        else:
+            revealed_attributes = []
+        if 'predicates' in spec:
+            predicates = spec['predicates']
+        else:
+            predicates = []
+        create_proof_request(name, description, revealed_attributes, predicates)
+        self.stdout.write("Created proof request for %s" % name)
+
+    def load_batch(self, org, schemas, cred_defs, concurrency):
+        # schemas already in the database are re-used rather than written again
+        indy_schemas = {}
+        new_schemas = []
+        for name in schemas:
+            spec = schemas[name]
+            if spec['type'] != 'schema':
+                continue
+            if spec['version'] == '$generate':
+                # a generated version is new every run, so re-use the latest schema with this name
+                version = random_schema_version()
+                existing = IndySchema.objects.filter(schema_name=name).order_by('-id').first()
+            else:
+                version = spec['version']
+                existing = IndySchema.objects.filter(schema_name=name, schema_version=version).first()
+            if existing:
+                self.stdout.write("Schema for %s already exists" % name)
+                indy_schemas[name] = existing
+                continue
+            (schema_json, creddef_template) = create_schema_json(name, version, spec['attributes'])
+            new_schemas.append((name, (schema_json, creddef_template)))
+
+        # (don't initialize VCX if there is nothing to write)
+        if new_schemas:
+            results = create_schemas(org.wallet, [item for (name, item) in new_schemas], concurrency=concurrency)
+            indy_schemas.update(self.report("schema", [name for (name, item) in new_schemas], results))
+
+        # add role(s) to the schemas
+        for name in indy_schemas:
+            if 'issuing_roles' in schemas[name]:
+                for role_name in schemas[name]['issuing_roles']:
+                    role, created = IndyOrgRole.objects.get_or_create(name=role_name)
+                    indy_schemas[name].roles.add(role)
+
+        # add cred defs (skipping schemas the org already has a cred def for)?
+        if cred_defs:
+            new_creddefs = []
+            for name in indy_schemas:
+                schema = indy_schemas[name]
+                if IndyCredentialDefinition.objects.filter(wallet=org.wallet, ledger_schema=schema).exists():
+                    self.stdout.write("Cred def for schema %s already exists" % name)
+                    continue
+                new_creddefs.append((name, (schema, schema.schema_name + '-' + org.wallet.wallet_name, schema.schema_template)))
+
+            if new_creddefs:
+                results = create_creddefs(org.wallet, [item for (name, item) in new_creddefs], concurrency=concurrency)
+                self.report("cred def", [name for (name, item) in new_creddefs], results)
+
+        for name in schemas:
+            spec = schemas[name]
+            if spec['type'] == 'proof_request':
+                if IndyProofRequest.objects.filter(proof_req_name=name).exists():
+                    self.stdout.write("Proof request %s already exists" % name)
+                    continue
+                self.load_proof_request(name, spec)
 
+    def report(self, item_type, names, results):
+        created = {}
+        latencies = []
+        for (name, (result, latency)) in zip(names, results):
+            latencies.append(latency)
+            if isinstance(result, Exception):
+                self.stdout.write("Error creating %s for %s (%.2fs): %s" % (item_type, name, latency, str(result)))
+            else:
+                self.stdout.write("Created %s for %s (%.2fs)" % (item_type, name, latency))
+                created[name] = result
+        if latencies:
+            self.stdout.write("%s: %s created, %s failed, latency avg %.2fs max %.2fs" %
+                              (item_type, len(created), len(names) - len(created),
+                               sum(latencies) / len(latencies), max(latencies)))
+        return created
@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand
+from django.contrib.sessions.models import Session
+import json
+
+from indy_community.models import *
+from indy_community.wallet_utils import *
+from indy_community.agent_utils import vcx_sessions
+
+
+class Command(BaseCommand):
+    """
+    Re-key managed wallets with a random RAW key.
+    The new key is saved before the wallet is re-keyed (the old key is kept in the
+    wallet config until the re-key succeeds, and restored if it fails). If a run stops
+    part way, the next run finishes the re-key with the saved keys.
+    Pooled handles and VCX sessions holding the old key are closed, and users logged
+    in to a re-keyed wallet are logged out (their session holds the old key).
+    """
+
+    help = ('Re-keys managed wallets with a random RAW key (skips Argon2 key derivation on open). '
+            'Users logged in to a re-keyed wallet are logged out.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('wallet_name', nargs='*', help='Wallet(s) to re-key (default all managed wallets)')
+
+    def handle(self, *args, **options):
+        wallets = IndyWallet.objects.exclude(wallet_config='')
+        if options['wallet_name']:
+            wallets = wallets.filter(wallet_name__in=options['wallet_name'])
+
+        rekeyed = 0
+        for indy_wallet in wallets.all():
+            config = json.loads(indy_wallet.wallet_config)
+            if 'previous_wallet_key' in config:
+                # an earlier run stopped before the re-key was confirmed, finish it with the saved key
+                self.stdout.write("resume re-key wallet = %s" % indy_wallet.wallet_name)
+                old_key = config.pop('previous_wallet_key')
+                old_key_derivation = config.pop('previous_wallet_key_derivation', None)
+                new_key = config['wallet_key']
+            else:
+                if 'wallet_key' not in config or config.get('wallet_key_derivation') == 'RAW':
+                    continue
+
+                self.stdout.write("re-key wallet = %s" % indy_wallet.wallet_name)
+                old_key = config['wallet_key']
+                old_key_derivation = config.get('wallet_key_derivation')
+                new_key = generate_raw_wallet_key()
+
+                # save the new key first, keeping the old one until the wallet is re-keyed
+                config['wallet_key'] = new_key
+                config['wallet_key_derivation'] = 'RAW'
+                indy_wallet.wallet_config = json.dumps(dict(config, previous_wallet_key=old_key,
+                                                            previous_wallet_key_derivation=old_key_derivation))
+                indy_wallet.save()
+
+            if self.rekey(indy_wallet, config, old_key, old_key_derivation, new_key):
+                rekeyed = rekeyed + 1
+
+        self.stdout.write("re-keyed %s wallet(s)" % str(rekeyed))
+
+    def rekey(self, indy_wallet, config, old_key, old_key_derivation, new_key):
+        # make sure neither vcx nor the handle pool has the wallet open
+        try:
+            with vcx_sessions.lock:
+                vcx_sessions.reset()
+                try:
+                    rekey_wallet(indy_wallet.wallet_name, old_key, new_key, old_key_derivation)
+                except IndyError as e:
+                    if e.error_code != ErrorCode.WalletAccessFailed:
+                        raise
+                    # the wallet may have been re-keyed before an earlier run stopped
+                    with pooled_wallet(indy_wallet.wallet_name, new_key, 'RAW'):
+                        pass
+        except Exception as e:
+            # restore the old key
+            config['wallet_key'] = old_key
+            config.pop('wallet_key_derivation', None)
+            if old_key_derivation:
+                config['wallet_key_derivation'] = old_key_derivation
+            indy_wallet.wallet_config = json.dumps(config)
+            indy_wallet.save()
+            self.stderr.write("failed to re-key wallet = %s (%s)" % (indy_wallet.wallet_name, str(e)))
+            return False
+
+        indy_wallet.wallet_config = json.dumps(config)
+        indy_wallet.save()
+
+        # log out users whose session holds the old key
+        Session.objects.filter(indysession__wallet_name=indy_wallet.wallet_name).delete()
+        return True
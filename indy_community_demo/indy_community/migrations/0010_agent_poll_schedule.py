@@ -0,0 +1,33 @@
+# Generated by Django 2.1.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indy_community', '0009_auto_20190430_0331'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agentconnection',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='agentconnection',
+            name='poll_attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agentconversation',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='agentconversation',
+            name='poll_attempts',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.1.7 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+def clear_sent_message_ids(apps, schema_editor):
+    # conversations we started were saved with a placeholder message id
+    AgentConversation = apps.get_model('indy_community', 'AgentConversation')
+    AgentConversation.objects.filter(message_id='N/A').update(message_id=None)
+
+
+def restore_sent_message_ids(apps, schema_editor):
+    AgentConversation = apps.get_model('indy_community', 'AgentConversation')
+    AgentConversation.objects.filter(message_id=None).update(message_id='N/A')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indy_community', '0010_agent_poll_schedule'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='agentconversation',
+            name='message_id',
+            field=models.CharField(blank=True, max_length=30, null=True),
+        ),
+        migrations.RunPython(clear_sent_message_ids, restore_sent_message_ids),
+        migrations.AlterField(
+            model_name='agentconnection',
+            name='token',
+            field=models.CharField(blank=True, db_index=True, max_length=80),
+        ),
+        migrations.AddIndex(
+            model_name='agentconnection',
+            index=models.Index(fields=['wallet', 'status'], name='indy_conn_wallet_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentconnection',
+            index=models.Index(fields=['wallet', 'partner_name'], name='indy_conn_wallet_partner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='agentconversation',
+            index=models.Index(fields=['connection', 'status'], name='indy_conv_conn_status_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='agentconversation',
+            unique_together={('connection', 'message_id')},
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.1.7 on 2026-10-18 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indy_community', '0011_agent_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indycredentialdefinition',
+            name='status',
+            field=models.CharField(default='Active', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='indycredentialdefinition',
+            name='status_message',
+            field=models.TextField(blank=True, max_length=4000),
+        ),
+        migrations.AlterField(
+            model_name='indycredentialdefinition',
+            name='creddef_data',
+            field=models.TextField(blank=True, max_length=4000),
+        ),
+        migrations.AlterField(
+            model_name='indycredentialdefinition',
+            name='creddef_handle',
+            field=models.CharField(blank=True, max_length=80),
+        ),
+        migrations.AlterField(
+            model_name='indycredentialdefinition',
+            name='ledger_creddef_id',
+            field=models.CharField(blank=True, max_length=80, null=True, unique=True),
+        ),
+    ]
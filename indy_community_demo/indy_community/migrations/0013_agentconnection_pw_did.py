@@ -0,0 +1,40 @@
+# Generated by Django 2.1.7 on 2026-10-18 15:10
+
+import json
+
+from django.db import migrations, models
+
+
+def set_pw_dids(apps, schema_editor):
+    # pairwise DID from the serialized VCX connection (as AgentConnection.save() does)
+    AgentConnection = apps.get_model('indy_community', 'AgentConnection')
+    for connection in AgentConnection.objects.exclude(connection_data='').iterator():
+        try:
+            connection_data = json.loads(connection.connection_data)
+            if isinstance(connection_data, str):
+                connection_data = json.loads(connection_data)
+        except ValueError:
+            continue
+        if isinstance(connection_data, dict):
+            pw_did = connection_data.get('data', connection_data).get('pw_did')
+            AgentConnection.objects.filter(id=connection.id).update(pw_did=pw_did)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indy_community', '0012_creddef_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agentconnection',
+            name='pw_did',
+            field=models.CharField(blank=True, max_length=80, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='agentconnection',
+            index=models.Index(fields=['wallet', 'pw_did'], name='indy_conn_wallet_pwdid_idx'),
+        ),
+        migrations.RunPython(set_pw_dids, migrations.RunPython.noop),
+    ]
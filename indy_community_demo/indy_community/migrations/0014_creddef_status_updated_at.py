@@ -0,0 +1,18 @@
+# Generated by Django 2.1.7 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indy_community', '0013_agentconnection_pw_did'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='indycredentialdefinition',
+            name='status_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -156,13 +156,18 @@ class IndySchema(models.Model):
 
 # reference to a credential definition on the ledger
 class IndyCredentialDefinition(models.Model):
-    ledger_creddef_id = models.CharField(max_length=80, unique=True)
+    # ledger id, handle and data are filled in once the cred def is written (status 'Active')
+    ledger_creddef_id = models.CharField(max_length=80, unique=True, blank=True, null=True)
     ledger_schema = models.ForeignKey(IndySchema, on_delete=models.CASCADE)
     wallet = models.ForeignKey(IndyWallet, to_field="wallet_name", related_name='indycreddef_set', on_delete=models.CASCADE)
     creddef_name = models.CharField(max_length=80)
-    creddef_handle = models.CharField(max_length=80)
+    creddef_handle = models.CharField(max_length=80, blank=True)
     creddef_template = models.TextField(max_length=4000)
-    creddef_data = models.TextField(max_length=4000)
+    creddef_data = models.TextField(max_length=4000, blank=True)
+    # 'Pending' (queued for creation on the ledger), 'Creating' (claimed by a task), 'Active' or 'Failed'
+    status = models.CharField(max_length=20, default='Active')
+    status_message = models.TextField(max_length=4000, blank=True)
+    status_updated_at = models.DateTimeField(blank=True, null=True)
 
     def __str__(self):
         return self.ledger_schema.schema_name + ":" + self.wallet.wallet_name + ":" + self.creddef_name
@@ -184,14 +189,30 @@ class AgentConnection(models.Model):
     wallet = models.ForeignKey(IndyWallet, to_field="wallet_name", on_delete=models.CASCADE)
     partner_name = models.CharField(max_length=60)
     invitation = models.TextField(max_length=4000, blank=True)
-    token = models.CharField(max_length=80, blank=True)
+    token = models.CharField(max_length=80, blank=True, db_index=True)
     status = models.CharField(max_length=20)
     connection_type = models.CharField(max_length=20)
     connection_data = models.TextField(max_length=4000, blank=True)
+    # our pairwise DID (from connection_data), to find the connection for agency notifications
+    pw_did = models.CharField(max_length=80, blank=True, null=True)
+    # polling schedule (backs off while nothing changes)
+    poll_attempts = models.IntegerField(default=0)
+    next_poll_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'status'], name='indy_conn_wallet_status_idx'),
+            models.Index(fields=['wallet', 'partner_name'], name='indy_conn_wallet_partner_idx'),
+            models.Index(fields=['wallet', 'pw_did'], name='indy_conn_wallet_pwdid_idx'),
+        ]
 
     def __str__(self):
         return self.wallet.wallet_name + ":" + self.partner_name + ", " +  self.status
 
+    def save(self, *args, **kwargs):
+        self.pw_did = connection_data_pw_did(self.connection_data)
+        super(AgentConnection, self).save(*args, **kwargs)
+
     # script from @burdettadam, map to the invite format expected by Connect.Me
     def invitation_shortform(self, source_name, target_name, institution_logo_url):
         invite = json.loads(self.invitation)
@@ -219,14 +240,41 @@ class AgentConnection(models.Model):
         return json.dumps(cm_invite)
 
 
+def connection_data_pw_did(connection_data):
+    """
+    Our pairwise DID from a serialized VCX connection (None if not available).
+    """
+
+    try:
+        connection_data = json.loads(connection_data)
+        if isinstance(connection_data, str):
+            connection_data = json.loads(connection_data)
+    except ValueError:
+        return None
+    if not isinstance(connection_data, dict):
+        return None
+    return connection_data.get('data', connection_data).get('pw_did')
+
+
 # base class for Agent conversations - issue/receive credential and request/provide proof
 class AgentConversation(models.Model):
     connection = models.ForeignKey(AgentConnection, on_delete=models.CASCADE)
     conversation_type = models.CharField(max_length=30)
-    message_id = models.CharField(max_length=30)
+    # agency msg_ref_id of a received message (None for conversations we start)
+    message_id = models.CharField(max_length=30, blank=True, null=True)
     status = models.CharField(max_length=20)
     proof_state = models.CharField(max_length=20, blank=True)
     conversation_data = models.TextField(max_length=4000, blank=True)
+    # polling schedule (backs off while nothing changes)
+    poll_attempts = models.IntegerField(default=0)
+    next_poll_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        # a message received from the agency is handled once per connection
+        unique_together = (('connection', 'message_id'),)
+        indexes = [
+            models.Index(fields=['connection', 'status'], name='indy_conv_conn_status_idx'),
+        ]
 
     def __str__(self):
-        return self.connection.wallet.wallet_name + ":" + self.connection.partner_name + ":" + self.message_id + ", " +  self.conversation_type + " " + self.status
+        return self.connection.wallet.wallet_name + ":" + self.connection.partner_name + ":" + str(self.message_id) + ", " +  self.conversation_type + " " + self.status
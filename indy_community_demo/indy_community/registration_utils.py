@@ -5,6 +5,39 @@ from .indy_utils import *
 from .wallet_utils import *
 from .agent_utils import *
 
+from django.conf import settings
+from django.db import transaction
+
+
+# create the cred defs for a new org's role schemas in a background task (org signup returns immediately,
+# needs "manage.py process_tasks"); off by default so cred defs exist once signup returns
+CREDDEFS_IN_BACKGROUND = getattr(settings, "INDY_CREDDEFS_IN_BACKGROUND", False)
+
+
+def managed_wallet_key(raw_password):
+    """
+    Key (and key derivation method) for a new managed wallet.
+    Managed wallet keys are stored in the wallet config, so in RAW mode a random
+    pre-derived key is used in place of the password.
+    """
+
+    if MANAGED_WALLET_KEY_DERIVATION == 'RAW':
+        return (generate_raw_wallet_key(), 'RAW')
+    return (raw_password, MANAGED_WALLET_KEY_DERIVATION)
+
+
+def delete_failed_wallet(wallet_name, wallet_key, key_derivation_method=None):
+    """
+    Delete a new wallet after provisioning failed, so a retry can create it again
+    (in RAW mode a retry generates a new key, which can't open the old wallet).
+    """
+
+    vcx_sessions.release_wallet(wallet_name)
+    try:
+        delete_wallet(wallet_name, wallet_key, key_derivation_method)
+    except Exception as e:
+        print(" >>> Failed to delete wallet", wallet_name, str(e))
+
 
 def user_provision(user, raw_password):
     """
@@ -12,12 +45,17 @@ def user_provision(user, raw_password):
     """
 
     wallet_name = get_user_wallet_name(user.email)
-    res = create_wallet(wallet_name, raw_password)
+    (wallet_key, key_derivation_method) = managed_wallet_key(raw_password)
+    res = create_wallet(wallet_name, wallet_key, key_derivation_method)
     if res != 0:
         raise Exception("Error wallet create failed: " + str(res))
 
     # provision as an agent wallet (errors will raise exceptions)
-    config = initialize_and_provision_vcx(wallet_name, raw_password, user.email)
+    try:
+        config = initialize_and_provision_vcx(wallet_name, wallet_key, user.email, key_derivation_method=key_derivation_method)
+    except:
+        delete_failed_wallet(wallet_name, wallet_key, key_derivation_method)
+        raise
 
     # save everything to our database
     wallet = IndyWallet.objects.create(wallet_name=wallet_name, wallet_config = config)
@@ -28,40 +66,61 @@ def user_provision(user, raw_password):
     return user
 
 
-def org_provision(org, raw_password, org_role=None):
+def org_provision(org, raw_password, org_role=None, creddefs_in_background=None):
     """
     Create a new org wallet and associate to the org
+    (creddefs_in_background defaults to the INDY_CREDDEFS_IN_BACKGROUND setting)
     """
 
+    if creddefs_in_background is None:
+        creddefs_in_background = CREDDEFS_IN_BACKGROUND
+
     wallet_name = get_org_wallet_name(org.org_name)
-    res = create_wallet(wallet_name, raw_password)
+    (wallet_key, key_derivation_method) = managed_wallet_key(raw_password)
+    res = create_wallet(wallet_name, wallet_key, key_derivation_method)
     if res != 0:
         raise Exception("Error wallet create failed: " + str(res))
 
-    # create a did for this org
-    did_seed = calc_wallet_seed(wallet_name)
-    if org_role != "Trustee":
-        create_and_register_did(wallet_name, org_role)
-
-    # provision as an agent wallet (errors will raise exceptions)
-    config = initialize_and_provision_vcx(wallet_name, raw_password, org.org_name, did_seed=did_seed, org_role=org_role, institution_logo_url=org.ico_url)
-
-    # save everything to our database
-    wallet = IndyWallet.objects.create(wallet_name=wallet_name, wallet_config = config)
-    wallet.save()
-    org.wallet = wallet
-    org.save()
-
-    # if the org has a role, check if there are any schemas associated with that role
-    if org_role:
-        role_schemas = IndySchema.objects.filter(roles=org_role).all()
-        for schema in role_schemas:
-            creddef = create_creddef(org.wallet, schema, schema.schema_name + '-' + org.wallet.wallet_name, schema.schema_template)
+    wallet = None
+    try:
+        # create a did for this org
+        did_seed = calc_wallet_seed(wallet_name)
+        if org_role != "Trustee":
+            create_and_register_did(wallet_name, org_role)
+
+        # provision as an agent wallet (errors will raise exceptions)
+        config = initialize_and_provision_vcx(wallet_name, wallet_key, org.org_name, did_seed=did_seed, org_role=org_role, institution_logo_url=org.ico_url, key_derivation_method=key_derivation_method)
+
+        # save everything to our database
+        wallet = IndyWallet.objects.create(wallet_name=wallet_name, wallet_config = config)
+        wallet.save()
+        org.wallet = wallet
+        org.save()
+
+        # if the org has a role, check if there are any schemas associated with that role
+        if org_role:
+            role_schemas = IndySchema.objects.filter(roles=org_role).all()
+            for schema in role_schemas:
+                if creddefs_in_background:
+                    creddef = queue_creddef(org.wallet, schema, schema.schema_name + '-' + org.wallet.wallet_name, schema.schema_template)
+                else:
+                    creddef = create_creddef(org.wallet, schema, schema.schema_name + '-' + org.wallet.wallet_name, schema.schema_template)
+            if creddefs_in_background and 0 < len(role_schemas):
+                # cred defs are slow to write, so they are created by a background task
+                from .tasks import create_creddefs_task
+                wallet_name = org.wallet.wallet_name
+                transaction.on_commit(lambda: create_creddefs_task(wallet_name))
+    except:
+        # remove the new wallet, unless its database row is kept (the caller's transaction
+        # rolls back the rows, e.g. loads_orgs, or the failure came before the row was saved)
+        if wallet is None or transaction.get_connection().in_atomic_block:
+            delete_failed_wallet(wallet_name, wallet_key, key_derivation_method)
+        raise
 
     return org
 
 
-def org_signup(user, raw_password, org_name, org_attrs={}, org_relation_attrs={}, org_role=None, org_ico_url=None):
+def org_signup(user, raw_password, org_name, org_attrs={}, org_relation_attrs={}, org_role=None, org_ico_url=None, creddefs_in_background=None):
     """
     Helper method to create and provision a new org, and associate to the current user
     """
@@ -71,7 +130,7 @@ def org_signup(user, raw_password, org_name, org_attrs={}, org_relation_attrs={}
 
     org = get_indy_settings_model('INDY_ORGANIZATION_MODEL').objects.create(org_name=org_name, role=org_role, ico_url=org_ico_url, **org_attrs)
 
-    org = org_provision(org, raw_password, org_role)
+    org = org_provision(org, raw_password, org_role, creddefs_in_background=creddefs_in_background)
 
     # associate the user with the org
     relation = get_indy_settings_model('INDY_ORG_RELATION_MODEL').objects.create(org=org, user=user, **org_relation_attrs)
@@ -48,7 +48,7 @@ def user_logged_in_handler(sender, user, request, **kwargs):
         wallet_name = None
     print("Login user {} {} {}".format(user.email, request.session.session_key, wallet_name))
     (session, session_created) = IndySession.objects.get_or_create(user=user, session_id=request.session.session_key, wallet_name=wallet_name)
-    agent_background_task("Started by user login", user.id, request.session.session_key, repeat=AGENT_POLL_INTERVAL)
+    schedule_agent_sweep()
 
 
 def user_logged_out_handler(sender, user, request, **kwargs):
@@ -56,7 +56,7 @@ def user_logged_out_handler(sender, user, request, **kwargs):
     IndySession.objects.get(user=user, session_id=request.session.session_key).delete()
 
 
-def handle_wallet_login_internal(request, user, wallet_name, raw_password):
+def handle_wallet_login_internal(request, user, wallet_name, raw_password, key_derivation_method=None):
     # get user or org associated with this wallet
     related_user = get_user_model().objects.filter(wallet__wallet_name=wallet_name).all()
     related_org = IndyOrganization.objects.filter(wallet__wallet_name=wallet_name).all()
@@ -64,8 +64,9 @@ def handle_wallet_login_internal(request, user, wallet_name, raw_password):
         raise Exception('Error wallet with no owner {}'.format(wallet_name))
 
     # now try to open the wallet - will throw an exception if it fails
-    wallet_handle = open_wallet(wallet_name, raw_password)
-    close_wallet(wallet_handle)
+    # (the handle stays in the pool for subsequent requests)
+    with pooled_wallet(wallet_name, raw_password, key_derivation_method):
+        pass
 
     if len(related_user) > 0:
         request.session['wallet_type'] = 'user'
@@ -104,7 +105,7 @@ def init_user_session(sender, user, request, **kwargs):
             if sel_org.wallet is not None:
                 sel_wallet = sel_org.wallet
                 config = json.loads(sel_wallet.wallet_config)
-                handle_wallet_login_internal(request, user, config['wallet_name'], config['wallet_key'])
+                handle_wallet_login_internal(request, user, config['wallet_name'], config['wallet_key'], config.get('wallet_key_derivation'))
     else:
         if user.has_role(USER_ROLE):
             request.session['ACTIVE_ROLE'] = USER_ROLE
@@ -116,7 +117,7 @@ def init_user_session(sender, user, request, **kwargs):
         if user.wallet is not None:
             sel_wallet = user.wallet
             config = json.loads(sel_wallet.wallet_config)
-            handle_wallet_login_internal(request, user, config['wallet_name'], config['wallet_key'])
+            handle_wallet_login_internal(request, user, config['wallet_name'], config['wallet_key'], config.get('wallet_key_derivation'))
 
     role = request.session['ACTIVE_ROLE']
     request.session['INDY_PROFILE'] = url_indy_profile(role)
@@ -1,65 +1,216 @@
+import asyncio
 import json
-import datetime
-import pytz
+import threading
+import time
+import zlib
 
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
-from django.contrib.sessions.models import Session
-from django.contrib.auth import get_user_model
 
 from background_task import background
-
-from indy.error import ErrorCode, IndyError
+from background_task.models import Task
 
 from .models import IndySession, IndyWallet, AgentConnection, AgentConversation
-from .agent_utils import check_connection_status, handle_inbound_messages, poll_message_conversations
+from .agent_utils import vcx_session, vcx_sessions
+from .agent_utils import async_check_connection_status, async_handle_inbound_messages, async_poll_message_conversations, poll_due_filter
+from .agent_utils import create_pending_creddefs, stale_creddefs, requeue_stale_creddefs
+from .utils import run_coroutine_with_args
+from .wallet_utils import wallet_handles
 
 AGENT_POLL_INTERVAL = 5
 
+# number of sweep tasks (run one "process_tasks" worker per shard to process wallets in parallel)
+AGENT_SWEEP_SHARDS = getattr(settings, "INDY_AGENT_SWEEP_SHARDS", 1)
+# max number of connections processed concurrently within a wallet
+AGENT_SWEEP_CONCURRENCY = getattr(settings, "INDY_AGENT_SWEEP_CONCURRENCY", 10)
+
+# repeating per-login task queued by earlier versions (replaced by the agent sweep)
+LEGACY_AGENT_TASK_NAME = 'indy_community.tasks.agent_background_task'
+
+
+######################################################################
+# batched background sweep of all wallets with an active session
+######################################################################
+
+# serializes schedulers within a process (select_for_update serializes them across processes)
+_sweep_schedule_lock = threading.Lock()
+
+def schedule_agent_sweep(shards=None):
+    """
+    Make sure the (repeating) agent sweep tasks are scheduled, exactly one per shard.
+    Called on every login: the existing sweep tasks are locked while checking, tasks
+    for a different number of shards (or duplicates) are removed, missing shards are added.
+    Per-login agent tasks left by earlier versions are removed.
+    """
+
+    shards = shards or AGENT_SWEEP_SHARDS
+    with _sweep_schedule_lock, transaction.atomic():
+        Task.objects.filter(task_name=LEGACY_AGENT_TASK_NAME).delete()
+        tasks = Task.objects.select_for_update().filter(task_name=agent_sweep_task.name).order_by('id')
+        scheduled = set()
+        for task in tasks:
+            (args, kwargs) = json.loads(task.task_params)
+            if len(args) != 2 or args[1] != shards or args[0] in scheduled:
+                task.delete()
+            else:
+                scheduled.add(args[0])
+        for shard in range(shards):
+            if shard not in scheduled:
+                agent_sweep_task(shard, shards, repeat=AGENT_POLL_INTERVAL)
+
+
+def active_session_wallets(shard=0, shards=1):
+    """
+    Return the wallets attached to an unexpired login session (for the given shard).
+    """
+
+    wallet_names = IndySession.objects.filter(
+                        wallet_name__isnull=False,
+                        session__expire_date__gt=timezone.now()
+                    ).values_list('wallet_name', flat=True).distinct()
+    wallet_names = [wallet_name for wallet_name in wallet_names
+                        if zlib.crc32(wallet_name.encode('utf-8')) % shards == shard]
+    return IndyWallet.objects.filter(wallet_name__in=wallet_names).order_by('wallet_name').all()
+
+
+async def async_process_connection(wallet, connection):
+    """
+    Update a connection's status and then its inbound messages and conversations,
+    skipping anything that isn't due to be polled yet.
+    """
+
+    connection_due = connection.next_poll_at is None or connection.next_poll_at <= timezone.now()
+    if connection.status == 'Sent':
+        if not connection_due:
+            return
+        connection = await async_check_connection_status(wallet, connection)
+        connection_due = False
+    if connection.status == 'Active':
+        # check for outstanding, un-received messages - add to outstanding conversations
+        if connection_due:
+            await async_handle_inbound_messages(wallet, connection)
+        # check status of any in-flight conversations (send/receive credential or request/provide proof)
+        await async_poll_message_conversations(wallet, connection, due_only=True)
+
+
+def due_connections(wallet):
+    """
+    Return the wallet's connections that are due for polling, or that have conversations due.
+    """
+
+    due_conversations = AgentConversation.objects.filter(connection__wallet=wallet, status='Sent').filter(poll_due_filter())
+    return AgentConnection.objects.filter(wallet=wallet).filter(
+                (Q(status='Sent') & poll_due_filter()) |
+                (Q(status='Active') & (poll_due_filter() | Q(id__in=due_conversations.values('connection_id'))))
+            ).all()
+
+
+async def async_process_wallet(wallet, concurrency=AGENT_SWEEP_CONCURRENCY):
+    """
+    Process the wallet's due connections concurrently under a single VCX session
+    (VCX is not initialized at all if nothing is due).
+    Returns (connection count, failure count).
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process_connection(connection):
+        async with semaphore:
+            await async_process_connection(wallet, connection)
+
+    connections = list(due_connections(wallet))
+    if 0 == len(connections):
+        return (0, 0)
+
+    async with vcx_session(wallet):
+        results = await asyncio.gather(*[process_connection(connection) for connection in connections], return_exceptions=True)
+
+    failed_count = 0
+    for (connection, result) in zip(connections, results):
+        if isinstance(result, Exception):
+            print(" >>> Failed to process connection for", wallet.wallet_name, connection.id, connection.partner_name, result)
+            failed_count = failed_count + 1
+    return (len(connections), failed_count)
+
+
+def sweep_agent_wallets(shard=0, shards=1):
+    """
+    Process every wallet with an active session (for the given shard), one wallet at a time
+    (VCX can only be initialized for one wallet per process).
+    Returns a dictionary of sweep statistics.
+    """
+
+    start_time = time.perf_counter()
+
+    # release VCX and pooled wallets if they have been sitting idle
+    vcx_sessions.expire_idle()
+    wallet_handles.expire_idle()
+
+    stats = {'shard': shard, 'wallets': 0, 'connections': 0, 'failures': 0}
+    wallets = active_session_wallets(shard, shards)
+    for wallet in wallets:
+        try:
+            (connection_count, failed_count) = run_coroutine_with_args(async_process_wallet, wallet, AGENT_SWEEP_CONCURRENCY)
+        except Exception as e:
+            print(" >>> Failed to process wallet", wallet.wallet_name, e)
+            (connection_count, failed_count) = (0, 1)
+        stats['wallets'] = stats['wallets'] + 1
+        stats['connections'] = stats['connections'] + connection_count
+        stats['failures'] = stats['failures'] + failed_count
+
+    # backlog is whatever is still waiting on the other party
+    stats['backlog'] = (AgentConnection.objects.filter(wallet__in=wallets, status='Sent').count() +
+                        AgentConversation.objects.filter(connection__wallet__in=wallets, status='Sent').count())
+    stats['duration'] = time.perf_counter() - start_time
+
+    print("Agent sweep {}/{}: {} wallets, {} connections, {} failures, {} backlog in {:.3f}s".format(
+        shard, shards, stats['wallets'], stats['connections'], stats['failures'], stats['backlog'], stats['duration']))
+    if AGENT_POLL_INTERVAL < stats['duration']:
+        print(" >>> Agent sweep {}/{} took longer than the poll interval, consider more shards".format(shard, shards))
+
+    return stats
+
 
 @background(schedule=AGENT_POLL_INTERVAL)
-def agent_background_task(message, user_id, session_key, org_id=None):
-    # check if user/wallet has a valid session
-    user = get_user_model().objects.filter(id=user_id).first()
-    try:
-        session = IndySession.objects.get(user=user, session_id=session_key)
-    except:
-        raise Exception("No Indy Session found for {} {}".format(user.email, session_key))
-
-    print("Found session {}  for user {} wallet {}".format(session.id, user.email, session.wallet_name))
-    if session.session.expire_date < timezone.get_current_timezone().localize(datetime.datetime.now()):
-        raise Exception("Django Session timed out for {} {}".format(user.email, session.wallet_name))
-
-    if session.wallet_name is not None:
-        wallet = IndyWallet.objects.get(wallet_name=session.wallet_name)
-
-        # check for outstanding connections and poll status
-        connections = AgentConnection.objects.filter(wallet=wallet, status='Sent').all()
-
-        # if (anything to do) initialize VCX agent and do all our updates
-        # TODO (for now each request re-initializes VCX)
-        for connection in connections:
-            # validate connection and get the updated status
-            try:
-                upd_connection = check_connection_status(wallet, connection)
-            except IndyError as e:
-                print(" >>> Failed to update connection request for", session.wallet_name, connection.id, connection.partner_name)
-                raise e
-
-        # check for outstanding connections and poll status
-        connections = AgentConnection.objects.filter(wallet=wallet, status='Active').all()
-        for connection in connections:
-            # check for outstanding, un-received messages - add to outstanding conversations
-            try:
-                #if connection.connection_type == 'Inbound':
-                msg_count = handle_inbound_messages(wallet, connection)
-            except IndyError as e:
-                print(" >>> Failed to handle inbound messages for", session.wallet_name, connection.id, connection.partner_name)
-                raise e
-
-            # check status of any in-flight conversations (send/receive credential or request/provide proof)
-            try:
-                polled_count = poll_message_conversations(wallet, connection)
-            except IndyError as e:
-                print(" >>> Failed to poll conversations for", session.wallet_name, connection.id, connection.partner_name)
-                raise e
+def agent_sweep_task(shard=0, shards=1):
+    if 0 == shard:
+        requeue_stale_creddef_tasks()
+    sweep_agent_wallets(shard, shards)
+
+
+######################################################################
+# background credential definition creation
+######################################################################
+
+@background(schedule=0)
+def create_creddefs_task(wallet_name):
+    """
+    Create a new organization's 'Pending' credential definitions on the ledger.
+    """
+
+    wallet = IndyWallet.objects.filter(wallet_name=wallet_name).first()
+    if wallet is None:
+        print(" >>> No wallet found for cred def creation", wallet_name)
+        return
+
+    results = create_pending_creddefs(wallet)
+    failed = [result for (result, latency) in results if isinstance(result, Exception)]
+    print("Created {} cred defs for {} ({} failed)".format(len(results) - len(failed), wallet_name, len(failed)))
+
+
+def requeue_stale_creddef_tasks():
+    """
+    Queue the creation task again for wallets with cred defs left 'Pending' or 'Creating'
+    by a crashed or lost task (run from the agent sweep).
+    Returns the list of wallet names queued.
+    """
 
+    wallet_names = list(stale_creddefs().order_by().values_list('wallet_id', flat=True).distinct())
+    if 0 < len(wallet_names):
+        requeue_stale_creddefs()
+        for wallet_name in wallet_names:
+            print("Re-queue cred def creation for", wallet_name)
+            create_creddefs_task(wallet_name)
+    return wallet_names
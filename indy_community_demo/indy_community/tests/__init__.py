@@ -1,5 +1,8 @@
 from .model_tests import IndyUserTests, IndyWalletTests, IndyOrganizationTests, IndyOrgRelationshipTests, IndySchemaTests, IndyCredentialDefinitionTests, IndyProofRequestTests, AgentConnectionTests, AgentConversationTests
-from .wallet_util_tests import WalletDBTests
-from .indy_util_tests import IndyDIDTests
-from .registration_util_tests import RegistrationTests
-from .agent_util_tests import AgentInteractionTests
+from .wallet_util_tests import WalletDBTests, WalletHandlePoolTests, RekeyWalletsCommandTests
+from .indy_util_tests import IndyDIDTests, GenesisCacheTests
+from .ledger_util_tests import IndyLedgerTests, LedgerReadCacheTests, LedgerPoolManagerTests
+from .registration_util_tests import RegistrationTests, ProvisioningFailureTests
+from .agent_util_tests import AgentInteractionTests, VcxSessionCacheTests, PartnerDidTests, AgentCallbackTests
+from .task_tests import AgentSweepTests, CreddefTaskTests
+from .view_tests import AgentNotificationTests, LoadSchemasBatchTests
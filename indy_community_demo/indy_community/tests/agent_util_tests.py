@@ -4,8 +4,14 @@ from django.urls import reverse
 from django.views.generic.edit import UpdateView
 
 from django.conf import settings
+from django.test import override_settings
 
+import asyncio
+import json
+import gc
+import threading
 from time import sleep
+from unittest import mock
 
 from ..models import *
 from ..utils import *
@@ -51,7 +57,8 @@ class AgentInteractionTests(TestCase):
         return (org_connection_2, user_connection)
 
     def delete_user_and_org_wallets(self, user, org, raw_password):
-        # cleanup after ourselves
+        # cleanup after ourselves (VCX may still hold one of the wallets open)
+        vcx_sessions.reset()
         org_wallet_name = org.wallet.wallet_name
         res = delete_wallet(org_wallet_name, raw_password)
         self.assertEqual(res, 0)
@@ -214,6 +221,28 @@ class AgentInteractionTests(TestCase):
         self.delete_user_and_org_wallets(user, org, raw_password)
 
 
+    def test_create_schemas_and_cred_defs_batch(self):
+        # create a batch of schemas and cred defs with a single VCX initialization
+        (user, org, raw_password) = self.create_user_and_org()
+        vcx_sessions.reset()
+
+        init_count = vcx_session_stats()['init_count']
+        schema_specs = []
+        for i in range(3):
+            schema_specs.append(create_schema_json('schema_' + str(i) + '_' + org.wallet.wallet_name, random_schema_version(), [
+                'name', 'date', 'degree', 'age',
+                ]))
+        results = create_schemas(org.wallet, schema_specs)
+        self.assertEqual([schema.schema_name for (schema, latency) in results], [json.loads(spec[0])['name'] for spec in schema_specs])
+
+        results = create_creddefs(org.wallet, [(schema, 'creddef_' + schema.schema_name, schema.schema_template) for (schema, latency) in results])
+        self.assertEqual(len(org.wallet.indycreddef_set.all()), 3)
+        self.assertEqual(vcx_session_stats()['init_count'], init_count + 1)
+
+        # clean up after ourself
+        self.delete_user_and_org_wallets(user, org, raw_password)
+
+
     def test_agent_connection(self):
         # establish a connection between two agents
         (user, org, raw_password) = self.create_user_and_org()
@@ -226,6 +255,22 @@ class AgentInteractionTests(TestCase):
         self.delete_user_and_org_wallets(user, org, raw_password)
 
 
+    def test_vcx_session_reuse(self):
+        # a batch of operations for the same wallet initializes VCX once
+        (user, org, raw_password) = self.create_user_and_org()
+        vcx_sessions.reset()
+
+        init_count = vcx_session_stats()['init_count']
+        with vcx_session(org.wallet):
+            send_connection_invitation(org.wallet, user.email)
+            send_connection_invitation(org.wallet, user.email + ' (2)')
+        self.assertEqual(vcx_session_stats()['init_count'], init_count + 1)
+        self.assertEqual(vcx_session_stats()['wallet_name'], org.wallet.wallet_name)
+
+        # clean up after ourself
+        self.delete_user_and_org_wallets(user, org, raw_password)
+
+
     def test_agent_credential_exchange(self):
         # exchange credentials between two agents
         (user, org, raw_password) = self.create_user_and_org()
@@ -475,6 +520,16 @@ class AgentInteractionTests(TestCase):
         user_credentials = list_wallet_credentials(user.wallet)
         self.assertEqual(len(user_credentials), 2)
 
+        # page through the credentials one at a time
+        (page_1, next_cursor, total_count) = wallet_credentials_page(user.wallet, cursor=0, page_size=1)
+        self.assertEqual(len(page_1), 1)
+        self.assertEqual(next_cursor, 1)
+        self.assertEqual(total_count, 2)
+        (page_2, next_cursor, total_count) = wallet_credentials_page(user.wallet, cursor=next_cursor, page_size=1)
+        self.assertEqual(len(page_2), 1)
+        self.assertEqual(next_cursor, None)
+        self.assertNotEqual(page_1[0]['referent'], page_2[0]['referent'])
+
         # construct the proof request to send to the user (to whom we have just issued a credential)
         proof_req_attrs = proof_request.proof_req_attrs
         proof_req_predicates = proof_request.proof_req_predicates
@@ -553,3 +608,145 @@ class AgentInteractionTests(TestCase):
         # clean up after ourself
         self.delete_user_and_org_wallets(user, org, raw_password)
 
+
+
+class VcxSessionCacheTests(TestCase):
+
+    def test_session_lock_does_not_block_event_loop(self):
+        # another thread holds the VCX session, coroutines keep running while we wait for it
+        session_cache = VcxSessionCache()
+        held = threading.Event()
+
+        def hold_session():
+            with session_cache.lock:
+                held.set()
+                sleep(0.3)
+
+        thread = threading.Thread(target=hold_session)
+        thread.start()
+        held.wait()
+
+        ticks = []
+
+        async def tick():
+            while not ticks or ticks[-1] < 5:
+                ticks.append(len(ticks) + 1)
+                await asyncio.sleep(0.02)
+
+        async def wait_for_session():
+            await session_cache.lock.async_acquire()
+            session_cache.lock.release()
+            return len(ticks)
+
+        (ticks_when_acquired, _) = run_coroutine(lambda: asyncio.gather(wait_for_session(), tick()))
+        thread.join()
+        self.assertEqual(ticks_when_acquired, 5)
+
+    def test_failed_init_releases_session(self):
+        session_cache = VcxSessionCache()
+        wallet = IndyWallet(wallet_name='test_wallet', wallet_config='{}')
+        errors = []
+        loop = get_thread_event_loop()
+        loop.set_exception_handler(lambda loop, context: errors.append(context))
+
+        async def ready():
+            pass
+
+        async def failing_init(config):
+            raise Exception("init failed")
+
+        try:
+            with mock.patch('indy_community.agent_utils.async_ensure_indy_ready', ready), \
+                 mock.patch('indy_community.agent_utils.vcx_init_with_config', failing_init):
+                with self.assertRaises(Exception):
+                    run_coroutine_with_args(session_cache.acquire, wallet)
+            gc.collect()
+        finally:
+            loop.set_exception_handler(None)
+
+        # the init error isn't logged as never retrieved, and another thread can take the session
+        self.assertEqual(errors, [])
+        self.assertIsNone(session_cache.wallet_name)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(session_cache.lock.acquire(blocking=False)))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, [True])
+
+    def test_acquire_evicts_pooled_wallet(self):
+        # VCX opens the wallet itself, the pool closes its handle from within the coroutine
+        session_cache = VcxSessionCache()
+        wallet = IndyWallet(wallet_name='test_pooled_wallet', wallet_config='{}')
+        closed = []
+
+        async def ready():
+            pass
+
+        async def init(config):
+            pass
+
+        async def close_wallet(wallet_handle):
+            closed.append(wallet_handle)
+
+        with mock.patch.object(wallet_handles, '_open', lambda wallet_name, raw_password, key_derivation_method=None: 9), \
+             mock.patch('indy_community.wallet_utils.wallet.close_wallet', close_wallet), \
+             mock.patch('indy_community.agent_utils.async_ensure_indy_ready', ready), \
+             mock.patch('indy_community.agent_utils.vcx_init_with_config', init), \
+             mock.patch('indy_community.agent_utils.shutdown'):
+            with pooled_wallet(wallet.wallet_name, 'pass1234'):
+                pass
+            run_coroutine_with_args(session_cache.acquire, wallet)
+            session_cache.release(wallet)
+            self.assertEqual(session_cache.wallet_name, wallet.wallet_name)
+            session_cache.reset()
+
+        self.assertEqual(closed, [9])
+        self.assertNotIn(wallet.wallet_name, wallet_handles._wallets)
+
+
+class PartnerDidTests(TestCase):
+
+    def test_resolve_partner_did(self):
+        connection = AgentConnection(connection_data=json.dumps({'version': '1.0', 'data': {'their_public_did': 'VsKV7grR1BUE29mG2Fm2kX'}}))
+        resolved = []
+
+        def resolve_did(my_did):
+            resolved.append(my_did)
+            return {'id': 'did:sov:' + my_did, 'verkey': None, 'role': None, 'endpoint': None}
+
+        with mock.patch('indy_community.agent_utils.resolve_did', resolve_did):
+            self.assertEqual(resolve_partner_did(connection)['id'], 'did:sov:VsKV7grR1BUE29mG2Fm2kX')
+            # no ledger read if our partner connected without a public DID
+            self.assertIsNone(resolve_partner_did(AgentConnection(connection_data=json.dumps({'data': {'their_public_did': None}}))))
+            self.assertIsNone(resolve_partner_did(AgentConnection(connection_data='')))
+
+        self.assertEqual(resolved, ['VsKV7grR1BUE29mG2Fm2kX'])
+
+
+callback_events = []
+
+def sync_helper_callback(conversation, prev_type, prev_status):
+    # application callbacks can call the sync helpers (which run the thread's event loop)
+    async def status():
+        return conversation.status
+    callback_events.append((run_coroutine(status), prev_status))
+
+
+class AgentCallbackTests(TestCase):
+
+    @override_settings(INDY_CONVERSATION_CALLBACK='indy_community.tests.agent_util_tests.sync_helper_callback')
+    def test_callback_runs_after_event_loop(self):
+        del callback_events[:]
+        conversation = AgentConversation(conversation_type='ProofRequest', status='Accepted')
+
+        async def update_conversation():
+            check_conversation_callback(conversation, 'ProofRequest', 'Sent')
+            # not called back while the event loop is running
+            return list(callback_events)
+
+        self.assertEqual(run_coroutine(update_conversation), [])
+        self.assertEqual(callback_events, [('Accepted', 'Sent')])
+
+        # outside the event loop the callback is called straight away
+        check_conversation_callback(conversation, 'ProofRequest', 'Accepted')
+        self.assertEqual(callback_events, [('Accepted', 'Sent'), ('Accepted', 'Accepted')])
@@ -3,8 +3,12 @@ from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from django.views.generic.edit import UpdateView
 
+import os
+from unittest import mock
+
 from ..wallet_utils import *
 from ..indy_utils import *
+from ..apps import cached_genesis_txn, genesis_cache_dir, genesis_hash, write_file_atomic
 
 
 class IndyDIDTests(TestCase):
@@ -18,3 +22,58 @@ class IndyDIDTests(TestCase):
         user_wallet_name = get_user_wallet_name(user_name)
         nym_info = create_and_register_did(user_wallet_name, "NotTrustee")
 
+
+class GenesisCacheTests(TestCase):
+    """
+    Tests for the genesis transaction file cache
+    """
+
+    def test_write_file_atomic(self):
+        path = genesis_cache_dir().joinpath("test_" + random_alpha_string(10) + ".txn")
+        self.assertTrue(write_file_atomic(path, '{"some":"genesis"}'))
+        # unchanged content isn't re-written
+        self.assertFalse(write_file_atomic(path, '{"some":"genesis"}'))
+        self.assertTrue(write_file_atomic(path, '{"other":"genesis"}'))
+        with open(str(path), "r") as f:
+            self.assertEqual(f.read(), '{"other":"genesis"}')
+        os.remove(str(path))
+
+    def test_cached_genesis_txn(self):
+        genesis_url = "http://" + random_alpha_string(10) + ".example.com/genesis"
+        genesis_txn = '{"reqSignature":{},"txn":{"data":{}}}\n{"reqSignature":{},"txn":{"data":{}}}'
+        fetches = []
+        responses = [(200, genesis_txn, {'ETag': '"v1"'}), (304, '', {}), Exception("unreachable")]
+
+        async def fetch_url(the_url, headers=None):
+            fetches.append(headers)
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        cache_name = "genesis-{}".format(genesis_hash(genesis_url)[:16])
+        try:
+            with mock.patch('indy_community.apps._fetch_url', fetch_url):
+                # fresh cache: downloaded and saved
+                self.assertEqual(run_coroutine_with_args(cached_genesis_txn, genesis_url), genesis_txn)
+                # recent copy: no request
+                self.assertEqual(run_coroutine_with_args(cached_genesis_txn, genesis_url), genesis_txn)
+                self.assertEqual(fetches, [{}])
+
+                with mock.patch('indy_community.apps.GENESIS_MAX_AGE', 0):
+                    # not modified (conditional request): cached copy
+                    self.assertEqual(run_coroutine_with_args(cached_genesis_txn, genesis_url), genesis_txn)
+                    self.assertEqual(fetches[1], {'If-None-Match': '"v1"'})
+                    # unreachable url: cached copy
+                    self.assertEqual(run_coroutine_with_args(cached_genesis_txn, genesis_url), genesis_txn)
+                    self.assertEqual(len(fetches), 3)
+
+                # unreachable url and nothing cached
+                responses.append(Exception("unreachable"))
+                with self.assertRaises(Exception):
+                    run_coroutine_with_args(cached_genesis_txn, genesis_url + "/other")
+        finally:
+            for suffix in [".txn", ".json"]:
+                path = genesis_cache_dir().joinpath(cache_name + suffix)
+                if path.exists():
+                    os.remove(str(path))
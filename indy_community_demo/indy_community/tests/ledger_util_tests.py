@@ -5,6 +5,7 @@ from django.views.generic.edit import UpdateView
 
 import json
 import time
+from unittest import mock
 
 from indy import anoncreds, crypto, did, ledger, pool, wallet
 from indy.error import ErrorCode, IndyError
@@ -13,6 +14,7 @@ from ..ledger_utils import *
 from ..wallet_utils import *
 from ..indy_utils import *
 from ..utils import *
+from ..indy_state import LedgerPoolManager, ledger_pool, pool_stats
 
 
 LEDGER_SEED = '000000000000000000000000Trustee1'
@@ -37,6 +39,17 @@ class IndyLedgerTests(TestCase):
         #print("nym_response", nym_response)
         #print("txn_response", txn_response)
 
+    def test_read_nym_only_from_ledger(self):
+        (nym_response, txn_response) = get_did_info(ANON_DID, include_txn=False)
+        self.assertEqual(txn_response, None)
+        (nym_response, txn_response) = get_did_info(ANON_DID)
+        self.assertEqual(json.loads(txn_response)['result']['seqNo'], json.loads(nym_response)['result']['seqNo'])
+
+    def test_resolve_did(self):
+        did_doc = resolve_did(ANON_DID)
+        self.assertEqual(did_doc['id'], 'did:sov:' + ANON_DID)
+        self.assertTrue(did_doc['verkey'])
+
     def test_read_did_attrib_from_ledger(self):
         attrib_response = get_did_attrib(ANON_DID, "endpoint")
         #print("attrib_response(endpoint)", json.loads(attrib_response))
@@ -93,4 +106,91 @@ class IndyLedgerTests(TestCase):
         cred_def_response = get_cred_def_info(ANON_DID, CRED_DEF_ID)
         #print("cred_def", cred_def_response)
 
+    def test_read_many_from_ledger(self):
+        ledger_cache.clear()
+        nym_responses = get_many_nyms(ANON_DID, [ANON_DID, FABER_DID, ANON_DID])
+        self.assertEqual(len(nym_responses), 3)
+        self.assertEqual(nym_responses[0], nym_responses[2])
+        self.assertEqual(json.loads(nym_responses[1])['result']['dest'], FABER_DID)
+
+        schema_responses = get_many_schemas(ANON_DID, [SCHEMA_ID])
+        self.assertEqual(schema_responses[0], get_schema_info(ANON_DID, SCHEMA_ID))
+        cred_def_responses = get_many_cred_defs(ANON_DID, [CRED_DEF_ID])
+        self.assertEqual(cred_def_responses[0], get_cred_def_info(ANON_DID, CRED_DEF_ID))
+
+    def test_ledger_pool_manager(self):
+        ledger_cache.clear()
+        requests = pool_stats()['requests']
+        get_did_info(ANON_DID, include_txn=False)
+        self.assertTrue(pool_stats()['open'])
+        self.assertEqual(pool_stats()['requests'], requests + 1)
+
+        # every validator node answers a probe
+        nodes = ledger_pool.probe_nodes()
+        self.assertTrue(0 < len(nodes))
+        self.assertTrue(all(node['ok'] for node in nodes.values()))
+
+
+class LedgerReadCacheTests(TestCase):
+    """
+    Tests for the ledger read cache (no ledger needed)
+    """
+
+    def test_ledger_read_cache(self):
+        cache = LedgerReadCache(max_entries=2)
+        found = json.dumps({'op': 'REPLY', 'result': {'seqNo': 15, 'data': {}}})
+        not_found = json.dumps({'op': 'REPLY', 'result': {'seqNo': None, 'data': None}})
+        rejected = json.dumps({'op': 'REQNACK', 'reason': 'some error'})
+
+        # immutable ledger data is cached permanently, other replies expire, errors are not cached
+        self.assertEqual(ledger_response_ttl(found, immutable=True), None)
+        self.assertEqual(ledger_response_ttl(not_found, immutable=True), LEDGER_CACHE_TTL)
+        self.assertEqual(ledger_response_ttl(found), LEDGER_CACHE_TTL)
+        self.assertEqual(ledger_response_ttl(rejected), 0)
+
+        self.assertEqual(cache.get(('SCHEMA', SCHEMA_ID)), None)
+        cache.set(('SCHEMA', SCHEMA_ID), found)
+        cache.set(('NYM', ANON_DID), found, ttl=-1)
+        self.assertEqual(cache.get(('SCHEMA', SCHEMA_ID)), found)
+        self.assertEqual(cache.get(('NYM', ANON_DID)), None)
+
+        # least recently used entries are dropped
+        cache.set(('CRED_DEF', CRED_DEF_ID), found)
+        cache.set(('NYM', FABER_DID), found)
+        self.assertEqual(cache.get(('SCHEMA', SCHEMA_ID)), None)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 3)
+
+
+class LedgerPoolManagerTests(TestCase):
+    """
+    Tests for the ledger pool manager (the pool is not really opened)
+    """
 
+    def test_write_reconnects_after_pool_failure(self):
+        manager = LedgerPoolManager(refresh_interval=0)
+        manager.set_handle(1)
+        submitted = []
+
+        def reopen():
+            manager.set_handle(len(submitted) + 1)
+
+        async def sign_and_submit_request(pool_handle, wallet_handle, submitter_did, request):
+            submitted.append((pool_handle, wallet_handle, submitter_did, request))
+            if pool_handle == 1:
+                raise IndyError(ErrorCode.PoolLedgerTimeout)
+            return '{"op": "REPLY"}'
+
+        async def close_pool_ledger(pool_handle):
+            pass
+
+        with mock.patch.object(manager, '_open', reopen), \
+             mock.patch('indy_community.indy_state.ledger.sign_and_submit_request', sign_and_submit_request), \
+             mock.patch('indy_community.indy_state.pool.close_pool_ledger', close_pool_ledger):
+            response = run_coroutine_with_args(manager.sign_and_submit_request, 7, ANON_DID, '{"operation": {}}')
+
+        self.assertEqual(response, '{"op": "REPLY"}')
+        self.assertEqual([pool_handle for (pool_handle, wallet_handle, submitter_did, request) in submitted], [1, 2])
+        self.assertEqual(submitted[1][1:], (7, ANON_DID, '{"operation": {}}'))
+        self.assertEqual(manager.stats()['requests'], 1)
+        self.assertEqual(manager.stats()['reconnects'], 1)
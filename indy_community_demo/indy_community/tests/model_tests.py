@@ -1,9 +1,14 @@
 from django.contrib.auth import get_user_model
 from django.test import RequestFactory, TestCase
 from django.urls import reverse
+from django.utils import timezone
 from django.views.generic.edit import UpdateView
 
+from datetime import timedelta
+
 from ..models import *
+from ..agent_utils import schedule_next_poll, poll_backoff_max, POLL_BACKOFF_MAX, POLL_BACKOFF_MAX_PUSH, poll_due_filter, save_inbound_conversations, queue_creddef, retry_failed_creddefs
+from ..agent_utils import claim_creddef, requeue_stale_creddefs, CREDDEF_CLAIM_TIMEOUT
 
 
 User = get_user_model()
@@ -184,6 +189,50 @@ class IndyCredentialDefinitionTests(TestCase):
         self.assertEqual(len(fetch_cred_def), 1)
         self.assertEqual(fetch_cred_def[0].ledger_schema.schema_name, 'My Schema')
         self.assertEqual(fetch_cred_def[0].creddef_name, 'my cred def')
+        self.assertEqual(fetch_cred_def[0].status, 'Active')
+
+    def test_credentialdefinition_queue(self):
+        wallet = IndyWallet.objects.create(
+            wallet_name='test_wallet',
+            wallet_config='{"some":"test", "string":"."}',
+        )
+        wallet.save()
+        schema = IndySchema.objects.create(
+            ledger_schema_id='123',
+            schema_name='My Schema',
+            schema_version='1.1.1',
+            schema='this is the schema data',
+            schema_template='template for adding credentials',
+            schema_data='data written to the ledger',
+        )
+        schema.save()
+
+        # several pending cred defs (no ledger id yet) can be queued
+        queue_creddef(wallet, schema, 'my cred def', 'a template for adding credentials')
+        queue_creddef(wallet, schema, 'my other cred def', 'a template for adding credentials')
+        self.assertEqual(IndyCredentialDefinition.objects.filter(wallet=wallet, status='Pending').count(), 2)
+        self.assertEqual(IndyCredentialDefinition.objects.filter(wallet=wallet, status='Active').count(), 0)
+
+        # failed cred defs can be queued again
+        IndyCredentialDefinition.objects.filter(creddef_name='my cred def').update(status='Failed', status_message='ledger error')
+        self.assertEqual(retry_failed_creddefs(wallet), 1)
+        self.assertEqual(IndyCredentialDefinition.objects.filter(wallet=wallet, status='Pending', status_message='').count(), 2)
+
+        # a cred def can only be claimed once
+        creddef = IndyCredentialDefinition.objects.get(creddef_name='my cred def')
+        self.assertTrue(claim_creddef(creddef))
+        self.assertFalse(claim_creddef(IndyCredentialDefinition.objects.get(creddef_name='my cred def')))
+        self.assertEqual(IndyCredentialDefinition.objects.get(creddef_name='my cred def').status, 'Creating')
+
+        # retry never touches a claimed cred def
+        self.assertEqual(retry_failed_creddefs(wallet), 0)
+
+        # claims left by a crashed task are queued again after the timeout
+        self.assertEqual(requeue_stale_creddefs(wallet), 0)
+        IndyCredentialDefinition.objects.filter(id=creddef.id).update(
+                    status_updated_at=timezone.now() - timedelta(seconds=CREDDEF_CLAIM_TIMEOUT + 1))
+        self.assertEqual(requeue_stale_creddefs(wallet), 1)
+        self.assertEqual(IndyCredentialDefinition.objects.filter(wallet=wallet, status='Pending').count(), 2)
 
 
 class IndyProofRequestTests(TestCase):
@@ -229,6 +278,43 @@ class AgentConnectionTests(TestCase):
         self.assertEqual(len(fetch_connection), 1)
         self.assertEqual(fetch_connection[0].partner_name, 'partner')
 
+    def test_connection_poll_backoff(self):
+        wallet = IndyWallet.objects.create(
+            wallet_name='test_wallet',
+            wallet_config='{"some":"test", "string":"."}',
+        )
+        wallet.save()
+        connection = AgentConnection.objects.create(
+            wallet=wallet,
+            partner_name='partner',
+            status='Sent',
+            connection_type='Outbound',
+        )
+        connection.save()
+
+        # never polled, so due now
+        self.assertEqual(AgentConnection.objects.filter(poll_due_filter()).count(), 1)
+
+        # back off while nothing changes, reset when the state changes
+        schedule_next_poll(connection, False)
+        first_delay = connection.next_poll_at
+        schedule_next_poll(connection, False)
+        self.assertEqual(connection.poll_attempts, 2)
+        self.assertTrue(first_delay < connection.next_poll_at)
+        connection.save()
+        self.assertEqual(AgentConnection.objects.filter(poll_due_filter()).count(), 0)
+
+        schedule_next_poll(connection, True)
+        self.assertEqual(connection.poll_attempts, 0)
+
+        # the longer push-mode cap only applies to wallets provisioned with a webhook
+        self.assertEqual(poll_backoff_max(wallet), POLL_BACKOFF_MAX)
+        connection.poll_attempts = 30
+        schedule_next_poll(connection, False)
+        self.assertTrue(connection.next_poll_at < timezone.now() + timedelta(seconds=POLL_BACKOFF_MAX + 1))
+        push_wallet = IndyWallet(wallet_name='push_wallet', wallet_config='{"webhook_url": "http://localhost/agent_notification"}')
+        self.assertEqual(poll_backoff_max(push_wallet), POLL_BACKOFF_MAX_PUSH)
+
 
 class AgentConversationTests(TestCase):
     """
@@ -264,3 +350,31 @@ class AgentConversationTests(TestCase):
         self.assertEqual(len(fetch_conversation), 1)
         self.assertEqual(fetch_conversation[0].conversation_data, 'data representing conversation state')
 
+
+    def test_save_inbound_conversations(self):
+        wallet = IndyWallet.objects.create(
+            wallet_name='test_wallet',
+            wallet_config='{"some":"test", "string":"."}',
+        )
+        wallet.save()
+        connection = AgentConnection.objects.create(
+            wallet=wallet,
+            partner_name='partner',
+            status='Active',
+            connection_type='Inbound',
+        )
+        connection.save()
+
+        # new messages are saved once, repeated messages are skipped
+        inbound_messages = [('CredentialOffer', {'msg_ref_id': 'abc'}),
+                            ('ProofRequest', {'msg_ref_id': 'def'}),
+                            ('ProofRequest', {'msg_ref_id': 'def'})]
+        new_conversations = save_inbound_conversations(connection, inbound_messages)
+        self.assertEqual(len(new_conversations), 2)
+        self.assertTrue(all(conversation.pk for conversation in new_conversations))
+
+        inbound_messages.append(('CredentialOffer', {'msg_ref_id': 'ghi'}))
+        new_conversations = save_inbound_conversations(connection, inbound_messages)
+        self.assertEqual(len(new_conversations), 1)
+        self.assertEqual(new_conversations[0].message_id, 'ghi')
+        self.assertEqual(AgentConversation.objects.filter(connection=connection, status='Pending').count(), 3)
@@ -3,6 +3,8 @@ from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from django.views.generic.edit import UpdateView
 
+from unittest import mock
+
 from ..models import *
 from ..wallet_utils import *
 from ..registration_utils import *
@@ -77,3 +79,40 @@ class RegistrationTests(TestCase):
         res = delete_wallet(user_wallet_name, raw_password)
         self.assertEqual(res, 0)
 
+
+class ProvisioningFailureTests(TestCase):
+    """
+    Tests for cleaning up after a failed provisioning (nothing is really created)
+    """
+
+    def provision_org(self, org, fail_in):
+        deleted = []
+
+        def fail(*args, **kwargs):
+            raise Exception("provisioning failed")
+
+        def create_creddef(*args, **kwargs):
+            return fail() if fail_in == 'creddef' else None
+
+        with mock.patch('indy_community.registration_utils.create_wallet', lambda *args: 0), \
+             mock.patch('indy_community.registration_utils.create_and_register_did', lambda *args: None), \
+             mock.patch('indy_community.registration_utils.initialize_and_provision_vcx',
+                        fail if fail_in == 'provision' else (lambda *args, **kwargs: '{}')), \
+             mock.patch('indy_community.registration_utils.create_creddef', create_creddef), \
+             mock.patch('indy_community.registration_utils.CREDDEFS_IN_BACKGROUND', False), \
+             mock.patch('indy_community.registration_utils.delete_wallet', lambda *args: deleted.append(args[0])):
+            with self.assertRaises(Exception):
+                org_provision(org, 'pass1234', org.role)
+        return deleted
+
+    def test_failed_provisioning_deletes_wallet(self):
+        role = IndyOrgRole.objects.create(name='Issuer')
+        schema = IndySchema.objects.create(ledger_schema_id='schema:1', schema_name='test_schema', schema_version='1.0.0',
+                                           schema='{}', schema_template='{}', schema_data='{}')
+        schema.roles.add(role)
+        org = IndyOrganization.objects.create(org_name='Failing Org', role=role)
+        wallet_name = get_org_wallet_name(org.org_name)
+
+        self.assertEqual(self.provision_org(org, 'provision'), [wallet_name])
+        # cred defs fail after the wallet row is saved, the caller's transaction rolls it back
+        self.assertEqual(self.provision_org(org, 'creddef'), [wallet_name])
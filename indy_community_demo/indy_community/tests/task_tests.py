@@ -0,0 +1,134 @@
+import json
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.test import TestCase
+from django.utils import timezone
+
+from background_task.models import Task
+
+from ..models import *
+from ..tasks import *
+from ..agent_utils import retry_failed_creddefs
+
+
+class AgentSweepTests(TestCase):
+    """
+    Tests for the background agent sweep (scheduling and sharding)
+    """
+
+    def sweep_task_shards(self):
+        tasks = Task.objects.filter(task_name=agent_sweep_task.name).all()
+        return sorted(tuple(json.loads(task.task_params)[0]) for task in tasks)
+
+    def create_session(self, user, wallet_name, expire_date):
+        session = Session.objects.create(session_key='session_' + wallet_name, session_data='', expire_date=expire_date)
+        return IndySession.objects.create(user=user, session=session, wallet_name=wallet_name)
+
+    def test_schedule_agent_sweep(self):
+        schedule_agent_sweep(shards=2)
+        self.assertEqual(self.sweep_task_shards(), [(0, 2), (1, 2)])
+
+        # scheduling again (another login) doesn't add tasks, and duplicates are removed
+        schedule_agent_sweep(shards=2)
+        agent_sweep_task(0, 2, repeat=AGENT_POLL_INTERVAL)
+        schedule_agent_sweep(shards=2)
+        self.assertEqual(self.sweep_task_shards(), [(0, 2), (1, 2)])
+
+        # changing the number of shards replaces the tasks
+        schedule_agent_sweep(shards=3)
+        self.assertEqual(self.sweep_task_shards(), [(0, 3), (1, 3), (2, 3)])
+
+        # repeating per-login tasks queued by earlier versions are removed
+        Task.objects.new_task(LEGACY_AGENT_TASK_NAME, args=['', 1, 'session_key'], repeat=AGENT_POLL_INTERVAL).save()
+        schedule_agent_sweep(shards=3)
+        self.assertFalse(Task.objects.filter(task_name=LEGACY_AGENT_TASK_NAME).exists())
+        self.assertEqual(self.sweep_task_shards(), [(0, 3), (1, 3), (2, 3)])
+
+    def test_sweep_shards(self):
+        user = get_user_model().objects.create(email='sweep@tasks.com', first_name='Test', last_name='Sweep')
+        now = timezone.now()
+        wallet_names = ['sweep_wallet_' + str(i) for i in range(10)]
+        for wallet_name in wallet_names:
+            IndyWallet.objects.create(wallet_name=wallet_name, wallet_config='{}')
+            self.create_session(user, wallet_name, now + timedelta(hours=1))
+        IndyWallet.objects.create(wallet_name='expired_wallet', wallet_config='{}')
+        self.create_session(user, 'expired_wallet', now - timedelta(hours=1))
+
+        # every wallet with an active session is in exactly one shard
+        shards = [[wallet.wallet_name for wallet in active_session_wallets(shard, 3)] for shard in range(3)]
+        self.assertEqual(sorted(sum(shards, [])), sorted(wallet_names))
+        self.assertEqual(active_session_wallets(0, 3).count(), len(shards[0]))
+
+        processed = []
+
+        async def process_wallet(wallet, concurrency):
+            processed.append(wallet.wallet_name)
+            if wallet.wallet_name == shards[1][0]:
+                raise Exception("wallet failed")
+            return (2, 0)
+
+        with mock.patch('indy_community.tasks.async_process_wallet', process_wallet):
+            stats = sweep_agent_wallets(1, 3)
+        self.assertEqual(processed, shards[1])
+        self.assertEqual(stats['wallets'], len(shards[1]))
+        self.assertEqual(stats['connections'], 2 * (len(shards[1]) - 1))
+        self.assertEqual(stats['failures'], 1)
+
+
+class CreddefTaskTests(TestCase):
+    """
+    Tests for background cred def creation (claims and re-queueing, nothing is written to the ledger)
+    """
+
+    def setUp(self):
+        self.wallet = IndyWallet.objects.create(wallet_name='creddef_wallet', wallet_config='{}')
+        self.schema = IndySchema.objects.create(ledger_schema_id='schema:1', schema_name='test_schema', schema_version='1.0.0',
+                                                schema='{}', schema_template='{}', schema_data='{}')
+
+    def queue(self, creddef_name):
+        return IndyCredentialDefinition.objects.create(ledger_schema=self.schema, wallet=self.wallet, creddef_name=creddef_name,
+                                                       creddef_template='{}', status='Pending', status_updated_at=timezone.now())
+
+    def test_create_pending_creddefs(self):
+        self.queue('good_creddef')
+        self.queue('bad_creddef')
+        claimed = self.queue('claimed_creddef')
+        IndyCredentialDefinition.objects.filter(id=claimed.id).update(status='Creating')
+
+        async def acquire(wallet):
+            pass
+
+        async def create_creddef(wallet, indy_schema, creddef_name, creddef_template, initialize_vcx=True, indy_creddef=None):
+            # the retry view can't queue a claimed cred def again
+            self.assertEqual(retry_failed_creddefs(wallet), 0)
+            if creddef_name == 'bad_creddef':
+                raise Exception("ledger error")
+            indy_creddef.status = 'Active'
+            indy_creddef.save()
+            return indy_creddef
+
+        with mock.patch('indy_community.agent_utils.async_create_creddef', create_creddef), \
+             mock.patch.object(vcx_sessions, 'acquire', acquire), \
+             mock.patch.object(vcx_sessions, 'release'):
+            results = create_pending_creddefs(self.wallet)
+
+        # the cred def claimed by another task is left alone
+        self.assertEqual(len(results), 2)
+        statuses = dict(IndyCredentialDefinition.objects.values_list('creddef_name', 'status'))
+        self.assertEqual(statuses, {'good_creddef': 'Active', 'bad_creddef': 'Failed', 'claimed_creddef': 'Creating'})
+
+    def test_requeue_stale_creddefs(self):
+        self.queue('new_creddef')
+        self.assertEqual(requeue_stale_creddef_tasks(), [])
+
+        # cred defs left by a crashed task are queued again, once per timeout
+        stale = self.queue('stale_creddef')
+        IndyCredentialDefinition.objects.filter(id=stale.id).update(
+                    status='Creating', status_updated_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_creddef_tasks(), ['creddef_wallet'])
+        self.assertEqual(IndyCredentialDefinition.objects.get(id=stale.id).status, 'Pending')
+        self.assertEqual(Task.objects.filter(task_name=create_creddefs_task.name).count(), 1)
+        self.assertEqual(requeue_stale_creddef_tasks(), [])
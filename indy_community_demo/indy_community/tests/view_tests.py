@@ -4,6 +4,14 @@ from django.core import management
 from django.core.management.base import CommandError
 from django.utils.six import StringIO
 
+from datetime import timedelta
+import json
+from unittest import mock
+
+from django.urls import reverse
+from django.utils import timezone
+
+from ..agent_utils import vcx_webhook_token
 from ..utils import *
 from ..wallet_utils import *
 from ..models import *
@@ -158,3 +166,91 @@ class IndyViewsTests(TestCase):
         self.login_org_user(ORG_USER, self.PASSWORD)
         self.cleanup_user_and_org(fetch_users[0], fetch_orgs[0], self.PASSWORD)
 
+
+
+class AgentNotificationTests(TestCase):
+    """
+    Tests for the agency notification webhook
+    """
+
+    def setUp(self):
+        # agency calls don't carry a CSRF token
+        self.client = Client(enforce_csrf_checks=True)
+        self.wallet = IndyWallet.objects.create(wallet_name='notify_wallet', wallet_config='{}')
+        self.other_wallet = IndyWallet.objects.create(wallet_name='other_wallet', wallet_config='{}')
+        self.connections = []
+        for pw_did in ['did_1', 'did_2']:
+            connection = AgentConnection(wallet=self.wallet, partner_name=pw_did, status='Active', connection_type='Inbound',
+                                         connection_data=json.dumps({'version': '1.0', 'data': {'pw_did': pw_did}}),
+                                         poll_attempts=5, next_poll_at=timezone.now() + timedelta(minutes=5))
+            connection.save()
+            self.connections.append(connection)
+
+    def notify(self, wallet_name, token, notification=None):
+        url = reverse('agent_notification', args=[wallet_name, token])
+        return self.client.post(url, json.dumps(notification or {}), content_type='application/json')
+
+    def due_partners(self):
+        return sorted(AgentConnection.objects.filter(wallet=self.wallet, next_poll_at=None, poll_attempts=0).values_list('partner_name', flat=True))
+
+    def test_notification_marks_connection_due(self):
+        self.assertEqual(AgentConnection.objects.get(id=self.connections[0].id).pw_did, 'did_1')
+
+        resp = self.notify('notify_wallet', vcx_webhook_token('notify_wallet'), {'pwDid': 'did_2'})
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(self.due_partners(), ['did_2'])
+
+        # without a pairwise DID all the wallet's connections are due
+        resp = self.notify('notify_wallet', vcx_webhook_token('notify_wallet'))
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(self.due_partners(), ['did_1', 'did_2'])
+
+    def test_notification_token(self):
+        for token in ['invalid', vcx_webhook_token('other_wallet')]:
+            resp = self.notify('notify_wallet', token, {'pwDid': 'did_1'})
+            self.assertEqual(resp.status_code, 403)
+        resp = self.notify('missing_wallet', vcx_webhook_token('missing_wallet'))
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(self.due_partners(), [])
+
+    def test_notification_post_only(self):
+        url = reverse('agent_notification', args=['notify_wallet', vcx_webhook_token('notify_wallet')])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 405)
+        self.assertEqual(self.due_partners(), [])
+
+
+class LoadSchemasBatchTests(TestCase):
+    """
+    Tests for loads_schemas --batch (nothing is written to the ledger)
+    """
+
+    def setUp(self):
+        self.wallet = IndyWallet.objects.create(wallet_name='load_batch_wallet')
+        self.org = IndyOrganization.objects.create(org_name='Load Batch Org', wallet=self.wallet)
+        IndySchema.objects.create(ledger_schema_id='schema:1', schema_name='test_schema', schema_version='1.2.3',
+                                  schema='{}', schema_template='{}', schema_data='{}')
+        self.schema = IndySchema.objects.create(ledger_schema_id='schema:2', schema_name='test_schema', schema_version='1.0.0',
+                                                schema='{}', schema_template='{}', schema_data='{}')
+
+    def load_batch(self, schemas):
+        command = indy_community.management.commands.loads_schemas.Command(stdout=StringIO())
+        with mock.patch('indy_community.management.commands.loads_schemas.create_schemas') as create_schemas, \
+             mock.patch('indy_community.management.commands.loads_schemas.create_creddefs') as create_creddefs:
+            command.load_batch(self.org, schemas, True, 4)
+        return (create_schemas, create_creddefs)
+
+    def test_generated_version_reuses_latest_schema(self):
+        IndyCredentialDefinition.objects.create(ledger_schema=self.schema, wallet=self.wallet, creddef_name='test_creddef', creddef_template='{}')
+        schemas = {'test_schema': {'type': 'schema', 'version': '$generate', 'attributes': ['name'], 'issuing_roles': ['Trustee']}}
+
+        # nothing new to write, so VCX isn't initialized for either batch
+        (create_schemas, create_creddefs) = self.load_batch(schemas)
+        create_schemas.assert_not_called()
+        create_creddefs.assert_not_called()
+        self.assertEqual([role.name for role in self.schema.roles.all()], ['Trustee'])
+
+    def test_new_schema_version_is_created(self):
+        schemas = {'test_schema': {'type': 'schema', 'version': '2.0.0', 'attributes': ['name']}}
+        (create_schemas, create_creddefs) = self.load_batch(schemas)
+        self.assertEqual(len(create_schemas.call_args[0][1]), 1)
@@ -1,8 +1,17 @@
 from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
 from django.test import RequestFactory, TestCase
 from django.urls import reverse
+from django.utils import timezone
 from django.views.generic.edit import UpdateView
 
+import json
+from datetime import timedelta
+import threading
+from io import StringIO
+from unittest import mock
+
 from ..models import *
 from ..wallet_utils import *
 
@@ -48,3 +57,195 @@ class WalletDBTests(TestCase):
         self.assertEqual(res, 0)
 
 
+    def test_wallet_handle_pool(self):
+        # create a wallet
+        user_name = 'pool_user@mail.com'
+        raw_password = 'pass1234'
+        user_wallet_name = get_user_wallet_name(user_name)
+        res = create_wallet(user_wallet_name, raw_password)
+        self.assertEqual(res, 0)
+
+        # second use of the wallet re-uses the open handle
+        stats = wallet_pool_stats()
+        with pooled_wallet(user_wallet_name, raw_password) as wallet_handle_1:
+            pass
+        with pooled_wallet(user_wallet_name, raw_password) as wallet_handle_2:
+            pass
+        self.assertEqual(wallet_handle_1, wallet_handle_2)
+        self.assertEqual(wallet_pool_stats()['misses'], stats['misses'] + 1)
+        self.assertEqual(wallet_pool_stats()['hits'], stats['hits'] + 1)
+
+        # an open handle is not handed out without the wallet key
+        with self.assertRaises(IndyError):
+            with pooled_wallet(user_wallet_name, 'wrong password'):
+                pass
+
+        # cleanup after ourselves (closes the pooled handle)
+        res = delete_wallet(user_wallet_name, raw_password)
+        self.assertEqual(res, 0)
+
+
+
+    def test_wallet_raw_key_rekey(self):
+        # create a wallet with the default key derivation
+        user_name = 'rekey_user@mail.com'
+        raw_password = 'pass1234'
+        user_wallet_name = get_user_wallet_name(user_name)
+        res = create_wallet(user_wallet_name, raw_password)
+        self.assertEqual(res, 0)
+
+        # re-key with a random RAW key, and open with the new key
+        raw_key = generate_raw_wallet_key()
+        rekey_wallet(user_wallet_name, raw_password, raw_key)
+        wallet_handle = open_wallet(user_wallet_name, raw_key, 'RAW')
+        res = close_wallet(wallet_handle)
+        self.assertEqual(res, 0)
+
+        # cleanup after ourselves
+        res = delete_wallet(user_wallet_name, raw_key, 'RAW')
+        self.assertEqual(res, 0)
+
+
+class WalletHandlePoolTests(TestCase):
+    """
+    Tests for the wallet handle pool (wallets are not really opened)
+    """
+
+    def test_open_does_not_block_other_wallets(self):
+        pool = WalletHandlePool()
+        opening = threading.Event()
+        finish_open = threading.Event()
+
+        def slow_open(wallet_name, raw_password, key_derivation_method=None):
+            if wallet_name == 'slow_wallet':
+                opening.set()
+                finish_open.wait(5)
+            return wallet_name + '_handle'
+
+        with mock.patch.object(pool, '_open', slow_open):
+            self.assertEqual(pool.acquire('fast_wallet', 'pass1234'), 'fast_wallet_handle')
+            pool.release('fast_wallet')
+            handles = []
+            thread = threading.Thread(target=lambda: handles.append(pool.acquire('slow_wallet', 'pass1234')))
+            thread.start()
+            opening.wait(5)
+
+            # another wallet is served while slow_wallet is opening
+            self.assertEqual(pool.acquire('fast_wallet', 'pass1234'), 'fast_wallet_handle')
+            pool.release('fast_wallet')
+
+            # a second request for slow_wallet waits for the open and shares the handle
+            thread_2 = threading.Thread(target=lambda: handles.append(pool.acquire('slow_wallet', 'pass1234')))
+            thread_2.start()
+            finish_open.set()
+            thread.join()
+            thread_2.join()
+
+        self.assertEqual(handles, ['slow_wallet_handle', 'slow_wallet_handle'])
+        self.assertEqual(pool.stats()['misses'], 2)
+        self.assertEqual(pool.stats()['hits'], 2)
+
+    def test_failed_close_keeps_handle(self):
+        pool = WalletHandlePool()
+        closed = []
+
+        async def close_wallet(wallet_handle):
+            if not closed:
+                closed.append(None)
+                raise IndyError(ErrorCode.CommonIOError)
+            closed.append(wallet_handle)
+
+        with mock.patch.object(pool, '_open', lambda wallet_name, raw_password, key_derivation_method=None: 5), \
+             mock.patch('indy_community.wallet_utils.wallet.close_wallet', close_wallet):
+            self.assertEqual(pool.acquire('test_wallet', 'pass1234'), 5)
+            pool.release('test_wallet')
+
+            # the handle is still tracked (and handed out) until it is really closed
+            self.assertFalse(pool.evict('test_wallet'))
+            self.assertEqual(pool.stats()['open'], 1)
+            self.assertEqual(pool.acquire('test_wallet', 'pass1234'), 5)
+            pool.release('test_wallet')
+            self.assertTrue(pool.evict('test_wallet'))
+
+        self.assertEqual(closed, [None, 5])
+        self.assertEqual(pool.stats()['open'], 0)
+
+
+class RekeyWalletsCommandTests(TestCase):
+    """
+    Tests for the rekey_wallets management command (wallets are not really re-keyed)
+    """
+
+    def setUp(self):
+        self.indy_wallet = IndyWallet.objects.create(wallet_name='rekey_cmd_wallet',
+            wallet_config=json.dumps({'wallet_key': 'pass1234'}))
+        user = get_user_model().objects.create(email='rekey_cmd@mail.com', first_name='Rekey', last_name='Command')
+        session = Session.objects.create(session_key='rekey_cmd_session', session_data='', expire_date=timezone.now() + timedelta(days=1))
+        IndySession.objects.create(user=user, session=session, wallet_name=self.indy_wallet.wallet_name)
+
+    def test_rekey_saves_key_and_expires_sessions(self):
+        saved_configs = []
+
+        def rekey(wallet_name, raw_password, new_key, key_derivation_method=None):
+            # the new key is saved before the wallet is re-keyed
+            saved_configs.append(json.loads(IndyWallet.objects.get(wallet_name=wallet_name).wallet_config))
+
+        with mock.patch('indy_community.management.commands.rekey_wallets.rekey_wallet', rekey), \
+             mock.patch('indy_community.management.commands.rekey_wallets.generate_raw_wallet_key', lambda: 'new_raw_key'):
+            call_command('rekey_wallets', stdout=StringIO())
+
+        config = json.loads(IndyWallet.objects.get(id=self.indy_wallet.id).wallet_config)
+        self.assertEqual(config['wallet_key_derivation'], 'RAW')
+        self.assertEqual(config['wallet_key'], 'new_raw_key')
+        self.assertEqual(saved_configs[0]['wallet_key'], 'new_raw_key')
+        self.assertEqual(saved_configs[0]['previous_wallet_key'], 'pass1234')
+        self.assertNotIn('previous_wallet_key', config)
+        self.assertFalse(Session.objects.filter(session_key='rekey_cmd_session').exists())
+
+    def test_interrupted_rekey_is_resumed(self):
+        # an earlier run saved the new key, but stopped before the wallet was re-keyed
+        IndyWallet.objects.filter(id=self.indy_wallet.id).update(wallet_config=json.dumps(
+            {'wallet_key': 'new_raw_key', 'wallet_key_derivation': 'RAW', 'previous_wallet_key': 'pass1234', 'previous_wallet_key_derivation': None}))
+        rekeyed = []
+
+        def rekey(wallet_name, raw_password, new_key, key_derivation_method=None):
+            rekeyed.append((raw_password, new_key))
+
+        with mock.patch('indy_community.management.commands.rekey_wallets.rekey_wallet', rekey):
+            call_command('rekey_wallets', stdout=StringIO())
+
+        self.assertEqual(rekeyed, [('pass1234', 'new_raw_key')])
+        self.assertEqual(json.loads(IndyWallet.objects.get(id=self.indy_wallet.id).wallet_config),
+                         {'wallet_key': 'new_raw_key', 'wallet_key_derivation': 'RAW'})
+
+    def test_interrupted_rekey_already_applied(self):
+        # the wallet was re-keyed, but the run stopped before the old key was dropped
+        IndyWallet.objects.filter(id=self.indy_wallet.id).update(wallet_config=json.dumps(
+            {'wallet_key': 'new_raw_key', 'wallet_key_derivation': 'RAW', 'previous_wallet_key': 'pass1234', 'previous_wallet_key_derivation': None}))
+        opened = []
+
+        def rekey(wallet_name, raw_password, new_key, key_derivation_method=None):
+            raise IndyError(ErrorCode.WalletAccessFailed)
+
+        def pooled_wallet(wallet_name, raw_password, key_derivation_method=None):
+            opened.append((raw_password, key_derivation_method))
+            return mock.MagicMock()
+
+        with mock.patch('indy_community.management.commands.rekey_wallets.rekey_wallet', rekey), \
+             mock.patch('indy_community.management.commands.rekey_wallets.pooled_wallet', pooled_wallet):
+            call_command('rekey_wallets', stdout=StringIO())
+
+        self.assertEqual(opened, [('new_raw_key', 'RAW')])
+        self.assertEqual(json.loads(IndyWallet.objects.get(id=self.indy_wallet.id).wallet_config),
+                         {'wallet_key': 'new_raw_key', 'wallet_key_derivation': 'RAW'})
+
+    def test_failed_rekey_restores_key(self):
+        def rekey(wallet_name, raw_password, new_key, key_derivation_method=None):
+            raise Exception("Error wallet {} is in use, can't re-key".format(wallet_name))
+
+        with mock.patch('indy_community.management.commands.rekey_wallets.rekey_wallet', rekey), \
+             mock.patch('indy_community.management.commands.rekey_wallets.generate_raw_wallet_key', lambda: 'new_raw_key'):
+            call_command('rekey_wallets', stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(json.loads(IndyWallet.objects.get(id=self.indy_wallet.id).wallet_config), {'wallet_key': 'pass1234'})
+        self.assertTrue(Session.objects.filter(session_key='rekey_cmd_session').exists())
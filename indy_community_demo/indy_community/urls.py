@@ -21,6 +21,7 @@ urlpatterns = [
     path('invitation/<token>', connection_qr_code, name='connection_qr'),
     path('form_response/', form_response, name='form_response'),
     path('check_messages/', check_connection_messages, name='check_messages'),
+    path('agent_notification/<wallet_name>/<token>', agent_notification, name='agent_notification'),
     path('list_conversations/', list_conversations, name='list_conversations'),
     path('cred_offer_response/', handle_cred_offer_response, name='cred_offer_response'),
     path('proof_req_response/', handle_proof_req_response, name='proof_req_response'),
@@ -32,6 +33,8 @@ urlpatterns = [
     path('view_proof/', handle_view_proof, name='view_proof'),
     path('check_conversation/', poll_conversation_status, name='check_conversation'),
     path('list_credentials/', list_wallet_credentials, name='list_credentials'),
+    path('list_credential_definitions/', list_credential_definitions, name='list_credential_definitions'),
+    path('retry_credential_definitions/', retry_credential_definitions, name='retry_credential_definitions'),
     path('profile/', plugin_view, name='indy_profile', kwargs={'view_name': 'INDY_PROFILE_VIEW'}),
     path('data/', plugin_view, name='indy_data', kwargs={'view_name': 'INDY_DATA_VIEW'}),
     path('wallet/', plugin_view, name='indy_wallet', kwargs={'view_name': 'INDY_WALLET_VIEW'}),
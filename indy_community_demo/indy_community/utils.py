@@ -5,6 +5,7 @@ from django.core.exceptions import ImproperlyConfigured
 import asyncio
 import random
 import string
+import threading
 
 
 ######################################################################
@@ -76,27 +77,114 @@ def random_schema_version():
 # coroutine utilities
 ######################################################################
 
-def run_coroutine(coroutine):
-    loop = asyncio.new_event_loop()
+# libindy and VCX resolve their callback futures against the current event
+# loop, so each thread keeps one long-lived loop that is reused for every call
+# rather than creating (and tearing down) a new loop per call
+_thread_state = threading.local()
+
+def get_thread_event_loop():
+    """
+    Return the event loop bound to the calling thread, creating it on first use.
+    """
+
+    loop = getattr(_thread_state, 'event_loop', None)
+    if loop is None or loop.is_closed():
+        loop = asyncio.new_event_loop()
+        _thread_state.event_loop = loop
     asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coroutine())
-    finally:
+    return loop
+
+def close_thread_event_loop():
+    """
+    Close the event loop bound to the calling thread (e.g. when a worker thread exits).
+    """
+
+    loop = getattr(_thread_state, 'event_loop', None)
+    _thread_state.event_loop = None
+    if loop is not None and not loop.is_closed():
         loop.close()
 
+def run_coroutine(coroutine):
+    return _run_until_complete(coroutine())
+
 def run_coroutine_with_args(coroutine, *args):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        return loop.run_until_complete(coroutine(*args))
-    finally:
-        loop.close()
+    return _run_until_complete(coroutine(*args))
 
 def run_coroutine_with_kwargs(coroutine, *args, **kwargs):
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+    return _run_until_complete(coroutine(*args, **kwargs))
+
+def call_after_coroutine(function, *args):
+    """
+    Call function(*args) once the thread's event loop returns from the coroutine it is
+    running (or now, if it isn't running one), so the function can use the sync helpers.
+    """
+
+    loop = getattr(_thread_state, 'event_loop', None)
+    if loop is None or not loop.is_running():
+        function(*args)
+        return
+    if getattr(_thread_state, 'deferred_calls', None) is None:
+        _thread_state.deferred_calls = []
+    _thread_state.deferred_calls.append((function, args))
+
+def _run_until_complete(coroutine):
     try:
-        return loop.run_until_complete(coroutine(*args, **kwargs))
+        return get_thread_event_loop().run_until_complete(coroutine)
     finally:
-        loop.close()
+        # calls deferred by call_after_coroutine(), in order (they may queue more)
+        deferred_calls = getattr(_thread_state, 'deferred_calls', None)
+        while deferred_calls:
+            (function, args) = deferred_calls.pop(0)
+            function(*args)
+
+
+class ThreadOwnedLock(object):
+    """
+    Reentrant lock held by a thread (like threading.RLock), that coroutines can wait
+    for with async_acquire() without blocking their thread's event loop.
+    """
 
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._owner = None
+        self._count = 0
+
+    def acquire(self, blocking=True, owner=None):
+        owner = owner or threading.get_ident()
+        with self._condition:
+            while self._owner is not None and self._owner != owner:
+                if not blocking:
+                    return False
+                self._condition.wait()
+            self._owner = owner
+            self._count = self._count + 1
+            return True
+
+    async def async_acquire(self):
+        owner = threading.get_ident()
+        if self.acquire(blocking=False, owner=owner):
+            return True
+        # wait in a worker thread, taking the lock on behalf of the event loop's thread
+        future = asyncio.get_event_loop().run_in_executor(None, self.acquire, True, owner)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(lambda f: self.release(owner))
+            raise
+
+    def release(self, owner=None):
+        owner = owner or threading.get_ident()
+        with self._condition:
+            if self._owner != owner:
+                raise RuntimeError("cannot release un-acquired lock")
+            self._count = self._count - 1
+            if self._count == 0:
+                self._owner = None
+                self._condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
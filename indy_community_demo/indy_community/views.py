@@ -1,4 +1,6 @@
-from django.http import HttpResponseBadRequest, HttpResponseRedirect, HttpResponse
+from django.http import HttpResponseBadRequest, HttpResponseRedirect, HttpResponse, HttpResponseForbidden, Http404
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, get_user_model, login
 from django.urls import reverse
@@ -149,6 +151,9 @@ def org_signup_view(
             # TODO need to auto-login with Atria custom user
             #login(request, user)
 
+            # cred defs being created in the background, show their progress after login
+            if IndyCredentialDefinition.objects.filter(wallet=org.wallet, status__in=['Pending', 'Creating']).exists():
+                return redirect(reverse('login') + '?next=' + reverse('list_credential_definitions'))
             return redirect('login')
     else:
         form = OrganizationSignUpForm()
@@ -402,13 +407,24 @@ def poll_connection_status(
             # validate connection and get the updated status
             try:
                 my_connection = check_connection_status(wallet, my_connection)
-
-                return render(request, response_template, {'msg': 'Updated connection for ' + wallet.wallet_name + ', ' + my_connection.partner_name})
             except IndyError:
                 # ignore errors for now
                 print(" >>> Failed to update request for", wallet.wallet_name)
                 return render(request, 'indy/form_response.html', {'msg': 'Failed to update request for ' + wallet.wallet_name})
 
+            # show our partner's public DID, if they connected using one
+            msg_txt = ''
+            if my_connection.status == 'Active':
+                try:
+                    partner_did_doc = resolve_partner_did(my_connection)
+                    if partner_did_doc:
+                        msg_txt = 'Partner DID ' + partner_did_doc['id'] + ', endpoint ' + str(partner_did_doc['endpoint'])
+                except IndyError:
+                    print(" >>> Failed to resolve partner DID for", my_connection.partner_name)
+
+            return render(request, response_template, {'msg': 'Updated connection for ' + wallet.wallet_name + ', ' + my_connection.partner_name,
+                                                       'msg_txt': msg_txt})
+
     else:
         # find connection request
         wallet = wallet_for_current_session(request)
@@ -460,6 +476,34 @@ def connection_qr_code(
     return response
 
 
+@csrf_exempt
+@require_POST
+def agent_notification(request, wallet_name, token):
+    """
+    Webhook called by the agency when new messages arrive for a wallet (push mode).
+    The agency is given this URL (with the wallet's token) when the wallet is provisioned.
+    """
+
+    if not check_vcx_webhook_token(wallet_name, token):
+        return HttpResponseForbidden()
+    wallet = IndyWallet.objects.filter(wallet_name=wallet_name).first()
+    if not wallet:
+        raise Http404("No wallet found")
+
+    # the notification may identify the connection by our pairwise DID
+    pw_did = None
+    try:
+        notification = json.loads(request.body.decode('utf-8') or '{}')
+        if isinstance(notification, dict):
+            pw_did = notification.get('pwDid') or notification.get('pw_did')
+    except ValueError:
+        pass
+
+    handle_message_notification(wallet, pw_did)
+
+    return HttpResponse(status=204)
+
+
 ######################################################################
 # views to offer, request, send and receive credentials
 ######################################################################
@@ -998,26 +1042,57 @@ def form_response(request):
 
 
 def list_wallet_credentials(
-    request
+    request,
+    template='indy/credential/list.html'
     ):
     """
-    List all credentials in the current wallet.
+    List the credentials in the current wallet, one page at a time.
     """
 
-    wallet_handle = None
+    wallet = wallet_for_current_session(request)
+    raw_password = request.session['wallet_password']
     try:
-        wallet = wallet_for_current_session(request)
-        raw_password = request.session['wallet_password']
-        wallet_handle = open_wallet(wallet.wallet_name, raw_password)
+        cursor = max(int(request.GET.get('cursor', 0)), 0)
+        page_size = min(max(int(request.GET.get('page_size', CREDENTIAL_PAGE_SIZE)), 1), 100)
+    except ValueError:
+        return HttpResponseBadRequest("Invalid cursor or page size")
 
-        (search_handle, search_count) = run_coroutine_with_args(prover_search_credentials, wallet_handle, "{}")
-        credentials = run_coroutine_with_args(prover_fetch_credentials, search_handle, search_count)
-        run_coroutine_with_args(prover_close_credentials_search, search_handle)
+    (credentials, next_cursor, total_count) = wallet_credentials_page(wallet, raw_password, cursor=cursor, page_size=page_size)
+    prev_cursor = max(cursor - page_size, 0) if 0 < cursor else None
+    page_end = cursor + len(credentials)
 
-        return render(request, 'indy/credential/list.html', {'wallet_name': wallet.wallet_name, 'credentials': json.loads(credentials)})
-    except:
-        raise
-    finally:
-        if wallet_handle:
-            close_wallet(wallet_handle)
+    return render(request, template, {'wallet_name': wallet.wallet_name, 'credentials': credentials,
+                                      'cursor': cursor, 'page_end': page_end, 'page_size': page_size, 'total_count': total_count,
+                                      'next_cursor': next_cursor, 'prev_cursor': prev_cursor})
 
+
+def list_credential_definitions(
+    request,
+    template='indy/credential/creddef_status.html'
+    ):
+    """
+    List Credential Definitions for the current wallet, with their creation status.
+    """
+
+    # expects a wallet to be opened in the current session
+    wallet = wallet_for_current_session(request)
+    creddefs = IndyCredentialDefinition.objects.filter(wallet=wallet).order_by('creddef_name').all()
+    pending = any(creddef.status in ('Pending', 'Creating') for creddef in creddefs)
+    failed = any(creddef.status == 'Failed' for creddef in creddefs)
+    return render(request, template, {'wallet_name': wallet.wallet_name, 'creddefs': creddefs, 'pending': pending, 'failed': failed})
+
+
+@require_POST
+def retry_credential_definitions(request):
+    """
+    Create the current wallet's 'Failed' Credential Definitions again.
+    """
+
+    wallet = wallet_for_current_session(request)
+    if 0 < retry_failed_creddefs(wallet):
+        if CREDDEFS_IN_BACKGROUND:
+            from .tasks import create_creddefs_task
+            create_creddefs_task(wallet.wallet_name)
+        else:
+            create_pending_creddefs(wallet)
+    return redirect('list_credential_definitions')
@@ -1,10 +1,15 @@
 import asyncio
 import aiohttp
+from collections import OrderedDict
+from contextlib import contextmanager
 import json
 from os import environ
 import random
+import threading
+import time
 
 from django.conf import settings
+from django.utils.crypto import constant_time_compare, salted_hmac
 
 from indy import anoncreds, crypto, did, ledger, pool, wallet
 from indy.error import ErrorCode, IndyError
@@ -12,6 +17,7 @@ from indy.anoncreds import prover_search_credentials, prover_fetch_credentials,
 
 from .models import *
 from .utils import *
+from .apps import load_indy_plugins
 
 
 ######################################################################
@@ -38,13 +44,13 @@ def get_org_wallet_name(orgname):
     return 'o_{}'.format(wallet_name).lower()
 
 
-def create_wallet(wallet_name, raw_password):
+def create_wallet(wallet_name, raw_password, key_derivation_method=None):
     """
     Create an Indy wallet (postgres).
     """
 
     wallet_config_json = wallet_config(wallet_name)
-    wallet_credentials_json = wallet_credentials(raw_password)
+    wallet_credentials_json = wallet_credentials(raw_password, key_derivation_method)
     try:
         run_coroutine_with_args(wallet.create_wallet, wallet_config_json, wallet_credentials_json)
     except IndyError as ex:
@@ -53,13 +59,14 @@ def create_wallet(wallet_name, raw_password):
         return error_code
     return 0
 
-def delete_wallet(wallet_name, raw_password):
+def delete_wallet(wallet_name, raw_password, key_derivation_method=None):
     """
     Delete an Indy wallet (postgres).
     """
 
+    wallet_handles.evict(wallet_name)
     wallet_config_json = wallet_config(wallet_name)
-    wallet_credentials_json = wallet_credentials(raw_password)
+    wallet_credentials_json = wallet_credentials(raw_password, key_derivation_method)
     try:
         run_coroutine_with_args(wallet.delete_wallet, wallet_config_json, wallet_credentials_json)
     except IndyError as ex:
@@ -67,13 +74,13 @@ def delete_wallet(wallet_name, raw_password):
     return 0
 
 
-def open_wallet(wallet_name, raw_password):
+def open_wallet(wallet_name, raw_password, key_derivation_method=None):
     """
     Open an Indy wallet (postgres).
     """
 
     wallet_config_json = wallet_config(wallet_name)
-    wallet_credentials_json = wallet_credentials(raw_password)
+    wallet_credentials_json = wallet_credentials(raw_password, key_derivation_method)
     try:
         wallet_handle = run_coroutine_with_args(wallet.open_wallet, wallet_config_json, wallet_credentials_json)
         return wallet_handle
@@ -98,45 +105,421 @@ def wallet_config(wallet_name):
     Build a wallet configuration dictionary (postgres specific).
     """
 
+    # the storage plug-in must be loaded before any wallet is used
+    load_indy_plugins()
+
     storage_config = settings.INDY_CONFIG['storage_config']
-    wallet_config = settings.INDY_CONFIG['wallet_config']
+    wallet_config = dict(settings.INDY_CONFIG['wallet_config'])
     wallet_config['id'] = wallet_name
     wallet_config['storage_config'] = storage_config
     wallet_config_json = json.dumps(wallet_config)
     return wallet_config_json
 
 
-def wallet_credentials(raw_password):
+def wallet_credentials(raw_password, key_derivation_method=None):
     """
     Build wallet credentials dictionary (postgres specific).
+    key_derivation_method is ARGON2I_MOD (default), ARGON2I_INT or RAW (raw_password is then
+    a key generated by generate_raw_wallet_key()).
     """
 
     storage_credentials = settings.INDY_CONFIG['storage_credentials']
-    wallet_credentials = settings.INDY_CONFIG['wallet_credentials']
+    wallet_credentials = dict(settings.INDY_CONFIG['wallet_credentials'])
     wallet_credentials['key'] = raw_password
+    if key_derivation_method:
+        wallet_credentials['key_derivation_method'] = key_derivation_method
     wallet_credentials['storage_credentials'] = storage_credentials
     wallet_credentials_json = json.dumps(wallet_credentials)
     return wallet_credentials_json
 
 
-def list_wallet_credentials(wallet):
+######################################################################
+# raw (pre-derived) wallet keys for managed wallets
+######################################################################
+
+# key derivation for new managed wallets ('RAW' skips the expensive Argon2 derivation on every open)
+MANAGED_WALLET_KEY_DERIVATION = settings.INDY_CONFIG.get('managed_wallet_key_derivation')
+
+def generate_raw_wallet_key():
     """
-    List all credentials in the current wallet.
+    Generate a random key for a wallet opened with the RAW key derivation method.
+    """
+
+    return run_coroutine_with_args(wallet.generate_wallet_key, None)
+
+
+def wallet_key_derivation(indy_wallet):
+    """
+    Key derivation method of a provisioned IndyWallet (None for the default).
+    """
+
+    return json.loads(indy_wallet.wallet_config).get('wallet_key_derivation')
+
+
+def rekey_wallet(wallet_name, raw_password, new_key, key_derivation_method=None, new_key_derivation_method='RAW'):
+    """
+    Change a wallet's key (and key derivation method).
+    Pooled handles opened with the old key are closed, fails if the wallet is in use.
+    """
+
+    if not wallet_handles.evict(wallet_name):
+        raise Exception("Error wallet {} is in use, can't re-key".format(wallet_name))
+    wallet_config_json = wallet_config(wallet_name)
+    credentials = json.loads(wallet_credentials(raw_password, key_derivation_method))
+    credentials['rekey'] = new_key
+    credentials['rekey_derivation_method'] = new_key_derivation_method
+    wallet_handle = run_coroutine_with_args(wallet.open_wallet, wallet_config_json, json.dumps(credentials))
+    run_coroutine_with_args(wallet.close_wallet, wallet_handle)
+
+
+######################################################################
+# process-wide pool of open wallet handles
+######################################################################
+
+WALLET_POOL_MAX_OPEN = getattr(settings, "INDY_WALLET_POOL_MAX_OPEN", 20)
+WALLET_POOL_IDLE_TIMEOUT = getattr(settings, "INDY_WALLET_POOL_IDLE_TIMEOUT", 300)
+
+def _wallet_key_digest(raw_password):
+    return salted_hmac('indy_community.wallet_handle_pool', raw_password).hexdigest()
+
+
+class PooledWalletHandle(object):
+    """
+    An open wallet handle held by the WalletHandlePool.
+    """
+
+    def __init__(self, wallet_handle, key_digest, state='open'):
+        self.wallet_handle = wallet_handle
+        self.key_digest = key_digest
+        # 'opening' and 'closing' while another thread opens or closes the wallet
+        self.state = state
+        self.in_use = 0
+        self.last_used = time.monotonic()
+
+
+class WalletHandlePool(object):
+    """
+    Keeps wallets open between requests, so opening a wallet (key derivation and
+    database connection) is paid once rather than on every request.
+    Handles are kept in LRU order; idle handles are closed after idle_timeout seconds,
+    and the least recently used idle handle is closed when more than max_open are open.
+    Wallets are opened and closed outside the pool lock, so a slow open only holds up
+    requests for the same wallet.
+    """
+
+    def __init__(self, max_open=WALLET_POOL_MAX_OPEN, idle_timeout=WALLET_POOL_IDLE_TIMEOUT):
+        self.max_open = max_open
+        self.idle_timeout = idle_timeout
+        self.lock = threading.RLock()
+        # notified whenever a wallet finishes opening or closing
+        self.changed = threading.Condition(self.lock)
+        self._wallets = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def acquire(self, wallet_name, raw_password, key_derivation_method=None):
+        """
+        Return an open handle for the wallet (opening it if necessary); call release() when done.
+        """
+
+        key_digest = _wallet_key_digest(raw_password)
+        self.expire_idle()
+        with self.lock:
+            while True:
+                pooled = self._wallets.get(wallet_name)
+                if pooled is None:
+                    break
+                if pooled.state == 'open':
+                    # an open handle is only handed out to callers who know the wallet key
+                    if not constant_time_compare(pooled.key_digest, key_digest):
+                        raise IndyError(ErrorCode.WalletAccessFailed)
+                    self._wallets.move_to_end(wallet_name)
+                    self.hits = self.hits + 1
+                    pooled.in_use = pooled.in_use + 1
+                    return pooled.wallet_handle
+                # wait for the other thread to finish opening (or closing) it
+                self.changed.wait()
+            self.misses = self.misses + 1
+            closing = self._make_room()
+            pooled = PooledWalletHandle(None, key_digest, state='opening')
+            pooled.in_use = 1
+            self._wallets[wallet_name] = pooled
+
+        self._close_all(closing)
+        try:
+            wallet_handle = self._open(wallet_name, raw_password, key_derivation_method)
+        except:
+            with self.lock:
+                del self._wallets[wallet_name]
+                self.changed.notify_all()
+            raise
+        with self.lock:
+            pooled.wallet_handle = wallet_handle
+            pooled.state = 'open'
+            self.changed.notify_all()
+        return wallet_handle
+
+    def release(self, wallet_name):
+        """
+        Return a handle obtained with acquire() to the pool (the wallet stays open).
+        """
+
+        with self.lock:
+            pooled = self._wallets.get(wallet_name)
+            if pooled:
+                pooled.in_use = pooled.in_use - 1
+                pooled.last_used = time.monotonic()
+
+    def evict(self, wallet_name, blocking=True):
+        """
+        Close the wallet if the pool holds it open and it is not in use.
+        Returns True if the wallet is not (or no longer) held open by the pool.
+        Not for use from a coroutine (see async_evict()).
+        """
+
+        if not self.lock.acquire(blocking=blocking):
+            return False
+        try:
+            (evicted, pooled) = self._begin_evict(wallet_name)
+        finally:
+            self.lock.release()
+        if pooled is None:
+            return evicted
+        return self._close(wallet_name, pooled)
+
+    async def async_evict(self, wallet_name):
+        """
+        Close the wallet if the pool holds it open and it is not in use (coroutine version).
+        Returns True if the wallet is not (or no longer) held open by the pool.
+        """
+
+        with self.lock:
+            (evicted, pooled) = self._begin_evict(wallet_name)
+        if pooled is None:
+            return evicted
+        try:
+            await wallet.close_wallet(pooled.wallet_handle)
+            closed = True
+        except IndyError as ex:
+            closed = self._close_failed(wallet_name, ex)
+        self._finish_close(wallet_name, pooled, closed)
+        return closed
+
+    def expire_idle(self):
+        """
+        Close handles that have been idle longer than the timeout.
+        """
+
+        with self.lock:
+            now = time.monotonic()
+            closing = [(wallet_name, self._begin_close(wallet_name))
+                        for (wallet_name, pooled) in list(self._wallets.items())
+                        if pooled.state == 'open' and pooled.in_use == 0 and self.idle_timeout < now - pooled.last_used]
+        self._close_all(closing)
+
+    def close_all(self):
+        with self.lock:
+            closing = [(wallet_name, self._begin_close(wallet_name))
+                        for (wallet_name, pooled) in list(self._wallets.items())
+                        if pooled.state == 'open' and pooled.in_use == 0]
+        self._close_all(closing)
+
+    def stats(self):
+        return {
+            'open': len(self._wallets),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+    def _make_room(self):
+        # pick least recently used idle handles to close, until there is room for one more
+        closing = []
+        open_count = len(self._wallets)
+        for (wallet_name, pooled) in list(self._wallets.items()):
+            if open_count < self.max_open:
+                break
+            if pooled.state == 'open' and pooled.in_use == 0:
+                closing.append((wallet_name, self._begin_close(wallet_name)))
+                open_count = open_count - 1
+        return closing
+
+    def _open(self, wallet_name, raw_password, key_derivation_method=None):
+        wallet_config_json = wallet_config(wallet_name)
+        wallet_credentials_json = wallet_credentials(raw_password, key_derivation_method)
+        try:
+            return run_coroutine_with_args(wallet.open_wallet, wallet_config_json, wallet_credentials_json)
+        except IndyError as ex:
+            if ex.error_code != ErrorCode.WalletAlreadyOpenedError:
+                raise
+        # VCX may be holding the wallet open in an idle session, ask it to let go and retry
+        from .agent_utils import vcx_sessions
+        if not vcx_sessions.release_wallet(wallet_name):
+            raise IndyError(ErrorCode.WalletAlreadyOpenedError)
+        return run_coroutine_with_args(wallet.open_wallet, wallet_config_json, wallet_credentials_json)
+
+    def _begin_evict(self, wallet_name):
+        # (True, None) if not held open, (False, None) if busy, else (None, handle to close)
+        pooled = self._wallets.get(wallet_name)
+        if not pooled:
+            return (True, None)
+        if pooled.state != 'open' or 0 < pooled.in_use:
+            return (False, None)
+        return (None, self._begin_close(wallet_name))
+
+    def _begin_close(self, wallet_name):
+        # the entry stays in the pool (so the handle isn't lost) until it is closed
+        pooled = self._wallets[wallet_name]
+        pooled.state = 'closing'
+        return pooled
+
+    def _close(self, wallet_name, pooled):
+        try:
+            run_coroutine_with_args(wallet.close_wallet, pooled.wallet_handle)
+            closed = True
+        except IndyError as ex:
+            closed = self._close_failed(wallet_name, ex)
+        self._finish_close(wallet_name, pooled, closed)
+        return closed
+
+    def _close_all(self, closing):
+        for (wallet_name, pooled) in closing:
+            self._close(wallet_name, pooled)
+
+    def _close_failed(self, wallet_name, ex):
+        print(" >>> Failed to close pooled wallet", wallet_name, ex.error_code)
+        # an invalid handle is no longer open, otherwise keep tracking it
+        return ex.error_code == ErrorCode.WalletInvalidHandle
+
+    def _finish_close(self, wallet_name, pooled, closed):
+        with self.lock:
+            if closed:
+                if self._wallets.get(wallet_name) is pooled:
+                    del self._wallets[wallet_name]
+                self.evictions = self.evictions + 1
+            else:
+                pooled.state = 'open'
+            self.changed.notify_all()
+
+
+wallet_handles = WalletHandlePool()
+
+
+@contextmanager
+def pooled_wallet(wallet_name, raw_password, key_derivation_method=None):
+    """
+    Context manager that provides an open wallet handle from the pool, e.g.:
+        with pooled_wallet(wallet_name, raw_password) as wallet_handle:
+            ...
+    """
+
+    wallet_handle = wallet_handles.acquire(wallet_name, raw_password, key_derivation_method)
+    try:
+        yield wallet_handle
+    finally:
+        wallet_handles.release(wallet_name)
+
+
+def wallet_pool_stats():
+    """
+    Return wallet handle pool counters (hits, misses, evictions).
+    """
+
+    return wallet_handles.stats()
+
+
+######################################################################
+# paginated credential listing (prover wallet)
+######################################################################
+
+# default number of credentials fetched (and rendered) per page
+CREDENTIAL_PAGE_SIZE = getattr(settings, "INDY_CREDENTIAL_PAGE_SIZE", 20)
+
+def _managed_wallet_key(wallet):
+    """
+    Key and key derivation method stored in a managed wallet's config.
     """
 
     # for now, we have our secret password in our wallet config
-    wallet_name = wallet.wallet_name
     wallet_config = json.loads(wallet.wallet_config)
-    raw_password = wallet_config['wallet_key']
-    wallet_handle = open_wallet(wallet_name, raw_password)
+    return (wallet_config['wallet_key'], wallet_config.get('wallet_key_derivation'))
+
 
-    (search_handle, search_count) = run_coroutine_with_args(prover_search_credentials, wallet_handle, "{}")
-    credentials = run_coroutine_with_args(prover_fetch_credentials, search_handle, search_count)
-    run_coroutine_with_args(prover_close_credentials_search, search_handle)
+def _fetch_credentials(search_handle, count):
+    """
+    Fetch the next count credentials from an open credential search.
+    """
+
+    return json.loads(run_coroutine_with_args(prover_fetch_credentials, search_handle, count))
+
+
+def iter_wallet_credentials(wallet_handle, wql=None, page_size=CREDENTIAL_PAGE_SIZE):
+    """
+    Generator over the credentials in an open wallet, fetched page_size at a time.
+    """
+
+    (search_handle, search_count) = run_coroutine_with_args(prover_search_credentials, wallet_handle, json.dumps(wql or {}))
+    try:
+        fetched = 0
+        while fetched < search_count:
+            credentials = _fetch_credentials(search_handle, min(page_size, search_count - fetched))
+            if 0 == len(credentials):
+                break
+            fetched = fetched + len(credentials)
+            for credential in credentials:
+                yield credential
+    finally:
+        run_coroutine_with_args(prover_close_credentials_search, search_handle)
+
+
+def wallet_credentials_page(wallet, raw_password=None, cursor=0, page_size=CREDENTIAL_PAGE_SIZE, wql=None):
+    """
+    Fetch one page of credentials from the wallet, starting at cursor (an offset).
+    Returns (credentials, next_cursor, total_count); next_cursor is None on the last page.
+    Note that the cursor is an offset: libindy credential searches are forward-only and
+    can't be filtered on the credential referent, so every credential before the cursor is
+    fetched and skipped, and deep pages cost O(cursor). Credentials added or deleted
+    between requests can shift page boundaries.
+    """
+
+    if raw_password is None:
+        (raw_password, key_derivation_method) = _managed_wallet_key(wallet)
+    else:
+        key_derivation_method = wallet_key_derivation(wallet)
+
+    with pooled_wallet(wallet.wallet_name, raw_password, key_derivation_method) as wallet_handle:
+        (search_handle, search_count) = run_coroutine_with_args(prover_search_credentials, wallet_handle, json.dumps(wql or {}))
+        try:
+            # the search is forward-only, skip to the cursor one page at a time
+            skipped = 0
+            while skipped < min(cursor, search_count):
+                skip_count = len(_fetch_credentials(search_handle, min(page_size, cursor - skipped)))
+                if 0 == skip_count:
+                    break
+                skipped = skipped + skip_count
+            credentials = []
+            if cursor < search_count:
+                credentials = _fetch_credentials(search_handle, min(page_size, search_count - cursor))
+        finally:
+            run_coroutine_with_args(prover_close_credentials_search, search_handle)
+
+    next_cursor = cursor + len(credentials)
+    if 0 == len(credentials) or search_count <= next_cursor:
+        next_cursor = None
+    return (credentials, next_cursor, search_count)
+
+
+def list_wallet_credentials(wallet):
+    """
+    List all credentials in the current wallet.
+    """
 
-    close_wallet(wallet_handle)
+    (raw_password, key_derivation_method) = _managed_wallet_key(wallet)
+    with pooled_wallet(wallet.wallet_name, raw_password, key_derivation_method) as wallet_handle:
+        credentials = list(iter_wallet_credentials(wallet_handle))
 
-    return json.loads(credentials)
+    return credentials
 
 
 ######################################################################
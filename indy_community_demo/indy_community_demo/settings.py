@@ -62,8 +62,22 @@ INDY_CONFIG = {
     'vcx_genesis_path': '/tmp/atria-genesis.txt',
     'register_dids': True,
     'ledger_url': 'http://localhost:9000',
+    # uncomment to have the agency push new message notifications to wallets provisioned from now on
+    # (only for an agency that sends them - the bundled dummy cloud agent doesn't; those wallets are
+    # then polled at most once a day, INDY_POLL_BACKOFF_MAX_PUSH)
+    #'vcx_webhook_url': 'http://localhost:8000/agent_notification',
+    # uncomment to create managed wallets with a random pre-derived key (much faster wallet open)
+    #'managed_wallet_key_derivation': 'RAW',
 }
 
+# 'lazy' defers loading the indy plug-ins and opening the ledger pool until first use
+# (the WSGI module warms them up), so management commands and tests start faster
+INDY_STARTUP_MODE = os.environ.get('INDY_STARTUP_MODE', 'lazy')
+
+# create new organizations' credential definitions in a background task, so org signup returns immediately
+# ("manage.py process_tasks" already runs the agent sweep); loads_orgs always creates them synchronously
+INDY_CREDDEFS_IN_BACKGROUND = True
+
 INDY_PROFILE_VIEW = 'indy_community.views.profile_view'
 INDY_DATA_VIEW = 'indy_community.views.data_view'
 INDY_WALLET_VIEW = 'indy_community.views.wallet_view'
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'indy_community_demo.settings')
 
 application = get_wsgi_application()
+
+# initialize indy now, rather than on the first request
+from django.conf import settings
+if getattr(settings, 'INDY_STARTUP_MODE', 'eager') == 'lazy':
+    from indy_community.apps import indy_warmup
+    indy_warmup()